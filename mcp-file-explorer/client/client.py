@@ -3,11 +3,76 @@ from typing import List, Dict, Any, Optional
 import json
 import sys
 import os
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, asynccontextmanager
+from urllib.parse import quote
 
+import anyio
+import anyio.lowlevel
+from anyio.streams.buffered import BufferedByteReceiveStream
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.message import SessionMessage
 import mcp.types as types
+from pydantic import AnyUrl
+
+try:
+    from .tracing import Tracer, TRACEPARENT_KEY, SPANS_KEY
+except ImportError:
+    # 直接作为脚本运行时（python client/client.py）
+    from tracing import Tracer, TRACEPARENT_KEY, SPANS_KEY
+
+# 单条消息的最大字节数，与服务器的 MCP_SOCKET_MAX_MESSAGE 对应
+MAX_SOCKET_MESSAGE = 64 * 1024 * 1024
+
+def file_uri(path: str) -> str:
+    """本地路径对应的 file:// URI，与服务器的构造方式相同（路径经过百分号编码）"""
+    return "file://" + quote(path)
+
+def resource_key(uri: str) -> str:
+    """订阅回调的键：按服务器发送通知时的方式（AnyUrl）规范化URI"""
+    return str(AnyUrl(uri))
+
+@asynccontextmanager
+async def unix_socket_client(path: str):
+    """连接以 --socket 启动的共享服务器，返回与stdio_client相同的 (读流, 写流)"""
+    conn = await anyio.connect_unix(path)
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    buffered = BufferedByteReceiveStream(conn)
+    
+    async def reader():
+        try:
+            async with read_stream_writer:
+                while True:
+                    try:
+                        line = await buffered.receive_until(b"\n", MAX_SOCKET_MESSAGE)
+                    except (anyio.EndOfStream, anyio.IncompleteRead, anyio.BrokenResourceError):
+                        break
+                    try:
+                        message = types.JSONRPCMessage.model_validate_json(line)
+                    except Exception as exc:
+                        await read_stream_writer.send(exc)
+                        continue
+                    await read_stream_writer.send(SessionMessage(message))
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+    
+    async def writer():
+        try:
+            async with write_stream_reader:
+                async for session_message in write_stream_reader:
+                    data = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                    await conn.send(data.encode("utf-8") + b"\n")
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            await anyio.lowlevel.checkpoint()
+    
+    async with conn, anyio.create_task_group() as tg:
+        tg.start_soon(reader)
+        tg.start_soon(writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            tg.cancel_scope.cancel()
 
 class FileExplorerClient:
     """MCP客户端实现，用于连接文件浏览服务器"""
@@ -18,9 +83,18 @@ class FileExplorerClient:
         self.exit_stack = AsyncExitStack()
         self.tools = []
         self.resources = []
+        # 资源订阅回调：URI -> 回调函数，收到 resources/updated 通知时调用
+        self.resource_callbacks: Dict[str, Any] = {}
+        # 端到端追踪（设置MCP_TRACE_FILE时开启）
+        self.tracer = Tracer()
+        
+    async def connect(self, server_path: str, socket_path: Optional[str] = None):
+        """连接到MCP服务器
         
-    async def connect(self, server_path: str):
-        """连接到MCP服务器"""
+        指定socket_path（或设置环境变量MCP_SERVER_SOCKET）时连接已运行的共享服务器，
+        共享服务器不可用时退回启动新的服务器进程。
+        """
+        socket_path = socket_path or os.environ.get("MCP_SERVER_SOCKET")
         try:
             # 设置服务器参数
             server_params = StdioServerParameters(
@@ -30,12 +104,19 @@ class FileExplorerClient:
             )
             
             try:
-                # 创建stdio传输
-                stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-                self.stdio, self.write = stdio_transport
+                transport = None
+                if socket_path:
+                    try:
+                        transport = await self.exit_stack.enter_async_context(unix_socket_client(socket_path))
+                    except OSError as e:
+                        print(f"无法连接共享服务器 {socket_path}（{str(e)}），改为启动新的服务器进程")
+                if transport is None:
+                    # 创建stdio传输
+                    transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
+                self.stdio, self.write = transport
                 
                 # 创建客户端会话并添加超时
-                self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+                self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write, message_handler=self._on_message))
                 
                 # 添加超时
                 try:
@@ -63,15 +144,53 @@ class FileExplorerClient:
             print(f"连接到MCP服务器失败: {str(e)}")
             return False
             
-    async def search_files(self, pattern: str, directory: str):
-        """使用search-files工具搜索文件"""
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> types.CallToolResult:
+        """调用工具；处于追踪中时通过 _meta 传递traceparent，并登记服务器返回的span"""
+        with self.tracer.span("mcp.call_tool", tool=name):
+            traceparent = self.tracer.traceparent()
+            if traceparent is None:
+                return await self.session.call_tool(name, arguments)
+            result = await self.session.send_request(
+                types.ClientRequest(types.CallToolRequest(
+                    method="tools/call",
+                    params=types.CallToolRequestParams(
+                        name=name,
+                        arguments=arguments,
+                        _meta=types.RequestParams.Meta(**{TRACEPARENT_KEY: traceparent}),
+                    ),
+                )),
+                types.CallToolResult,
+            )
+            if result.meta:
+                self.tracer.add_remote_spans(result.meta.get(SPANS_KEY))
+            return result
+            
+    async def call_tool_json(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """以json输出调用工具并解析结果；失败时返回带error字段的字典"""
+        if not self.session:
+            return {"error": "客户端未连接到服务器"}
+        
+        try:
+            result = await self.call_tool(name, dict(arguments, output="json"))
+            for content in result.content or []:
+                if content.type == "text":
+                    return json.loads(content.text)
+            return {"error": f"{name} 没有返回结果"}
+        except Exception as e:
+            return {"error": f"调用 {name} 时发生错误: {str(e)}"}
+            
+    async def search_files(self, pattern: str, directory: str, output: str = "text"):
+        """使用search-files工具搜索文件，output为json时返回解析后的结构化结果"""
+        if output == "json":
+            return await self.call_tool_json("search-files", {"pattern": pattern, "directory": directory})
+        
         if not self.session:
             print("客户端未连接到服务器")
             return None
         
         try:
             # 调用工具
-            result = await self.session.call_tool(
+            result = await self.call_tool(
                 "search-files", 
                 {"pattern": pattern, "directory": directory}
             )
@@ -93,7 +212,7 @@ class FileExplorerClient:
         
         try:
             # 调用工具
-            result = await self.session.call_tool(
+            result = await self.call_tool(
                 "file-info", 
                 {"path": path}
             )
@@ -107,25 +226,141 @@ class FileExplorerClient:
                 for content in result.content:
                     if content.type == "text":
                         response["text"] = content.text
-                    elif content.type == "resource":
+                    elif content.type == "resource_link":
                         response["resources"].append({
-                            "uri": content.resource.uri,
-                            "name": content.resource.name
+                            "uri": str(content.uri),
+                            "name": content.name
                         })
             
             return response
         except Exception as e:
             return f"获取文件信息时发生错误: {str(e)}"
             
-    async def read_file_resource(self, file_path: str):
-        """读取文件资源"""
+    async def explore_paths(self, base_path: Optional[str] = None, limit: Optional[int] = None,
+                            cursor: Optional[str] = None, depth: Optional[int] = None):
+        """使用explore-paths工具探查路径，可通过cursor翻页；depth大于1时一次返回目录树"""
+        if not self.session:
+            print("客户端未连接到服务器")
+            return None
+        
+        try:
+            arguments = {}
+            if base_path:
+                arguments["base_path"] = base_path
+            if limit:
+                arguments["limit"] = limit
+            if cursor:
+                arguments["cursor"] = cursor
+            if depth:
+                arguments["depth"] = depth
+            
+            result = await self.call_tool("explore-paths", arguments)
+            
+            # 处理结果
+            response = {"text": "", "resources": []}
+            if result.content:
+                for content in result.content:
+                    if content.type == "text":
+                        response["text"] = content.text
+                    elif content.type == "resource_link":
+                        response["resources"].append({
+                            "uri": str(content.uri),
+                            "name": content.name
+                        })
+            
+            return response
+        except Exception as e:
+            return f"探查路径时发生错误: {str(e)}"
+            
+    async def list_directory(self, path: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                             output: str = "text"):
+        """使用list-directory工具列出目录内容，可通过cursor翻页；output为json时返回结构化结果"""
+        arguments = {"path": path}
+        if limit:
+            arguments["limit"] = limit
+        if cursor:
+            arguments["cursor"] = cursor
+        if output == "json":
+            return await self.call_tool_json("list-directory", arguments)
+        
+        if not self.session:
+            print("客户端未连接到服务器")
+            return None
+        
+        try:
+            result = await self.call_tool("list-directory", arguments)
+            
+            if result.content and len(result.content) > 0:
+                for content in result.content:
+                    if content.type == "text":
+                        return content.text
+            return "列出目录没有返回结果"
+        except Exception as e:
+            return f"错误: 列出目录时发生错误: {str(e)}"
+            
+    async def batch(self, operations: List[Dict[str, Any]], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """使用batch工具在一次请求中执行多个工具调用
+
+        operations为 [{"tool": 工具名, "arguments": 参数}]，返回 {"results": [...]}，结果与操作一一对应，
+        每项包含 text（文本结果）、result（参数中指定output为json时的结构化结果）或 error。
+        """
+        arguments: Dict[str, Any] = {"operations": operations}
+        if concurrency:
+            arguments["concurrency"] = concurrency
+        return await self.call_tool_json("batch", arguments)
+            
+    async def _on_message(self, message):
+        """处理服务器主动发送的消息，目前只关心资源更新通知"""
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ResourceUpdatedNotification):
+            uri = str(message.root.params.uri)
+            callback = self.resource_callbacks.get(resource_key(uri))
+            if callback is not None:
+                result = callback(uri)
+                if asyncio.iscoroutine(result):
+                    await result
+                    
+    async def subscribe_resource(self, file_path: str, callback):
+        """订阅文件或目录，变化时以URI为参数调用callback（可以是协程函数）"""
+        if not self.session:
+            print("客户端未连接到服务器")
+            return None
+        
+        uri = file_uri(file_path)
+        self.resource_callbacks[resource_key(uri)] = callback
+        try:
+            await self.session.subscribe_resource(uri)
+            return True
+        except Exception as e:
+            self.resource_callbacks.pop(resource_key(uri), None)
+            return f"订阅资源时发生错误: {str(e)}"
+            
+    async def unsubscribe_resource(self, file_path: str):
+        """取消订阅文件或目录"""
+        if not self.session:
+            print("客户端未连接到服务器")
+            return None
+        
+        uri = file_uri(file_path)
+        self.resource_callbacks.pop(resource_key(uri), None)
+        try:
+            await self.session.unsubscribe_resource(uri)
+            return True
+        except Exception as e:
+            return f"取消订阅资源时发生错误: {str(e)}"
+            
+    async def read_file_resource(self, file_path: str, offset: Optional[int] = None,
+                                 length: Optional[int] = None):
+        """读取文件资源，可通过offset/length按字节范围分段读取"""
         if not self.session:
             print("客户端未连接到服务器")
             return None
         
         try:
             # 构造URI
-            uri = f"file://{file_path}"
+            uri = file_uri(file_path)
+            if offset is not None or length is not None:
+                params = {"offset": offset, "length": length}
+                uri += "?" + "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
             
             # 读取资源
             result = await self.session.read_resource(uri)
@@ -146,7 +381,7 @@ async def interactive_mode(client):
     """交互式命令行界面"""
     print("\n=== 文件浏览器交互界面 ===")
     print("命令:")
-    print("  explore [路径] - 探查并显示路径信息")
+    print("  explore [路径] [深度] - 探查并显示路径信息，深度大于1时显示目录树")
     print("  ls [路径] - 列出目录内容")
     print("  search <模式> <目录> - 搜索文件")
     print("  info <路径> - 获取文件信息")
@@ -171,6 +406,9 @@ async def interactive_mode(client):
         
         # 添加自动探查路径功能
         if command == "explore" or command == "e":
+            depth = None
+            if len(parts) > 2 and parts[-1].isdigit():
+                depth = int(parts.pop())
             path = " ".join(parts[1:]) if len(parts) > 1 else "."
             
             # 处理相对路径
@@ -178,7 +416,7 @@ async def interactive_mode(client):
                 path = os.path.join(current_path, path)
                 
             print("探查路径中...")
-            result = await client.explore_paths(path)
+            result = await client.explore_paths(path, depth=depth)
             
             if isinstance(result, dict):
                 print(result["text"])
@@ -259,12 +497,12 @@ async def interactive_mode(client):
                 new_path = os.path.join(current_path, new_path)
                 
             # 验证路径是否可访问
-            result = await client.list_directory(new_path)
-            if not result.startswith("错误") and not result.startswith("访问被拒绝"):
+            result = await client.list_directory(new_path, limit=1, output="json")
+            if "error" not in result:
                 current_path = new_path
                 print(f"当前目录已更改为: {current_path}")
             else:
-                print(result)
+                print(result["error"])
             
         else:
             print("未知命令或参数不足")
@@ -9,6 +9,7 @@ import threading
 
 # 导入基础客户端类
 from .client import FileExplorerClient
+from .tracing import format_summary
 
 # 加载环境变量
 load_dotenv()
@@ -58,7 +59,14 @@ class FileExplorerClientWithArkLLM(FileExplorerClient):
         self.input_queue = asyncio.Queue()
     
     async def process_with_llm(self, query):
-        """使用方舟API处理查询并决定调用哪个工具"""
+        """使用方舟API处理查询并决定调用哪个工具；开启追踪时每次查询记录为一条追踪"""
+        with self.tracer.span("process_with_llm", model=self.model_id) as span:
+            result = await self._process_with_llm(query)
+        if span is not None and span.summary is not None:
+            print(format_summary(span.summary))
+        return result
+    
+    async def _process_with_llm(self, query):
         if not self.client:
             return "无法处理：未配置方舟API密钥"
         
@@ -79,7 +87,8 @@ class FileExplorerClientWithArkLLM(FileExplorerClient):
             
         try:
             # 获取工具定义
-            tools_response = await self.session.list_tools()
+            with self.tracer.span("mcp.list_tools"):
+                tools_response = await self.session.list_tools()
             tools = []
             
             for tool in tools_response.tools:
@@ -97,14 +106,15 @@ class FileExplorerClientWithArkLLM(FileExplorerClient):
             
             # 同步调用方舟API
             print("发送请求到方舟API...")
-            response = self.client.chat.completions.create(
-                model=self.model_id,
-                messages=self.chat_history,
-                tools=tools,
-                tool_choice="auto",
-                temperature=0.7,
-                max_tokens=1024
-            )
+            with self.tracer.span("llm.completion", messages=len(self.chat_history)):
+                response = self.client.chat.completions.create(
+                    model=self.model_id,
+                    messages=self.chat_history,
+                    tools=tools,
+                    tool_choice="auto",
+                    temperature=0.7,
+                    max_tokens=1024
+                )
             
             # 处理响应
             result = ""
@@ -133,69 +143,83 @@ class FileExplorerClientWithArkLLM(FileExplorerClient):
                 
             # 处理工具调用
             if hasattr(assistant_message, 'tool_calls') and assistant_message.tool_calls:
+                # 先解析全部工具调用，参数无效的调用直接记录错误
+                tool_outputs = {}
+                operations = []
                 for tool_call in assistant_message.tool_calls:
                     tool_name = tool_call.function.name
                     try:
                         tool_args = json.loads(tool_call.function.arguments)
-                        
-                        # 更新上下文状态
-                        if tool_name in ["explore-paths", "list-directory"]:
-                            if "path" in tool_args:
-                                self.last_mentioned_path = tool_args["path"]
-                            elif "base_path" in tool_args:
-                                self.last_mentioned_path = tool_args["base_path"]
-                        
-                        # 调用工具
-                        print(f"调用工具: {tool_name}，参数: {tool_args}")
-                        tool_result = await self.session.call_tool(tool_name, tool_args)
-                        
-                        # 格式化结果
-                        tool_content = ""
-                        for content in tool_result.content:
-                            if hasattr(content, 'text'):
-                                tool_content += content.text + "\n"
-                        
-                        print(f"工具结果:\n{tool_content}")
-                        
-                        # 添加工具结果到历史
-                        self.chat_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": tool_content
-                        })
-                        
-                        # 将工具结果发送给LLM获取最终回复
-                        print("处理工具调用结果...")
-                        follow_up_response = self.client.chat.completions.create(
-                            model=self.model_id,
-                            messages=self.chat_history,
-                            temperature=0.7,
-                            max_tokens=1024
+                    except json.JSONDecodeError as e:
+                        tool_outputs[tool_call.id] = f"工具 {tool_name} 调用失败: 参数不是有效的JSON ({str(e)})"
+                        continue
+                    
+                    # 更新上下文状态
+                    if tool_name in ["explore-paths", "list-directory"]:
+                        if "path" in tool_args:
+                            self.last_mentioned_path = tool_args["path"]
+                        elif "base_path" in tool_args:
+                            self.last_mentioned_path = tool_args["base_path"]
+                    
+                    print(f"调用工具: {tool_name}，参数: {tool_args}")
+                    operations.append((tool_call.id, tool_name, tool_args))
+                
+                try:
+                    if len(operations) == 1:
+                        call_id, tool_name, tool_args = operations[0]
+                        tool_result = await self.call_tool(tool_name, tool_args)
+                        tool_outputs[call_id] = "".join(
+                            content.text + "\n" for content in tool_result.content if hasattr(content, 'text')
+                        )
+                    elif operations:
+                        # 多个工具调用合并为一次batch请求，由服务器并发执行
+                        batch_result = await self.batch(
+                            [{"tool": tool_name, "arguments": tool_args} for _, tool_name, tool_args in operations]
                         )
-                        
-                        # 添加最终回复到历史
-                        final_reply = follow_up_response.choices[0].message.content
-                        self.chat_history.append({
-                            "role": "assistant",
-                            "content": final_reply
-                        })
-                        
-                        result = final_reply
-                        
-                    except Exception as e:
-                        error_msg = f"工具 {tool_name} 调用失败: {str(e)}"
-                        print(error_msg)
-                        import traceback
-                        traceback.print_exc()
-                        
-                        # 添加错误信息到历史
-                        self.chat_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": error_msg
-                        })
-                        
-                        result += f"\n{error_msg}\n"
+                        if "error" in batch_result:
+                            raise RuntimeError(batch_result["error"])
+                        for (call_id, tool_name, _), item in zip(operations, batch_result["results"]):
+                            if "error" in item:
+                                tool_outputs[call_id] = f"工具 {tool_name} 调用失败: {item['error']}"
+                            else:
+                                tool_outputs[call_id] = item.get("text") or json.dumps(item.get("result"), ensure_ascii=False)
+                except Exception as e:
+                    error_msg = f"工具调用失败: {str(e)}"
+                    print(error_msg)
+                    import traceback
+                    traceback.print_exc()
+                    for call_id, _, _ in operations:
+                        tool_outputs.setdefault(call_id, error_msg)
+                    result += f"\n{error_msg}\n"
+                
+                # 添加工具结果到历史，顺序与工具调用一致
+                for tool_call in assistant_message.tool_calls:
+                    tool_content = tool_outputs.get(tool_call.id, "")
+                    print(f"工具结果:\n{tool_content}")
+                    self.chat_history.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "content": tool_content
+                    })
+                
+                # 将全部工具结果一起发送给LLM获取最终回复
+                print("处理工具调用结果...")
+                with self.tracer.span("llm.follow_up", messages=len(self.chat_history)):
+                    follow_up_response = self.client.chat.completions.create(
+                        model=self.model_id,
+                        messages=self.chat_history,
+                        temperature=0.7,
+                        max_tokens=1024
+                    )
+                
+                # 添加最终回复到历史
+                final_reply = follow_up_response.choices[0].message.content
+                self.chat_history.append({
+                    "role": "assistant",
+                    "content": final_reply
+                })
+                
+                result = final_reply
             
             return result
             
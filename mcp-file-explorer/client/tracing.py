@@ -0,0 +1,171 @@
+"""轻量的端到端追踪：客户端记录span，通过MCP请求的 _meta.traceparent 把追踪上下文传给服务器，
+服务器端的span随结果的 _meta 一起返回，整条追踪写入本地JSONL文件
+
+设置环境变量 MCP_TRACE_FILE 为文件路径即可开启，未设置时所有span操作都是空操作。
+"""
+import os
+import json
+import time
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# 追踪输出文件，每行一条JSON记录（span或summary）
+TRACE_FILE = os.environ.get("MCP_TRACE_FILE", "")
+
+# 请求 _meta 中传递追踪上下文的字段（W3C traceparent格式），以及结果 _meta 中服务器span的字段
+TRACEPARENT_KEY = "traceparent"
+SPANS_KEY = "trace_spans"
+
+
+class Span:
+    """一段计时区间；start为Unix时间戳（秒），duration_ms在结束时填入"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration_ms", "attrs", "process",
+                 "_started", "summary")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.attrs = attrs
+        self.process = "client"
+        self._started = time.perf_counter()
+        # 根span结束后填入本次追踪的火焰图摘要
+        self.summary: Optional[Dict[str, Any]] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "span", "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "start": self.start, "duration_ms": self.duration_ms,
+            "process": self.process, "attrs": self.attrs,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("mcp_current_span", default=None)
+
+
+class Tracer:
+    """收集各追踪的span，根span结束时连同火焰图摘要一起写出"""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._traces: Dict[str, List[Dict[str, Any]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        """开始一个span：有当前span时作为其子span，否则开始一条新的追踪"""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        span = Span(name, trace_id, parent.span_id if parent is not None else None, attrs)
+        if parent is None:
+            with self._lock:
+                self._traces[trace_id] = []
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration_ms = round((time.perf_counter() - span._started) * 1000, 3)
+            self._add(trace_id, span.to_dict())
+            if parent is None:
+                span.summary = self._finish(trace_id, span)
+
+    def traceparent(self) -> Optional[str]:
+        """当前span的traceparent，没有进行中的追踪时返回None"""
+        span = _current_span.get()
+        return span.traceparent if span is not None else None
+
+    def add_remote_spans(self, spans: Any):
+        """登记服务器随结果返回的span"""
+        span = _current_span.get()
+        if span is None or not isinstance(spans, list):
+            return
+        for remote in spans:
+            if isinstance(remote, dict):
+                self._add(span.trace_id, dict(remote, type="span", trace_id=span.trace_id, process="server"))
+
+    def _add(self, trace_id: str, record: Dict[str, Any]):
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            if spans is not None:
+                spans.append(record)
+
+    def _finish(self, trace_id: str, root: Span) -> Dict[str, Any]:
+        with self._lock:
+            spans = self._traces.pop(trace_id, [])
+        summary = {
+            "type": "summary", "trace_id": trace_id, "name": root.name, "start": root.start,
+            "duration_ms": root.duration_ms, "spans": len(spans), "flame": flame_summary(spans),
+        }
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in spans + [summary]))
+        except OSError as e:
+            print(f"写入追踪文件失败: {self.path} ({e})")
+        return summary
+
+
+def _frame(span: Dict[str, Any]) -> str:
+    tool = span.get("attrs", {}).get("tool")
+    return f"{span['name']}[{tool}]" if tool else span["name"]
+
+
+def flame_summary(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按调用栈汇总自身耗时（span耗时减去子span耗时），按自身耗时从大到小排列
+
+    每项的stack与flamegraph.pl的折叠格式相同（以分号连接各层名称）。并发的子span
+    耗时之和可能超过父span，此时父span的自身耗时记为0。
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    children_ms: Dict[str, float] = {}
+    for span in spans:
+        parent = span.get("parent_id")
+        if parent in by_id:
+            children_ms[parent] = children_ms.get(parent, 0.0) + (span.get("duration_ms") or 0.0)
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for span in spans:
+        frames = []
+        node: Optional[Dict[str, Any]] = span
+        while node is not None and len(frames) < 64:
+            frames.append(_frame(node))
+            node = by_id.get(node.get("parent_id"))
+        stack = ";".join(reversed(frames))
+        duration = span.get("duration_ms") or 0.0
+        entry = totals.setdefault(stack, {"self_ms": 0.0, "total_ms": 0.0, "count": 0})
+        entry["self_ms"] += max(0.0, duration - children_ms.get(span["span_id"], 0.0))
+        entry["total_ms"] += duration
+        entry["count"] += 1
+    return sorted(
+        ({"stack": stack, "self_ms": round(v["self_ms"], 3), "total_ms": round(v["total_ms"], 3),
+          "count": int(v["count"])} for stack, v in totals.items()),
+        key=lambda item: item["self_ms"], reverse=True,
+    )
+
+
+def format_summary(summary: Dict[str, Any], top: int = 5) -> str:
+    """一行简短的追踪摘要，列出自身耗时最多的几个调用栈"""
+    hot = "，".join(f"{item['stack'].rsplit(';', 1)[-1]} {item['self_ms']:.0f}ms"
+                   for item in summary["flame"][:top])
+    return f"[追踪 {summary['trace_id'][:8]}] 总耗时 {summary['duration_ms']:.0f}ms：{hot}"
@@ -4,6 +4,7 @@ import sys
 import argparse
 import subprocess
 import time
+import tempfile
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -16,6 +17,9 @@ def main():
                         help="客户端模式：llm(默认AI助手)、cli(命令行)或gui(图形界面)")
     parser.add_argument("--model", type=str, default="doubao-1-5-lite-32k-250115",
                         help="方舟API模型ID (默认: doubao-1-5-lite-32k-250115)")
+    parser.add_argument("--socket", type=str,
+                        default=os.path.join(tempfile.gettempdir(), f"mcp-file-explorer-{os.getuid()}.sock"),
+                        help="共享服务器监听的Unix域套接字路径，客户端连接到该服务器而不是各自启动进程")
     args = parser.parse_args()
     
     # 脚本路径
@@ -29,13 +33,16 @@ def main():
         print("错误: 未找到ARK_API_KEY环境变量。请在.env文件中设置或使用--mode cli运行命令行模式。")
         return
     
-    # 启动服务器进程
-    server_process = subprocess.Popen([sys.executable, server_script])
+    # 启动共享服务器进程，客户端通过MCP_SERVER_SOCKET连接到它
+    server_process = subprocess.Popen([sys.executable, server_script, "--socket", args.socket])
+    os.environ["MCP_SERVER_SOCKET"] = args.socket
     
     try:
-        # 等待服务器启动
+        # 等待服务器开始监听（超时后客户端会自行启动服务器进程）
         print("等待服务器启动...")
-        time.sleep(3)
+        deadline = time.time() + 10
+        while not os.path.exists(args.socket) and server_process.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
         
         # 根据参数选择启动的客户端
         client_process = None
@@ -0,0 +1,288 @@
+"""只读浏览zip/tar归档：把归档当作虚拟目录，路径形如 /a.zip!/inner/path
+
+归档的成员索引按归档路径缓存，归档的mtime或大小变化后重新解析；读取成员时流式解压，
+不解压到磁盘，也不把整个归档读入内存。压缩成员无法随机访问，分段读取时保留读到一半的成员流，
+下一段从上次的位置继续解压，顺序翻页的总开销与成员大小成正比。
+"""
+import os
+import time
+import tarfile
+import zipfile
+import posixpath
+import threading
+from urllib.parse import quote
+from collections import OrderedDict, namedtuple
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from ranged_read import MAX_READ_LENGTH, file_uri
+
+# 归档路径与归档内路径之间的分隔符
+ARCHIVE_SEPARATOR = "!/"
+# 按扩展名识别的归档类型
+ZIP_SUFFIXES = (".zip", ".whl", ".jar", ".egg")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# 缓存的归档索引数
+ARCHIVE_CACHE_SIZE = int(os.environ.get("MCP_ARCHIVE_CACHE_SIZE", "16"))
+# 单个归档最多索引的成员数，超过时拒绝浏览
+MAX_ARCHIVE_MEMBERS = int(os.environ.get("MCP_ARCHIVE_MAX_MEMBERS", "500000"))
+# 每个归档保留的读到一半的成员流数
+OPEN_MEMBER_STREAMS = 4
+
+# 归档成员；size为解压后的大小，目录的size为0；mtime为Unix时间戳
+ArchiveMember = namedtuple("ArchiveMember", ["name", "is_dir", "size", "compressed_size", "mtime"])
+
+
+class ArchiveError(ValueError):
+    """归档无法解析，或请求的成员不存在、不可读取"""
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def split_archive_path(path: str) -> Optional[Tuple[str, str]]:
+    """拆分 "a.zip!/inner/path" 为 (归档路径, 归档内路径)；不指向归档内部时返回None
+
+    归档内路径为空字符串表示归档的根目录；不支持嵌套归档。
+    """
+    start = 0
+    while True:
+        i = path.find("!", start)
+        if i < 0:
+            return None
+        rest = path[i + 1:]
+        if (not rest or rest.startswith("/")) and is_archive(path[:i]):
+            return path[:i], normalize_member(rest)
+        start = i + 1
+
+
+def normalize_member(name: str) -> str:
+    """规范化归档内路径；去掉开头的 '/' 和 './'，不允许跳出归档根目录"""
+    return posixpath.normpath("/" + name.replace("\\", "/")).lstrip("/")
+
+
+def archive_uri(archive_path: str, member: str = "") -> str:
+    return file_uri(os.path.abspath(archive_path)) + ARCHIVE_SEPARATOR + quote(member)
+
+
+class ArchiveIndex:
+    """一个归档的成员索引；zip归档保持打开，多个线程可同时读取不同成员"""
+
+    def __init__(self, path: str, mtime_ns: int, size: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.kind = "zip" if path.lower().endswith(ZIP_SUFFIXES) else "tar"
+        self.members: Dict[str, ArchiveMember] = {"": ArchiveMember("", True, 0, 0, 0.0)}
+        self.children: Dict[str, List[str]] = {"": []}
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._zip_members: Dict[str, zipfile.ZipInfo] = {}
+        self._tar_members: Dict[str, tarfile.TarInfo] = {}
+        # 成员名 -> (读到一半的流, 当前位置)，供下一次分段读取继续使用
+        self._streams: "OrderedDict[str, Tuple[BinaryIO, int]]" = OrderedDict()
+        self._streams_lock = threading.Lock()
+        self._closed = False
+
+    @classmethod
+    def build(cls, path: str, mtime_ns: int, size: int) -> "ArchiveIndex":
+        index = cls(path, mtime_ns, size)
+        try:
+            if index.kind == "zip":
+                index._build_zip()
+            else:
+                index._build_tar()
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+            index.close()
+            raise ArchiveError(f"无法解析归档: {str(e)}")
+        except BaseException:
+            index.close()
+            raise
+        return index
+
+    def _build_zip(self):
+        # 中央目录在文件末尾，解析时不需要读取成员数据
+        self._zip = zipfile.ZipFile(self.path)
+        for info in self._zip.infolist():
+            try:
+                # zip中记录的是本地时间
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+            except (OverflowError, ValueError):
+                mtime = 0.0
+            name = self._add(info.filename, info.is_dir(), info.file_size, info.compress_size, mtime)
+            if name and not info.is_dir():
+                self._zip_members[name] = info
+
+    def _build_tar(self):
+        # tar没有中央目录，需要顺序读一遍所有头部；压缩的tar会完整解压一遍，但只保留头部信息
+        with tarfile.open(self.path, "r:*") as tar:
+            for info in tar:
+                if info.isreg():
+                    name = self._add(info.name, False, info.size, info.size, float(info.mtime))
+                    if name:
+                        self._tar_members[name] = info
+                elif info.isdir():
+                    self._add(info.name, True, 0, 0, float(info.mtime))
+
+    def _add(self, raw_name: str, is_dir: bool, size: int, compressed_size: int, mtime: float) -> str:
+        name = normalize_member(raw_name)
+        if not name:
+            return ""
+        if len(self.members) > MAX_ARCHIVE_MEMBERS:
+            raise ArchiveError(f"归档成员过多（超过{MAX_ARCHIVE_MEMBERS}个）")
+        existed = name in self.members
+        self.members[name] = ArchiveMember(name, is_dir, 0 if is_dir else size, compressed_size, mtime)
+        if is_dir:
+            self.children.setdefault(name, [])
+        if existed:
+            return name
+        # 补全没有单独记录的上级目录
+        child = name
+        while True:
+            parent = posixpath.dirname(child)
+            self.children.setdefault(parent, []).append(child)
+            if parent in self.members:
+                break
+            self.members[parent] = ArchiveMember(parent, True, 0, 0, mtime)
+            self.children.setdefault(parent, [])
+            child = parent
+        return name
+
+    def member(self, name: str) -> Optional[ArchiveMember]:
+        return self.members.get(normalize_member(name))
+
+    def listdir(self, name: str) -> List[ArchiveMember]:
+        """目录的直接成员，未排序"""
+        return [self.members[child] for child in self.children.get(normalize_member(name), [])]
+
+    def open(self, name: str) -> BinaryIO:
+        """以流的方式打开成员，调用方负责关闭"""
+        name = normalize_member(name)
+        member = self.members.get(name)
+        if member is None:
+            raise ArchiveError(f"归档中不存在: {name}")
+        if member.is_dir:
+            raise ArchiveError(f"归档成员是目录: {name}")
+        if self.kind == "zip":
+            zf = self._zip
+            if zf is None:
+                raise ArchiveError("归档索引已失效，请重试")
+            return zf.open(self._zip_members[name])
+        info = self._tar_members.get(name)
+        if info is None:
+            raise ArchiveError(f"归档成员不是普通文件: {name}")
+        return _TarMember(self.path, info)
+
+    def read(self, name: str, offset: int, length: int) -> Tuple[bytes, int]:
+        """读取成员 [offset, offset+length) 范围内的字节，返回 (数据, 成员大小)
+
+        压缩成员无法随机访问，跳过offset之前的数据时边解压边丢弃，内存占用与offset无关。
+        上一次读取停在offset之前时沿用那个流向后跳，不从成员开头重新解压。
+        """
+        member = self.member(name)
+        if member is None:
+            raise ArchiveError(f"归档中不存在: {normalize_member(name)}")
+        name = member.name
+        size = member.size
+        length = min(length, MAX_READ_LENGTH)
+        if offset >= size or length == 0:
+            return b"", size
+        with self._streams_lock:
+            parked = self._streams.pop(name, None)
+        if parked is not None and parked[1] > offset:
+            # 向回读只能从头开始
+            parked[0].close()
+            parked = None
+        f, position = parked if parked is not None else (self.open(name), 0)
+        try:
+            if position != offset:
+                f.seek(offset)
+            data = f.read(length)
+        except BaseException:
+            f.close()
+            raise
+        self._park(name, f, offset + len(data), size)
+        return data, size
+
+    def _park(self, name: str, f: BinaryIO, position: int, size: int):
+        """保留读到一半的成员流；已读完、索引已关闭或超出数量上限的流直接关闭"""
+        evicted = []
+        with self._streams_lock:
+            if position >= size or self._closed:
+                evicted.append(f)
+            else:
+                self._streams[name] = (f, position)
+                while len(self._streams) > OPEN_MEMBER_STREAMS:
+                    evicted.append(self._streams.popitem(last=False)[1][0])
+        for stream in evicted:
+            stream.close()
+
+    def close(self):
+        with self._streams_lock:
+            self._closed = True
+            streams, self._streams = list(self._streams.values()), OrderedDict()
+        for f, _ in streams:
+            f.close()
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+class _TarMember:
+    """tar成员的只读流，关闭时同时关闭底层的归档文件"""
+
+    def __init__(self, path: str, info: tarfile.TarInfo):
+        self._tar = tarfile.open(path, "r:*")
+        try:
+            self._file = self._tar.extractfile(info)
+        except BaseException:
+            self._tar.close()
+            raise
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+        self._tar.close()
+
+    def __enter__(self) -> "_TarMember":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveCache:
+    """按归档路径缓存成员索引；归档的mtime和大小都未变时直接复用，超出容量时淘汰最久未用的"""
+
+    def __init__(self, max_entries: int = ARCHIVE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._indexes: "OrderedDict[str, ArchiveIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> ArchiveIndex:
+        real_path = os.path.realpath(path)
+        st = os.stat(real_path)
+        with self._lock:
+            index = self._indexes.get(real_path)
+            if index is not None and (index.mtime_ns, index.size) == (st.st_mtime_ns, st.st_size):
+                self._indexes.move_to_end(real_path)
+                return index
+        index = ArchiveIndex.build(real_path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            old = self._indexes.pop(real_path, None)
+            self._indexes[real_path] = index
+            evicted = [old] if old is not None else []
+            while len(self._indexes) > self.max_entries:
+                evicted.append(self._indexes.popitem(last=False)[1])
+        # 已打开的成员流不受影响，zip文件在最后一个成员流关闭后才真正关闭
+        for stale in evicted:
+            stale.close()
+        return index
+
+
+# 服务器共享的归档索引缓存
+archive_cache = ArchiveCache()
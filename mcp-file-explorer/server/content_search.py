@@ -0,0 +1,149 @@
+"""文件内容搜索：mmap读取、快速跳过二进制文件，并在进程池中并行扫描
+
+同一文件总由同一个工作进程扫描，进程内缓存各文件的二进制嗅探结论，文件未变化时
+任何查询都不再打开已知的二进制文件。
+"""
+import os
+import re
+import mmap
+from collections import namedtuple
+from typing import Hashable, Iterator, List, Optional, Pattern
+
+from fs_walk import walk_matches
+from workers import run_batches, run_stream, worker_cache
+
+# 单条匹配结果，line_no从1开始
+GrepMatch = namedtuple("GrepMatch", ["path", "line_no", "line"])
+
+# 判断二进制文件时检查的字节数
+SNIFF_BYTES = 8192
+# 每个任务包含的文件数，用于摊薄进程间通信开销
+FILES_PER_TASK = 64
+# 单行结果的最大显示长度
+MAX_LINE_CHARS = 200
+
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = False) -> Pattern[bytes]:
+    """把字面量或正则编译为bytes正则，直接在mmap上匹配
+
+    整个文件作为一个缓冲区搜索，因此以MULTILINE编译，使^和$按行匹配。
+    """
+    source = pattern.encode("utf-8")
+    if not regex:
+        source = re.escape(source)
+    return re.compile(source, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+
+
+def is_binary(buf) -> bool:
+    """简单嗅探：开头一段内容中出现NUL字节即视为二进制文件"""
+    return buf.find(b"\0", 0, SNIFF_BYTES) != -1
+
+
+def search_file(path: str, compiled: Pattern[bytes], max_matches: int,
+                binary_key: Optional[Hashable] = None) -> List[GrepMatch]:
+    """在单个文件中查找匹配行，每行最多报告一次
+
+    给出binary_key时，判定为二进制的文件记入进程内缓存（见search_files_task）。
+    """
+    results: List[GrepMatch] = []
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return results
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if is_binary(mm):
+                    if binary_key is not None:
+                        worker_cache.put(binary_key, True)
+                    return results
+                pos = 0
+                line_no = 1
+                counted_to = 0
+                size = len(mm)
+                while pos <= size and len(results) < max_matches:
+                    m = compiled.search(mm, pos)
+                    if m is None:
+                        break
+                    line_start = mm.rfind(b"\n", 0, m.start()) + 1
+                    line_end = mm.find(b"\n", m.start())
+                    if line_end == -1:
+                        line_end = size
+                    if m.end() > line_end:
+                        # 跨行的匹配（如\s+、[^x]*吃掉了换行）：只在起点所在的行内重新匹配
+                        if compiled.search(mm, m.start(), line_end) is None:
+                            pos = line_end + 1
+                            continue
+                    # 增量统计换行数得到行号
+                    line_no += mm[counted_to:line_start].count(b"\n")
+                    counted_to = line_start
+                    line = mm[line_start:line_end].decode("utf-8", errors="replace").rstrip("\r")
+                    if len(line) > MAX_LINE_CHARS:
+                        line = line[:MAX_LINE_CHARS] + "..."
+                    results.append(GrepMatch(path, line_no, line))
+                    pos = line_end + 1
+    except (OSError, ValueError):
+        pass
+    return results
+
+
+def search_files_task(paths: List[str], pattern: str, regex: bool, ignore_case: bool,
+                      max_per_file: int) -> List[GrepMatch]:
+    """工作进程中执行的任务：扫描一批文件，跳过进程内缓存中已知未变化的二进制文件
+
+    缓存的是与查询无关的逐文件结论，不同的查询都能复用；匹配结果本身不缓存。
+    """
+    compiled = compile_pattern(pattern, regex, ignore_case)
+    results: List[GrepMatch] = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        key = ("binary", path, st.st_ino, st.st_mtime_ns, st.st_size)
+        if worker_cache.get(key):
+            continue
+        results.extend(search_file(path, compiled, max_per_file, key))
+    return results
+
+
+def grep_files(directory: str, pattern: str, regex: bool = False, ignore_case: bool = False,
+               include: str = "*", max_results: int = 100,
+               max_per_file: Optional[int] = None) -> Iterator[GrepMatch]:
+    """在directory下的文件内容中搜索pattern，结果按完成顺序流式产出
+
+    每个工作进程同时在途的任务数有上限，达到max_results后取消剩余任务，
+    因此不会为了前几页结果而扫描整棵目录树。
+    """
+    # 提前编译，正则有误时直接在调用方抛出re.error
+    compile_pattern(pattern, regex, ignore_case)
+    per_file = max_per_file or max_results
+    paths = (match.path for match in walk_matches(directory, include, kind="file"))
+    results = run_stream(search_files_task, paths, FILES_PER_TASK, pattern, regex, ignore_case, per_file)
+    count = 0
+    try:
+        for match in results:
+            yield match
+            count += 1
+            if count >= max_results:
+                return
+    finally:
+        results.close()
+
+
+def search_paths(paths: List[str], pattern: str, ignore_case: bool = False, max_results: int = 100,
+                 max_per_file: Optional[int] = None) -> Iterator[GrepMatch]:
+    """只在给定的文件中搜索字面量pattern（例如经索引筛选出的候选文件），文件较少时直接在当前线程扫描"""
+    per_file = max_per_file or max_results
+    if len(paths) <= FILES_PER_TASK:
+        results = iter(search_files_task(paths, pattern, False, ignore_case, per_file))
+    else:
+        results = run_batches(search_files_task, paths, FILES_PER_TASK, pattern, False, ignore_case, per_file)
+    count = 0
+    try:
+        for match in results:
+            yield match
+            count += 1
+            if count >= max_results:
+                return
+    finally:
+        if hasattr(results, "close"):
+            results.close()
@@ -0,0 +1,202 @@
+"""目录快照与游标分页：同一目录的多次翻页共享一份短期缓存的有序快照
+
+快照在服务器端完成过滤和排序，客户端只需取需要的那一页。
+"""
+import os
+import time
+import uuid
+import base64
+import fnmatch
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+# 快照中的条目只记录名称和类型，大小等信息在取某一页时才读取
+SnapshotEntry = namedtuple("SnapshotEntry", ["name", "is_dir"])
+
+# 列目录选项：sort_by为name/size/mtime；patterns为文件名通配符（忽略大小写，任一匹配即保留），为空时不过滤
+ListOptions = namedtuple("ListOptions", ["sort_by", "descending", "patterns", "hidden"])
+DEFAULT_OPTIONS = ListOptions("name", False, (), True)
+SORT_KEYS = ("name", "size", "mtime")
+
+# 快照有效期（秒）和最多缓存的快照数
+SNAPSHOT_TTL = float(os.environ.get("MCP_SNAPSHOT_TTL", "30"))
+MAX_SNAPSHOTS = int(os.environ.get("MCP_MAX_SNAPSHOTS", "64"))
+
+
+class CursorError(ValueError):
+    """游标无效或对应的快照已过期"""
+
+
+def parse_filter(spec: Optional[str]) -> Tuple[str, ...]:
+    """解析以逗号分隔的过滤条件；不含通配符的扩展名（如 "py" 或 ".py"）等价于 *.py"""
+    patterns = []
+    for item in (spec or "").split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        if not any(c in item for c in "*?["):
+            item = "*." + item.lstrip(".")
+        patterns.append(item)
+    return tuple(patterns)
+
+
+def accept_name(name: str, options: ListOptions) -> bool:
+    """只按名称判断条目是否保留，不需要任何系统调用"""
+    if not options.hidden and name.startswith("."):
+        return False
+    if options.patterns:
+        lowered = name.lower()
+        return any(fnmatch.fnmatchcase(lowered, p) for p in options.patterns)
+    return True
+
+
+def sort_entries(entries: Iterable[Tuple[SnapshotEntry, Optional[int], Optional[float]]],
+                 options: ListOptions) -> List[SnapshotEntry]:
+    """按选项排序 (条目, 大小, mtime)，大小或mtime未知时为None
+
+    利用稳定排序逐级排序，值相同的条目保持按名称的顺序。
+    """
+    items = sorted(entries, key=lambda item: (item[0].name.lower(), item[0].name),
+                   reverse=options.descending and options.sort_by == "name")
+    if options.sort_by == "size":
+        # 目录没有大小，排在文件之后
+        items.sort(key=lambda item: item[1] or 0, reverse=options.descending)
+        items.sort(key=lambda item: item[0].is_dir or item[1] is None)
+    elif options.sort_by == "mtime":
+        items.sort(key=lambda item: item[2] or 0, reverse=options.descending)
+        items.sort(key=lambda item: item[2] is None)
+    else:
+        # 按名称排序时先目录后文件
+        items.sort(key=lambda item: not item[0].is_dir)
+    return [item[0] for item in items]
+
+
+class DirectorySnapshot:
+    """某一时刻目录内容经过滤后的有序快照；默认先目录后文件，各自按名称（忽略大小写）排序"""
+
+    def __init__(self, path: str, mtime_ns: int, entries: List[SnapshotEntry],
+                 options: ListOptions = DEFAULT_OPTIONS):
+        self.id = uuid.uuid4().hex[:16]
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.options = options
+        self.created = time.monotonic()
+
+    @classmethod
+    def scan(cls, path: str, options: ListOptions = DEFAULT_OPTIONS) -> "DirectorySnapshot":
+        """scandir一次完成过滤和排序：类型取自d_type，只有按大小或时间排序时才对保留的条目取stat"""
+        mtime_ns = os.stat(path).st_mtime_ns
+        need_stat = options.sort_by != "name"
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if not accept_name(entry.name, options):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                size = mtime = None
+                if need_stat:
+                    try:
+                        st = entry.stat()
+                        size, mtime = st.st_size, st.st_mtime
+                    except OSError:
+                        pass
+                entries.append((SnapshotEntry(entry.name, is_dir), size, mtime))
+        return cls(path, mtime_ns, sort_entries(entries, options), options)
+
+    def expired(self) -> bool:
+        return time.monotonic() - self.created > SNAPSHOT_TTL
+
+    def page(self, offset: int, limit: int) -> Tuple[List[SnapshotEntry], Optional[str]]:
+        """返回从offset开始的一页条目，以及下一页的游标（没有更多时为None）"""
+        items = self.entries[offset:offset + limit]
+        end = offset + len(items)
+        next_cursor = encode_cursor(self.id, end) if end < len(self.entries) else None
+        return items, next_cursor
+
+
+def encode_cursor(snapshot_id: str, offset: int) -> str:
+    """生成不透明的游标字符串"""
+    raw = f"{snapshot_id}:{offset}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """解析游标，返回 (快照ID, 偏移量)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        snapshot_id, offset = base64.urlsafe_b64decode(padded).decode("ascii").split(":")
+        return snapshot_id, int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise CursorError("无效的游标")
+
+
+class SnapshotCache:
+    """按目录缓存快照：目录未变化且未过期时复用，超出容量时淘汰最久未用的快照"""
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._by_id: "OrderedDict[str, DirectorySnapshot]" = OrderedDict()
+        # (真实路径, 列目录选项) -> 快照
+        self._by_path = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        """清理过期快照并控制缓存大小（调用方需持有锁）"""
+        for snapshot_id in [k for k, s in self._by_id.items() if s.expired()]:
+            self._remove(snapshot_id)
+        while len(self._by_id) > self.max_snapshots:
+            self._remove(next(iter(self._by_id)))
+
+    def _remove(self, snapshot_id: str):
+        snapshot = self._by_id.pop(snapshot_id)
+        key = (snapshot.path, snapshot.options)
+        if self._by_path.get(key) is snapshot:
+            del self._by_path[key]
+
+    def get(self, path: str, options: ListOptions = DEFAULT_OPTIONS) -> DirectorySnapshot:
+        """获取目录在给定选项下的最新快照，必要时重新扫描"""
+        real_path = os.path.realpath(path)
+        with self._lock:
+            self._evict()
+            snapshot = self._by_path.get((real_path, options))
+        if snapshot is not None and snapshot.mtime_ns == os.stat(real_path).st_mtime_ns:
+            with self._lock:
+                if snapshot.id in self._by_id:
+                    self._by_id.move_to_end(snapshot.id)
+            return snapshot
+
+        snapshot = DirectorySnapshot.scan(real_path, options)
+        with self._lock:
+            self._by_id[snapshot.id] = snapshot
+            self._by_path[(real_path, options)] = snapshot
+            self._evict()
+        return snapshot
+
+    def resume(self, path: str, cursor: str,
+               options: ListOptions = DEFAULT_OPTIONS) -> Tuple[DirectorySnapshot, int]:
+        """根据游标找回翻页所用的快照，保证同一轮翻页的顺序稳定"""
+        snapshot_id, offset = decode_cursor(cursor)
+        with self._lock:
+            self._evict()
+            snapshot = self._by_id.get(snapshot_id)
+            if snapshot is not None:
+                self._by_id.move_to_end(snapshot_id)
+        if snapshot is None:
+            raise CursorError("游标已过期，请不带cursor重新列出目录")
+        if snapshot.path != os.path.realpath(path) or offset < 0:
+            raise CursorError("游标与请求的目录不匹配")
+        if snapshot.options != options:
+            raise CursorError("游标与请求的排序或过滤选项不匹配")
+        return snapshot, offset
+
+    def open(self, path: str, cursor: Optional[str] = None,
+             options: ListOptions = DEFAULT_OPTIONS) -> Tuple[DirectorySnapshot, int]:
+        """有游标时续接原快照，否则取最新快照并从头开始"""
+        if cursor:
+            return self.resume(path, cursor, options)
+        return self.get(path, options), 0
@@ -0,0 +1,179 @@
+"""目录占用统计：并行scandir遍历，硬链接只计一次，按目录mtime缓存每个目录的扫描结果"""
+import os
+import stat
+import heapq
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Tuple
+
+from fs_walk import get_walk_pool
+from tool_limits import MAX_TOP
+
+# 单个目录的扫描结果（不含子目录）
+# bytes/files: 本目录下链接数为1的文件；links: 链接数大于1的文件 {(dev, inode): 大小}，汇总时去重
+# top_files: 本目录中最大的若干文件 [(大小, 文件名, 链接数大于1时为(dev, inode)否则为None)]
+# subdirs: 需要继续统计的子目录名（不跟随符号链接）
+DirRecord = namedtuple("DirRecord", ["mtime_ns", "scanned_at", "bytes", "files", "links", "top_files", "subdirs"])
+
+# 汇总结果；directories为直接子目录 [(名称, 字节数, 文件数)]，files为整棵树中最大的文件 [(大小, 相对路径)]
+UsageReport = namedtuple("UsageReport", ["path", "bytes", "files", "dirs", "errors",
+                                         "directories", "top_files", "rescanned", "reused"])
+
+# 缓存的目录记录数上限
+DU_CACHE_SIZE = int(os.environ.get("MCP_DU_CACHE_SIZE", "200000"))
+# 原地改写文件不会改变目录mtime，记录超过该时间（秒）后即使mtime未变也重新扫描
+DU_CACHE_MAX_AGE = float(os.environ.get("MCP_DU_CACHE_MAX_AGE", "300"))
+
+
+def format_size(size: int) -> str:
+    """把字节数格式化为便于阅读的形式"""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if value < 1024 or unit == "TB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{size} B"
+
+
+def _scan(path: str, mtime_ns: int) -> DirRecord:
+    """扫描单个目录的直接条目，只使用DirEntry缓存的lstat结果"""
+    total = files = 0
+    links: Dict[Tuple[int, int], int] = {}
+    sizes: List[Tuple[int, str, Optional[Tuple[int, int]]]] = []
+    subdirs: List[str] = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            key = None
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                key = (st.st_dev, st.st_ino)
+                links[key] = st.st_size
+            else:
+                files += 1
+                total += st.st_size
+            sizes.append((st.st_size, entry.name, key))
+    top_files = heapq.nlargest(MAX_TOP, sizes)
+    return DirRecord(mtime_ns, time.monotonic(), total, files, links, top_files, tuple(subdirs))
+
+
+class DiskUsageCache:
+    """按目录缓存扫描结果；重复查询时只对每个目录取一次stat，mtime未变的目录直接复用"""
+
+    def __init__(self, max_entries: int = DU_CACHE_SIZE, max_age: float = DU_CACHE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._records: "OrderedDict[str, DirRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _record(self, path: str) -> Tuple[Optional[DirRecord], bool]:
+        """返回 (目录记录, 是否重新扫描)；目录无法读取时记录为None"""
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+        except OSError:
+            return None, False
+        now = time.monotonic()
+        with self._lock:
+            cached = self._records.get(path)
+            if cached is not None and cached.mtime_ns == mtime_ns and now - cached.scanned_at < self.max_age:
+                self._records.move_to_end(path)
+                return cached, False
+        try:
+            record = _scan(path, mtime_ns)
+        except OSError:
+            return None, True
+        with self._lock:
+            self._records[path] = record
+            self._records.move_to_end(path)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+        return record, True
+
+    def collect(self, root: str) -> Tuple[Dict[str, DirRecord], int, int, int]:
+        """并行遍历root下的所有目录，返回 ({相对路径: 记录}, 重新扫描数, 复用数, 错误数)"""
+        pool = get_walk_pool()
+        records: Dict[str, DirRecord] = {}
+        rescanned = reused = errors = 0
+        pending = {pool.submit(self._record, root): ""}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel = pending.pop(future)
+                    record, scanned = future.result()
+                    if record is None:
+                        errors += 1
+                        continue
+                    records[rel] = record
+                    if scanned:
+                        rescanned += 1
+                    else:
+                        reused += 1
+                    for name in record.subdirs:
+                        sub_rel = f"{rel}/{name}" if rel else name
+                        pending[pool.submit(self._record, os.path.join(root, sub_rel))] = sub_rel
+        finally:
+            for future in pending:
+                future.cancel()
+        return records, rescanned, reused, errors
+
+    def usage(self, root: str, top: int = 10) -> UsageReport:
+        """统计root的总占用、最重的直接子目录和最大的文件"""
+        top = max(1, min(top, MAX_TOP))
+        records, rescanned, reused, errors = self.collect(root)
+
+        # 按第一级子目录分组汇总，硬链接在每组内和整棵树内分别去重
+        groups: Dict[str, List[DirRecord]] = {}
+        for rel, record in records.items():
+            groups.setdefault(rel.split("/", 1)[0], []).append(record)
+
+        all_links: Dict[Tuple[int, int], int] = {}
+        directories = []
+        for name, group in groups.items():
+            links: Dict[Tuple[int, int], int] = {}
+            for record in group:
+                links.update(record.links)
+            all_links.update(links)
+            if name:
+                size = sum(r.bytes for r in group) + sum(links.values())
+                directories.append((name, size, sum(r.files for r in group) + len(links)))
+        directories.sort(key=lambda d: (-d[1], d[0]))
+
+        # 同一文件的多个硬链接只保留相对路径最小的一个
+        candidates: List[Tuple[int, str]] = []
+        linked: Dict[Tuple[int, int], Tuple[int, str]] = {}
+        for rel, record in records.items():
+            for size, name, key in record.top_files:
+                path = f"{rel}/{name}" if rel else name
+                if key is None:
+                    candidates.append((size, path))
+                elif key not in linked or path < linked[key][1]:
+                    linked[key] = (size, path)
+        candidates.extend(linked.values())
+        top_files = heapq.nlargest(top, candidates)
+        return UsageReport(
+            path=root,
+            bytes=sum(r.bytes for r in records.values()) + sum(all_links.values()),
+            files=sum(r.files for r in records.values()) + len(all_links),
+            dirs=max(0, len(records) - 1),
+            errors=errors,
+            directories=directories[:top],
+            top_files=top_files,
+            rescanned=rescanned,
+            reused=reused,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+# 服务器内共享的统计缓存
+disk_usage_cache = DiskUsageCache()
@@ -0,0 +1,105 @@
+"""重复文件查找：按大小分组 → 首尾部分摘要 → 完整摘要，逐级缩小需要读取的文件"""
+import os
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from fs_walk import walk_matches
+from hashing import digest_files, partial_digest
+from workers import run_batches
+
+# 一组内容相同的文件
+DuplicateGroup = namedtuple("DuplicateGroup", ["size", "digest", "paths"])
+# 各阶段剩余的候选文件数，用于评估跳过了多少I/O；最后阶段分为实际完整读取的文件数和摘要缓存命中数
+DuplicateStats = namedtuple("DuplicateStats", ["files", "size_candidates", "partial_candidates",
+                                               "fully_hashed", "cache_hits"])
+
+# 部分摘要读取文件开头和结尾各多少字节
+PARTIAL_SAMPLE = 4096
+# 每个任务包含的文件数，用于摊薄进程间通信开销
+FILES_PER_TASK = 32
+
+
+def partial_hash_task(paths: List[str], sample: int) -> List[Tuple[str, Optional[str]]]:
+    """工作进程中执行的任务：计算一批文件的首尾部分摘要，读取失败的文件摘要为None"""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, partial_digest(path, sample)))
+        except OSError:
+            results.append((path, None))
+    return results
+
+
+def _regroup(groups: List[List[str]], digests: Dict[str, Optional[str]]) -> List[Tuple[str, List[str]]]:
+    """按摘要细分每个候选组，只保留仍有多个文件的组"""
+    result = []
+    for paths in groups:
+        by_digest: Dict[str, List[str]] = {}
+        for path in paths:
+            digest = digests.get(path)
+            if digest is not None:
+                by_digest.setdefault(digest, []).append(path)
+        result.extend((digest, same) for digest, same in by_digest.items() if len(same) > 1)
+    return result
+
+
+def find_duplicates(directory: str, include: str = "*", min_size: int = 1,
+                    sample: int = PARTIAL_SAMPLE,
+                    include_hidden: bool = True) -> Tuple[List[DuplicateGroup], DuplicateStats]:
+    """查找directory下内容相同的文件，结果按可节省的空间从大到小排列
+
+    硬链接和指向同一文件的符号链接只保留一个路径，不算作重复。
+    include_hidden为False时跳过以.开头的文件和目录。
+    """
+    # 第一阶段：遍历时直接拿到大小，按大小分组
+    by_size: Dict[int, List[str]] = {}
+    files = 0
+    for match in walk_matches(directory, include, kind="file", include_hidden=include_hidden):
+        if match.size < min_size:
+            continue
+        files += 1
+        by_size.setdefault(match.size, []).append(match.path)
+
+    size_groups: List[Tuple[int, List[str]]] = []
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        # 只对候选文件取inode，同一inode只保留一个路径
+        seen = {}
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.setdefault((st.st_dev, st.st_ino), path)
+        if len(seen) > 1:
+            size_groups.append((size, list(seen.values())))
+    size_candidates = sum(len(paths) for _, paths in size_groups)
+
+    # 第二阶段：只读取首尾各sample字节
+    candidates = [path for _, paths in size_groups for path in paths]
+    partial = dict(run_batches(partial_hash_task, candidates, FILES_PER_TASK, sample))
+    size_of = {path: size for size, paths in size_groups for path in paths}
+    partial_groups = _regroup([paths for _, paths in size_groups], partial)
+    partial_candidates = sum(len(paths) for _, paths in partial_groups)
+
+    # 第三阶段：部分摘要已覆盖全部内容的小文件直接确认，其余文件计算完整摘要
+    groups: List[DuplicateGroup] = []
+    need_full: List[List[str]] = []
+    for digest, paths in partial_groups:
+        size = size_of[paths[0]]
+        if size <= sample * 2:
+            groups.append(DuplicateGroup(size, digest, sorted(paths)))
+        else:
+            need_full.append(paths)
+    to_hash = [path for paths in need_full for path in paths]
+    # 完整摘要经由持久缓存，未变化的文件不会被再次读取
+    digests = digest_files(to_hash, "sha256")
+    full = {path: digest for path, (digest, _) in digests.items()}
+    cache_hits = sum(1 for _, cached in digests.values() if cached)
+    fully_hashed = sum(1 for digest, cached in digests.values() if digest is not None and not cached)
+    for digest, paths in _regroup(need_full, full):
+        groups.append(DuplicateGroup(size_of[paths[0]], digest, sorted(paths)))
+
+    groups.sort(key=lambda g: (-g.size * (len(g.paths) - 1), g.paths[0]))
+    return groups, DuplicateStats(files, size_candidates, partial_candidates, fully_hashed, cache_hits)
@@ -0,0 +1,82 @@
+"""阻塞文件系统操作的专用线程池，按工具限制并发，避免阻塞asyncio事件循环"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 线程池大小
+FS_WORKERS = int(os.environ.get("MCP_FS_WORKERS", "16"))
+
+# 各工具默认的并发上限：耗时的遍历/搜索类工具限制得更紧，给file-info等快速查询留出线程
+DEFAULT_TOOL_CONCURRENCY: Dict[str, int] = {
+    "search-files": 4,
+    "grep-files": 2,
+    "search-content": 4,
+    "disk-usage": 2,
+    "top-files": 2,
+    "find-duplicates": 1,
+    "file-hash": 4,
+    "explore-paths": 8,
+    "list-directory": 8,
+}
+# 未单独配置的工具的并发上限
+DEFAULT_CONCURRENCY = int(os.environ.get("MCP_TOOL_CONCURRENCY_DEFAULT", str(FS_WORKERS)))
+# 未单独配置的工具共用的信号量键；键来自客户端提供的工具名，不能为每个名称各建一个信号量
+DEFAULT_KEY = "default"
+
+
+def parse_concurrency(spec: Optional[str]) -> Dict[str, int]:
+    """解析形如 "search-files=2,grep-files=1" 的并发配置"""
+    limits: Dict[str, int] = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, _, value = item.partition("=")
+        try:
+            limits[key.strip()] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+class BlockingExecutor:
+    """在线程池中执行阻塞调用，并用信号量限制每类操作同时占用的线程数"""
+
+    def __init__(self, workers: int = FS_WORKERS, limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = DEFAULT_CONCURRENCY):
+        self.workers = workers
+        self.limits = dict(DEFAULT_TOOL_CONCURRENCY)
+        self.limits.update(limits or {})
+        self.default_limit = default_limit
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fs-worker")
+        return self._pool
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        if key not in self.limits:
+            key = DEFAULT_KEY
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            limit = min(self.limits.get(key, self.default_limit), self.workers)
+            semaphore = self._semaphores[key] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def run(self, key: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """以key对应的并发上限在线程池中执行func"""
+        async with self._semaphore(key):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 服务器共享的执行器，可通过 MCP_FS_WORKERS / MCP_TOOL_CONCURRENCY 环境变量配置
+fs_executor = BlockingExecutor(limits=parse_concurrency(os.environ.get("MCP_TOOL_CONCURRENCY")))
@@ -0,0 +1,447 @@
+"""文件元数据内存索引：每个配置的索引根目录构建一次，并通过inotify保持最新"""
+import os
+import glob
+import stat
+import errno
+import fnmatch
+import atexit
+import sqlite3
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import fs_watch
+
+logger = logging.getLogger('mcp_server.fs_index')
+
+# 单个条目的元数据；路径由所在目录和条目名推出，不重复存储
+IndexEntry = namedtuple("IndexEntry", ["size", "mtime", "is_dir", "inode", "is_link"])
+
+# 增量变化写入持久化快照的间隔（秒）
+SNAPSHOT_FLUSH_INTERVAL = float(os.environ.get("MCP_SNAPSHOT_FLUSH_INTERVAL", "30"))
+# 构建索引时每批写入快照的目录数
+SNAPSHOT_SAVE_BATCH = 500
+# 索引失效（根目录被删除或移动、监听数达到上限等）后，至少间隔这么久（秒）才在查询时重新构建
+INDEX_RETRY_INTERVAL = float(os.environ.get("MCP_INDEX_RETRY_INTERVAL", "60"))
+
+
+def _stat_entry(path: str) -> Optional[IndexEntry]:
+    """读取单个路径的元数据（跟随符号链接，失效链接退回lstat）"""
+    try:
+        st = lst = os.lstat(path)
+    except OSError:
+        return None
+    is_link = stat.S_ISLNK(lst.st_mode)
+    if is_link:
+        try:
+            st = os.stat(path)
+        except OSError:
+            pass
+    return IndexEntry(st.st_size, st.st_mtime, stat.S_ISDIR(st.st_mode), st.st_ino, is_link)
+
+
+class RootIndex:
+    """单个根目录的索引：目录路径 -> {条目名: IndexEntry}"""
+
+    # 索引状态
+    EMPTY, BUILDING, READY, FAILED = "empty", "building", "ready", "failed"
+
+    def __init__(self, root: str, store=None):
+        self.root = root
+        self.state = self.EMPTY
+        self.failed_at = 0.0
+        self._dirs: Dict[str, Dict[str, IndexEntry]] = {}
+        self._lock = threading.RLock()
+        self._watcher: Optional[fs_watch.InotifyWatcher] = None
+        # 持久化快照（snapshot.MetadataStore），以及尚未写入快照的已变化目录
+        self._store = store
+        self._dirty: Set[str] = set()
+        # 沿用快照条目、尚未重新stat过的目录（见_verify）
+        self._unverified: Set[str] = set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    def entry_count(self) -> int:
+        """索引中的条目总数"""
+        with self._lock:
+            return sum(len(entries) for entries in self._dirs.values())
+
+    def build(self, use_snapshot: bool = True):
+        """构建索引并注册inotify监听（在后台线程中调用）
+
+        有持久化快照时先载入快照再校对：mtime变化的目录重新扫描，mtime未变的目录沿用快照，
+        其中的条目在首次查询到该目录时才重新stat。校对完成前索引不提供查询。
+        """
+        self.state = self.BUILDING
+        try:
+            with self._lock:
+                self._unverified.clear()
+            known = self._load_snapshot() if use_snapshot else {}
+            if self._watcher is None:
+                self._watcher = fs_watch.InotifyWatcher(self._on_event)
+                self._watcher.start()
+            if not known:
+                with self._lock:
+                    self._dirs.clear()
+            visited = self._index_tree(self.root, known)
+            if known:
+                # 快照中已不存在的目录
+                stale = [d for d in known if d not in visited]
+                with self._lock:
+                    for d in stale:
+                        self._dirs.pop(d, None)
+                self._delete_snapshot(stale)
+            self.state = self.READY
+            if logger.isEnabledFor(logging.INFO):
+                # 条目计数要遍历整个索引，只在会输出时计算
+                logger.info("索引构建完成: %s，目录 %d 个，条目 %d 个", self.root, len(self._dirs), self.entry_count())
+        except OSError as e:
+            # 最常见的是ENOSPC（inotify监听数达到上限），此时无法保证索引实时性，直接放弃
+            logger.warning("索引构建失败，改为实时扫描: %s (%s)", self.root, e)
+            self.state = self.FAILED
+            self.failed_at = time.monotonic()
+            self.close()
+
+    def _fail(self):
+        """在监听线程中发现索引失效：标记失败并在另一个线程中释放监听（监听线程无法等待自身结束）"""
+        self.state = self.FAILED
+        self.failed_at = time.monotonic()
+        threading.Thread(target=self.close, name=f"index-close:{self.root}", daemon=True).start()
+
+    def close(self):
+        """释放监听与索引数据"""
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        with self._lock:
+            self._dirs.clear()
+            self._unverified.clear()
+
+    def _load_snapshot(self) -> Dict[str, int]:
+        """载入持久化快照作为校对的起点，返回 {目录: 快照时的mtime_ns}"""
+        if self._store is None:
+            return {}
+        try:
+            snapshot = self._store.load_root(self.root)
+        except sqlite3.Error as e:
+            logger.warning("读取元数据快照失败，改为全量扫描: %s (%s)", self.root, e)
+            return {}
+        if not snapshot:
+            return {}
+        with self._lock:
+            self._dirs = {
+                dir_path: {name: IndexEntry(size, mtime, is_dir, inode, is_link)
+                           for name, size, mtime, is_dir, inode, is_link in rows}
+                for dir_path, (_, rows) in snapshot.items()
+            }
+        logger.info("已载入元数据快照: %s，目录 %d 个", self.root, len(snapshot))
+        return {dir_path: mtime_ns for dir_path, (mtime_ns, _) in snapshot.items()}
+
+    def _save_snapshot(self, dirs: List[Tuple[str, int, Dict[str, IndexEntry]]]):
+        if self._store is None or not dirs:
+            return
+        try:
+            self._store.save_dirs(self.root, [
+                (dir_path, mtime_ns, [(name, e.size, e.mtime, e.is_dir, e.inode, e.is_link)
+                                      for name, e in entries.items()])
+                for dir_path, mtime_ns, entries in dirs
+            ])
+        except sqlite3.Error as e:
+            logger.warning("写入元数据快照失败: %s (%s)", self.root, e)
+
+    def _delete_snapshot(self, dir_paths: List[str]):
+        if self._store is None or not dir_paths:
+            return
+        try:
+            self._store.delete_dirs(dir_paths)
+        except sqlite3.Error as e:
+            logger.warning("写入元数据快照失败: %s (%s)", self.root, e)
+
+    def flush(self):
+        """把inotify带来的增量变化写入持久化快照"""
+        if self._store is None or not self.ready:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        changed, gone = [], []
+        for dir_path in dirty:
+            # 先取mtime再复制条目：期间若再有变化，下次启动时mtime不一致会触发重新扫描
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            with self._lock:
+                entries = self._dirs.get(dir_path)
+                entries = dict(entries) if entries is not None else None
+            if mtime_ns is None or entries is None:
+                gone.append(dir_path)
+            else:
+                changed.append((dir_path, mtime_ns, entries))
+        self._save_snapshot(changed)
+        self._delete_snapshot(gone)
+
+    def _index_tree(self, top: str, known: Optional[Dict[str, int]] = None) -> Set[str]:
+        """索引以top为根的子树，返回已索引的目录；先加监听再扫描，避免遗漏扫描期间的变更
+
+        known为快照中各目录的mtime_ns，mtime未变的目录不再扫描，沿用已载入的条目。
+        """
+        stack = [top]
+        visited: Set[str] = set()
+        scanned: List[Tuple[str, int, Dict[str, IndexEntry]]] = []
+        while stack:
+            current = stack.pop()
+            try:
+                self._watcher.add_watch(current)
+                mtime_ns = os.stat(current).st_mtime_ns
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.EACCES, errno.ENOTDIR):
+                    # 跳过不可访问的目录
+                    continue
+                raise
+            if known and known.get(current) == mtime_ns:
+                with self._lock:
+                    entries = self._dirs.get(current)
+                if entries is not None:
+                    # 目录mtime只反映条目的增删改名，原地修改的文件留到查询时再核对
+                    with self._lock:
+                        self._unverified.add(current)
+                    visited.add(current)
+                    stack.extend(os.path.join(current, name) for name, e in entries.items()
+                                 if e.is_dir and not e.is_link)
+                    continue
+            entries = {}
+            try:
+                with os.scandir(current) as it:
+                    for item in it:
+                        try:
+                            st = item.stat()
+                        except OSError:
+                            try:
+                                st = item.stat(follow_symlinks=False)
+                            except OSError:
+                                continue
+                        is_dir = stat.S_ISDIR(st.st_mode)
+                        is_link = item.is_symlink()
+                        entries[item.name] = IndexEntry(st.st_size, st.st_mtime, is_dir, st.st_ino, is_link)
+                        # 不进入符号链接目录，避免环路和重复索引
+                        if is_dir and not is_link:
+                            stack.append(item.path)
+            except OSError:
+                self._watcher.remove_watch(current)
+                continue
+            with self._lock:
+                self._dirs[current] = entries
+            visited.add(current)
+            scanned.append((current, mtime_ns, entries))
+            if len(scanned) >= SNAPSHOT_SAVE_BATCH:
+                self._save_snapshot(scanned)
+                scanned = []
+        self._save_snapshot(scanned)
+        return visited
+
+    def _verify(self, dir_path: str) -> Optional[Dict[str, IndexEntry]]:
+        """返回目录的条目；沿用快照的目录先逐个比较条目的大小和mtime（每个目录只做一次）
+
+        调用方持有self._lock。
+        """
+        entries = self._dirs.get(dir_path)
+        if entries is None or dir_path not in self._unverified:
+            return entries
+        self._unverified.discard(dir_path)
+        fresh: Dict[str, IndexEntry] = {}
+        changed = False
+        for name, old in entries.items():
+            entry = _stat_entry(os.path.join(dir_path, name))
+            if entry is None:
+                changed = True
+                continue
+            if (entry.size, entry.mtime, entry.is_dir) != (old.size, old.mtime, old.is_dir):
+                changed = True
+            fresh[name] = entry
+        if not changed:
+            return entries
+        self._dirs[dir_path] = fresh
+        self._dirty.add(dir_path)
+        return fresh
+
+    def _drop_tree(self, top: str):
+        """从索引中移除整个子树及其监听"""
+        prefix = top + os.sep
+        with self._lock:
+            doomed = [d for d in self._dirs if d == top or d.startswith(prefix)]
+            for d in doomed:
+                del self._dirs[d]
+            self._dirty.update(doomed)
+            self._unverified.difference_update(doomed)
+        for d in doomed:
+            self._watcher.remove_watch(d)
+
+    def _on_event(self, dir_path: Optional[str], name: Optional[str], mask: int):
+        """inotify事件回调：增量更新索引"""
+        if mask & fs_watch.IN_Q_OVERFLOW:
+            # 事件丢失，索引不再可信，后台重建
+            logger.warning("inotify事件队列溢出，重建索引: %s", self.root)
+            self.state = self.BUILDING
+            threading.Thread(target=self.build, args=(False,), daemon=True).start()
+            return
+
+        if mask & (fs_watch.IN_DELETE_SELF | fs_watch.IN_MOVE_SELF):
+            if dir_path == self.root:
+                logger.warning("索引根目录已被删除或移动: %s", self.root)
+                self._fail()
+            return
+
+        if name is None:
+            return
+        path = os.path.join(dir_path, name)
+
+        if mask & (fs_watch.IN_DELETE | fs_watch.IN_MOVED_FROM):
+            with self._lock:
+                listing = self._dirs.get(dir_path)
+                if listing is not None:
+                    listing.pop(name, None)
+                    self._dirty.add(dir_path)
+            if mask & fs_watch.IN_ISDIR:
+                self._drop_tree(path)
+            return
+
+        entry = _stat_entry(path)
+        with self._lock:
+            listing = self._dirs.get(dir_path)
+            if listing is None:
+                return
+            self._dirty.add(dir_path)
+            if entry is None:
+                listing.pop(name, None)
+                return
+            listing[name] = entry
+        if entry.is_dir and mask & (fs_watch.IN_CREATE | fs_watch.IN_MOVED_TO) and not entry.is_link:
+            try:
+                self._index_tree(path)
+            except OSError as e:
+                logger.warning("无法为新目录添加监听，索引失效: %s (%s)", path, e)
+                self._fail()
+
+    def glob(self, directory: str, pattern: str) -> Optional[List[Tuple[str, IndexEntry]]]:
+        """按glob.glob的语义在索引中匹配 directory/pattern
+
+        返回 (路径, 元数据) 列表，路径以调用方传入的directory为前缀；
+        如果查询涉及未被索引的目录，返回None，由调用方退回实时扫描。
+        """
+        if os.path.isabs(pattern):
+            return None
+        parts = [p for p in pattern.replace("\\", "/").split("/") if p and p != "."]
+        if not parts or ".." in parts:
+            return None
+
+        real_dir = os.path.realpath(directory)
+        current: List[Tuple[str, str, Optional[IndexEntry]]] = [(directory, real_dir, None)]
+        with self._lock:
+            for i, part in enumerate(parts):
+                last = i == len(parts) - 1
+                matched = []
+                for shown, real, _ in current:
+                    listing = self._verify(real)
+                    if listing is None:
+                        return None
+                    names: Iterable[str]
+                    if glob.has_magic(part):
+                        names = fnmatch.filter(listing.keys(), part)
+                        if not part.startswith("."):
+                            # 与glob一致：通配符不匹配隐藏文件
+                            names = [n for n in names if not n.startswith(".")]
+                    else:
+                        names = [part] if part in listing else []
+                    for n in names:
+                        entry = listing[n]
+                        if not last and not entry.is_dir:
+                            continue
+                        matched.append((os.path.join(shown, n), os.path.join(real, n), entry))
+                current = matched
+        return sorted((shown, entry) for shown, _, entry in current)
+
+
+class IndexManager:
+    """管理各索引根目录的索引；首次查询某个根目录下的目录时在后台构建其索引"""
+
+    def __init__(self, roots: Iterable[str], enabled: bool = True, store=None):
+        self.enabled = enabled and fs_watch.is_supported()
+        self.store = store
+        self._indexes: Dict[str, RootIndex] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        # 去掉嵌套在其他根目录下的根，避免重复索引同一棵树
+        real_roots = sorted({os.path.realpath(r) for r in roots if os.path.isdir(r)})
+        self.roots: List[str] = []
+        for root in real_roots:
+            if not any(root == r or root.startswith(r.rstrip(os.sep) + os.sep) for r in self.roots):
+                self.roots.append(root)
+
+    def _root_for(self, real_path: str) -> Optional[str]:
+        for root in self.roots:
+            if real_path == root or real_path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def _start(self, root: str) -> RootIndex:
+        """取得根目录的索引，尚未构建、或已失效超过INDEX_RETRY_INTERVAL时在后台开始构建"""
+        with self._lock:
+            index = self._indexes.get(root)
+            if index is None or (index.state == RootIndex.FAILED
+                                 and time.monotonic() - index.failed_at >= INDEX_RETRY_INTERVAL):
+                index = RootIndex(root, self.store)
+                self._indexes[root] = index
+                index.state = RootIndex.BUILDING
+                threading.Thread(target=index.build, name=f"index-build:{root}", daemon=True).start()
+                if self.store is not None and self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="index-flush", daemon=True)
+                    self._flusher.start()
+                    atexit.register(self.flush)
+        return index
+
+    def warm_start(self):
+        """为已有持久化快照的根目录载入快照并在后台校对；只在长期运行的服务中调用
+
+        每次启动都会监听整个根目录树，由调用方决定是否值得（见server.py的MCP_INDEX_WARM_START）。
+        """
+        if not self.enabled or self.store is None:
+            return
+        for root in self.roots:
+            try:
+                has_snapshot = self.store.has_root(root)
+            except sqlite3.Error:
+                continue
+            if has_snapshot:
+                self._start(root)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(SNAPSHOT_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """把各索引的增量变化写入持久化快照"""
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            index.flush()
+
+    def lookup(self, directory: str) -> Optional[RootIndex]:
+        """返回覆盖该目录且已就绪的索引；尚未构建时启动后台构建并返回None"""
+        if not self.enabled:
+            return None
+        root = self._root_for(os.path.realpath(directory))
+        if root is None:
+            return None
+        index = self._start(root)
+        return index if index.ready else None
+
+    def status(self) -> Dict[str, str]:
+        """各根目录索引的状态"""
+        with self._lock:
+            return {root: self._indexes[root].state if root in self._indexes else RootIndex.EMPTY
+                    for root in self.roots}
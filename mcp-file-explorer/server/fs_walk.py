@@ -0,0 +1,153 @@
+"""基于os.scandir的并行递归遍历：流式产出匹配项，达到数量上限立即停止"""
+import os
+import glob
+import fnmatch
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Tuple
+
+# 遍历结果；size/mtime/atime来自DirEntry缓存的stat，目录的size为0
+WalkMatch = namedtuple("WalkMatch", ["path", "rel_path", "size", "mtime", "is_dir", "atime"], defaults=(0.0,))
+
+# 遍历线程数，目录扫描以I/O为主，可超过CPU核数
+WALK_WORKERS = int(os.environ.get("MCP_WALK_WORKERS", "8"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_walk_pool() -> ThreadPoolExecutor:
+    """懒加载共享的遍历线程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WALK_WORKERS, thread_name_prefix="scandir")
+        return _pool
+
+
+def split_pattern(pattern: str) -> Tuple[List[str], List[str]]:
+    """把模式拆成开头的字面路径部分和剩余的匹配部分，字面部分可直接作为遍历起点"""
+    parts = [p for p in pattern.replace("\\", "/").split("/") if p and p != "."]
+    literal = []
+    while len(parts) > 1 and not glob.has_magic(parts[0]) and parts[0] != "..":
+        literal.append(parts.pop(0))
+    return literal, parts
+
+
+def _match_parts(path_parts: Tuple[str, ...], pat_parts: Tuple[str, ...]) -> bool:
+    """逐段匹配相对路径，'**' 可匹配零个或多个目录"""
+    if not pat_parts:
+        return not path_parts
+    head = pat_parts[0]
+    if head == "**":
+        return any(_match_parts(path_parts[i:], pat_parts[1:]) for i in range(len(path_parts) + 1))
+    if not path_parts:
+        return False
+    return fnmatch.fnmatchcase(path_parts[0], head) and _match_parts(path_parts[1:], pat_parts[1:])
+
+
+class PathMatcher:
+    """相对路径匹配器；anywhere为True时只匹配文件名（等价于 '**/模式'）"""
+
+    def __init__(self, pattern_parts: List[str], anywhere: bool = False):
+        self._name_only = pattern_parts[0] if anywhere and len(pattern_parts) == 1 else None
+        self._parts: Tuple[str, ...] = tuple(pattern_parts)
+
+    @property
+    def max_depth(self) -> Optional[int]:
+        """模式能匹配到的最大目录深度，含 '**' 或只匹配文件名时不限"""
+        if self._name_only is not None or "**" in self._parts:
+            return None
+        return len(self._parts) - 1
+
+    def match(self, rel_path: str, name: str) -> bool:
+        if self._name_only is not None:
+            return fnmatch.fnmatchcase(name, self._name_only)
+        return _match_parts(tuple(rel_path.split("/")), self._parts)
+
+
+def _scan_dir(path: str, rel: str, matcher: PathMatcher, kind: str,
+              include_hidden: bool, descend: bool) -> Tuple[List[WalkMatch], List[Tuple[str, str]]]:
+    """扫描单个目录，返回 (匹配项, 待继续遍历的子目录)"""
+    matches: List[WalkMatch] = []
+    subdirs: List[Tuple[str, str]] = []
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return matches, subdirs
+
+    for entry in entries:
+        name = entry.name
+        if not include_hidden and name.startswith("."):
+            continue
+        rel_path = f"{rel}/{name}" if rel else name
+        try:
+            # d_type提示即可判断类型，无需额外stat
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if descend and is_dir and not entry.is_symlink():
+            subdirs.append((entry.path, rel_path))
+        if kind == "file" and is_dir or kind == "directory" and not is_dir:
+            continue
+        if not matcher.match(rel_path, name):
+            continue
+        try:
+            # 只对命中的条目取stat，DirEntry会缓存结果
+            st = entry.stat()
+            size, mtime, atime = (0 if is_dir else st.st_size), st.st_mtime, st.st_atime
+        except OSError:
+            size, mtime, atime = 0, 0.0, 0.0
+        matches.append(WalkMatch(entry.path, rel_path, size, mtime, is_dir, atime))
+    return matches, subdirs
+
+
+def walk_matches(directory: str, pattern: str, max_depth: Optional[int] = None, kind: str = "any",
+                 limit: Optional[int] = None, include_hidden: bool = False) -> Iterator[WalkMatch]:
+    """并行遍历directory并流式产出匹配pattern的条目
+
+    - pattern 支持 '*'、'?'、'[...]' 以及跨目录的 '**'；开头的字面目录直接作为遍历起点，
+      不含 '/' 的模式匹配任意深度的文件名
+    - max_depth 为相对起点的最大目录深度（0表示只看起点目录本身），None表示不限
+    - kind 为 "file"、"directory" 或 "any"
+    - 达到limit后立即停止，并取消尚未开始的目录扫描
+    """
+    literal, pattern_parts = split_pattern(pattern)
+    if not pattern_parts:
+        return
+    start = os.path.join(directory, *literal)
+    rel_prefix = "/".join(literal)
+    # 匹配的是起点之后的相对路径
+    matcher = PathMatcher(pattern_parts, anywhere="/" not in pattern.replace("\\", "/"))
+    if matcher.max_depth is not None:
+        max_depth = matcher.max_depth if max_depth is None else min(max_depth, matcher.max_depth)
+    if not include_hidden and any(p.startswith(".") for p in pattern_parts):
+        include_hidden = True
+
+    pool = get_walk_pool()
+    pending = {pool.submit(_scan_dir, start, "", matcher, kind, include_hidden,
+                           max_depth is None or max_depth > 0): 0}
+    count = 0
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future)
+                matches, subdirs = future.result()
+                for match in matches:
+                    if rel_prefix:
+                        match = match._replace(rel_path=f"{rel_prefix}/{match.rel_path}")
+                    yield match
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+                child_depth = depth + 1
+                descend = max_depth is None or child_depth < max_depth
+                for sub_path, sub_rel in subdirs:
+                    pending[pool.submit(_scan_dir, sub_path, sub_rel, matcher, kind,
+                                        include_hidden, descend)] = child_depth
+    finally:
+        for future in pending:
+            future.cancel()
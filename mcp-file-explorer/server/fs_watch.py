@@ -0,0 +1,172 @@
+"""基于inotify的文件系统变更监听（仅Linux，通过ctypes调用libc，无第三方依赖）"""
+import os
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger('mcp_server.fs_watch')
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# 目录内容及元数据变化需要关注的事件
+DIR_EVENTS = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct("iIII")
+_libc = None
+
+
+def _load_libc():
+    """加载libc并检查inotify符号"""
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith("linux"):
+            _libc = False
+        else:
+            try:
+                lib = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                lib.inotify_init1.argtypes = [ctypes.c_int]
+                lib.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                lib.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                _libc = lib
+            except (OSError, AttributeError):
+                _libc = False
+    return _libc or None
+
+
+def is_supported() -> bool:
+    """当前平台是否支持inotify"""
+    return _load_libc() is not None
+
+
+# 回调签名：callback(目录路径, 条目名, 事件掩码)；队列溢出时目录路径与条目名均为None
+WatchCallback = Callable[[Optional[str], Optional[str], int], None]
+
+
+class InotifyWatcher:
+    """inotify监听器：在后台线程中读取事件并按目录路径回调"""
+
+    def __init__(self, callback: WatchCallback):
+        libc = _load_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "当前平台不支持inotify")
+        self._libc = libc
+        self._callback = callback
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._wd_to_path: Dict[int, str] = {}
+        self._path_to_wd: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_watch(self, path: str, mask: int = DIR_EVENTS | IN_ONLYDIR) -> int:
+        """为目录添加监听，失败时抛出OSError（如ENOSPC表示超出系统监听数上限）"""
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        with self._lock:
+            self._wd_to_path[wd] = path
+            self._path_to_wd[path] = wd
+        return wd
+
+    def remove_watch(self, path: str):
+        """移除目录监听（目录已删除时内核会自动移除，这里忽略错误）"""
+        with self._lock:
+            wd = self._path_to_wd.pop(path, None)
+            if wd is not None:
+                self._wd_to_path.pop(wd, None)
+        if wd is not None:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def watch_count(self) -> int:
+        """当前监听的目录数量"""
+        return len(self._wd_to_path)
+
+    def start(self):
+        """启动后台事件读取线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """停止监听并释放文件描述符"""
+        os.write(self._stop_w, b"x")
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for fd in (self._fd, self._stop_r, self._stop_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _run(self):
+        """事件循环：读取并分发inotify事件"""
+        while True:
+            try:
+                readable, _, _ = select.select([self._fd, self._stop_r], [], [])
+            except InterruptedError:
+                continue
+            if self._stop_r in readable:
+                return
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.warning("读取inotify事件失败: %s", e)
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes):
+        """解析事件缓冲区并逐个回调"""
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._safe_callback(None, None, mask)
+                continue
+
+            with self._lock:
+                path = self._wd_to_path.get(wd)
+                if mask & IN_IGNORED and path is not None:
+                    # 监听已被内核移除（目录删除或显式移除）
+                    del self._wd_to_path[wd]
+                    if self._path_to_wd.get(path) == wd:
+                        del self._path_to_wd[path]
+            if path is None or mask & IN_IGNORED:
+                continue
+            self._safe_callback(path, os.fsdecode(raw_name) if raw_name else None, mask)
+
+    def _safe_callback(self, path: Optional[str], name: Optional[str], mask: int):
+        """调用回调并吞掉异常，避免监听线程退出"""
+        try:
+            self._callback(path, name, mask)
+        except Exception as e:
+            logger.exception("处理inotify事件出错: %s", e)
@@ -0,0 +1,176 @@
+"""文件内容摘要：大块读取并复用缓冲区，结果按 (设备, inode, mtime, 大小) 持久缓存"""
+import os
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from workers import run_batches
+from tool_limits import HASH_ALGORITHMS as ALGORITHMS
+
+# 每次读取的块大小
+READ_CHUNK_SIZE = 1024 * 1024
+# 每个进程池任务包含的文件数
+FILES_PER_TASK = 32
+
+# 持久缓存的位置，设置 MCP_DIGEST_CACHE 为空字符串时只在内存中缓存
+CACHE_DIR = os.environ.get("MCP_CACHE_DIR") or os.path.expanduser("~/.cache/mcp-file-explorer")
+DIGEST_CACHE_PATH = os.environ.get("MCP_DIGEST_CACHE", os.path.join(CACHE_DIR, "digests.sqlite"))
+
+# 缓存键：(设备号, inode, mtime_ns, 大小)，任何一项变化都视为内容可能已变
+FileKey = Tuple[int, int, int, int]
+
+
+def file_key(st: os.stat_result) -> FileKey:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def new_hasher(algorithm: str = "sha256"):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"不支持的摘要算法: {algorithm}")
+    return hashlib.new(algorithm)
+
+
+def file_digest(path: str, algorithm: str = "sha256", buf: Optional[bytearray] = None) -> str:
+    """计算整个文件的摘要；buf为可复用的读缓冲区"""
+    return _digest_with_key(path, algorithm, buf)[0]
+
+
+def _digest_with_key(path: str, algorithm: str, buf: Optional[bytearray]) -> Tuple[str, Optional[FileKey]]:
+    """计算摘要并返回读取前后一致的缓存键；读取期间文件被修改时键为None，结果不入缓存"""
+    hasher = new_hasher(algorithm)
+    if buf is None:
+        buf = bytearray(READ_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        before = file_key(os.fstat(f.fileno()))
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+        after = file_key(os.fstat(f.fileno()))
+    return hasher.hexdigest(), before if before == after else None
+
+
+def partial_digest(path: str, sample: int, algorithm: str = "sha256") -> str:
+    """只计算文件开头和结尾各sample字节的摘要，文件不超过2*sample时等同于完整摘要"""
+    hasher = new_hasher(algorithm)
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= sample * 2:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(sample))
+            f.seek(size - sample)
+            hasher.update(f.read(sample))
+    return hasher.hexdigest()
+
+
+def full_hash_task(paths: List[str], algorithm: str) -> List[Tuple[str, Optional[str], Optional[FileKey]]]:
+    """工作进程中执行的任务：计算一批文件的完整摘要，整批复用同一个读缓冲区"""
+    buf = bytearray(READ_CHUNK_SIZE)
+    results = []
+    for path in paths:
+        try:
+            digest, key = _digest_with_key(path, algorithm, buf)
+            results.append((path, digest, key))
+        except OSError:
+            results.append((path, None, None))
+    return results
+
+
+class DigestCache:
+    """SQLite持久化的摘要缓存；同一inode只保留最新的一条记录"""
+
+    def __init__(self, path: str = DIGEST_CACHE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            target = self.path or ":memory:"
+            try:
+                if self.path:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._conn = sqlite3.connect(target, check_same_thread=False)
+            except (OSError, sqlite3.Error):
+                # 缓存目录不可写时退回内存缓存
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS digests ("
+                " dev INTEGER, ino INTEGER, algorithm TEXT, mtime_ns INTEGER, size INTEGER, digest TEXT,"
+                " PRIMARY KEY (dev, ino, algorithm)) WITHOUT ROWID"
+            )
+        return self._conn
+
+    def get(self, key: FileKey, algorithm: str) -> Optional[str]:
+        dev, ino, mtime_ns, size = key
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT digest FROM digests WHERE dev=? AND ino=? AND algorithm=? AND mtime_ns=? AND size=?",
+                (dev, ino, algorithm, mtime_ns, size),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put_many(self, rows: Iterable[Tuple[FileKey, str, str]]):
+        """写入 (缓存键, 算法, 摘要)"""
+        values = [(dev, ino, algorithm, mtime_ns, size, digest)
+                  for (dev, ino, mtime_ns, size), algorithm, digest in rows]
+        if not values:
+            return
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)", values)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+# 服务器内共享的摘要缓存
+digest_cache = DigestCache()
+
+
+def digest_files(paths: List[str], algorithm: str = "sha256",
+                 cache: DigestCache = digest_cache) -> Dict[str, Tuple[Optional[str], bool]]:
+    """计算多个文件的摘要，返回 {路径: (摘要, 是否命中缓存)}；无法读取的文件摘要为None
+
+    缓存命中的文件不会被读取，其余文件在进程池中分批计算。
+    """
+    new_hasher(algorithm)
+    results: Dict[str, Tuple[Optional[str], bool]] = {}
+    to_hash: List[str] = []
+    for path in paths:
+        try:
+            key = file_key(os.stat(path))
+        except OSError:
+            results[path] = (None, False)
+            continue
+        digest = cache.get(key, algorithm)
+        if digest is not None:
+            results[path] = (digest, True)
+        else:
+            to_hash.append(path)
+
+    fresh = []
+    if len(to_hash) == 1:
+        # 单个文件直接在当前线程计算，省去进程间通信
+        hashed = full_hash_task(to_hash, algorithm)
+    else:
+        hashed = run_batches(full_hash_task, to_hash, FILES_PER_TASK, algorithm)
+    for path, digest, key in hashed:
+        results[path] = (digest, False)
+        if digest is not None and key is not None:
+            fresh.append((key, algorithm, digest))
+    cache.put_many(fresh)
+    return results
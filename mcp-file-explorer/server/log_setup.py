@@ -0,0 +1,83 @@
+"""服务器日志配置：经QueueHandler/QueueListener异步写出，级别、文件、轮转和采样率可配置"""
+import os
+import sys
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 默认安静模式：只输出警告及以上级别，调试日志在级别判断处即被跳过，不做任何格式化
+DEFAULT_LEVEL = "WARNING"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Sampler:
+    """按比例采样每次调用的调试日志，rate为1时全部记录，为0时全部跳过"""
+
+    def __init__(self, rate: float = 1.0):
+        self.rate = rate
+
+    def __call__(self) -> bool:
+        return self.rate >= 1.0 or (self.rate > 0.0 and random.random() < self.rate)
+
+
+# 工具调用调试日志的采样器，由setup_logging配置
+call_log_sampler = Sampler()
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = None,
+                  max_bytes: Optional[int] = None, backups: Optional[int] = None,
+                  sample_rate: Optional[float] = None) -> logging.Logger:
+    """配置日志；未传入的参数依次取环境变量 MCP_LOG_LEVEL、MCP_LOG_FILE、MCP_LOG_MAX_BYTES、
+    MCP_LOG_BACKUPS、MCP_LOG_SAMPLE_RATE，再取默认值。可重复调用，后一次覆盖前一次。"""
+    global _listener
+
+    level = (level or os.environ.get("MCP_LOG_LEVEL") or DEFAULT_LEVEL).upper()
+    log_file = log_file if log_file is not None else os.environ.get("MCP_LOG_FILE", "")
+    max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("MCP_LOG_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backups = backups if backups is not None else int(os.environ.get("MCP_LOG_BACKUPS", DEFAULT_BACKUPS))
+    if sample_rate is None:
+        sample_rate = float(os.environ.get("MCP_LOG_SAMPLE_RATE", "1.0"))
+    call_log_sampler.rate = sample_rate
+
+    # 真正写出日志的处理器运行在监听线程中，调用方只需把记录放入队列
+    formatter = logging.Formatter(LOG_FORMAT)
+    # stdout用于MCP的stdio传输，日志只能写到stderr
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if _listener is not None:
+        _listener.stop()
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(getattr(logging, level, logging.WARNING))
+    return logging.getLogger('mcp_server')
+
+
+def shutdown_logging():
+    """停止监听线程并刷新剩余日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
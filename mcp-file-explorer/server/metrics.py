@@ -0,0 +1,210 @@
+"""工具调用的延迟直方图、计数和事件循环延迟统计，可定期写出Prometheus文本文件"""
+import os
+import time
+import math
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('mcp_server.metrics')
+
+# Prometheus文本文件路径（供node_exporter的textfile收集器读取），为空时不写出
+METRICS_TEXTFILE = os.environ.get("MCP_METRICS_TEXTFILE", "")
+# 写出文本文件的间隔（秒）
+METRICS_INTERVAL = float(os.environ.get("MCP_METRICS_INTERVAL", "15"))
+# 事件循环延迟的采样间隔（秒）
+LOOP_LAG_INTERVAL = float(os.environ.get("MCP_LOOP_LAG_INTERVAL", "0.5"))
+
+# 导出到Prometheus的桶边界（秒），同时也是内部细分桶边界的一部分，保证导出的计数是精确的
+PROMETHEUS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _bucket_bounds() -> List[float]:
+    """10微秒到约100秒之间按2^(1/8)等比划分的桶边界，分位数的相对误差在9%以内"""
+    bounds = {1e-5 * 2 ** (i / 8) for i in range(int(8 * math.log2(1e7)) + 1)}
+    bounds.update(PROMETHEUS_BUCKETS)
+    return sorted(bounds)
+
+
+BUCKET_BOUNDS = _bucket_bounds()
+
+
+class Histogram:
+    """固定边界的直方图：记录一次观测只需一次二分查找和计数加一"""
+
+    def __init__(self, bounds: List[float] = BUCKET_BOUNDS):
+        self.bounds = bounds
+        # 最后一个桶存放超过所有边界的观测
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """按桶内线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def cumulative(self, bounds) -> List[int]:
+        """各给定边界（须是内部边界的子集）以下的累计观测数"""
+        result = []
+        seen = 0
+        i = 0
+        for bound in bounds:
+            while i < len(self.bounds) and self.bounds[i] <= bound:
+                seen += self.counts[i]
+                i += 1
+            result.append(seen)
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """以毫秒为单位的摘要"""
+        return {
+            "p50_ms": round(self.quantile(0.50) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class ToolStats:
+    """单个工具的调用统计"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.bytes = 0
+
+
+class Metrics:
+    """服务器内共享的统计；工具调用在事件循环和工作线程中都可能记录，读写需加锁"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._tools: Dict[str, ToolStats] = {}
+        self.loop_lag = Histogram()
+        self._lag_task: Optional[asyncio.Task] = None
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, error: bool = False):
+        with self._lock:
+            stats = self._tools.get(name)
+            if stats is None:
+                stats = self._tools[name] = ToolStats()
+            stats.latency.observe(seconds)
+            stats.bytes += nbytes
+            if error:
+                stats.errors += 1
+
+    def snapshot(self) -> Dict:
+        """当前统计的结构化快照"""
+        with self._lock:
+            tools = {
+                name: dict(count=stats.latency.count, errors=stats.errors, bytes=stats.bytes,
+                           **stats.latency.summary())
+                for name, stats in sorted(self._tools.items())
+            }
+            lag = dict(samples=self.loop_lag.count, **self.loop_lag.summary())
+        return {"uptime": round(time.time() - self.started, 1), "tools": tools, "event_loop_lag": lag}
+
+    async def _monitor_loop_lag(self, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            with self._lock:
+                self.loop_lag.observe(lag)
+
+    def start_loop_monitor(self, interval: float = LOOP_LAG_INTERVAL):
+        """在当前事件循环中定期采样调度延迟（需在事件循环中调用）"""
+        if self._lag_task is None and interval > 0:
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_loop_lag(interval))
+
+    def prometheus_text(self) -> str:
+        """Prometheus文本格式的全部指标"""
+        lines = [
+            "# HELP mcp_tool_duration_seconds 工具调用耗时",
+            "# TYPE mcp_tool_duration_seconds histogram",
+        ]
+        counters = {
+            "mcp_tool_errors_total": ("工具调用出错次数", []),
+            "mcp_tool_response_bytes_total": ("工具返回的字节数", []),
+        }
+        with self._lock:
+            for name, stats in sorted(self._tools.items()):
+                label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.extend(_histogram_lines("mcp_tool_duration_seconds", stats.latency, f'tool="{label}",'))
+                counters["mcp_tool_errors_total"][1].append(f'mcp_tool_errors_total{{tool="{label}"}} {stats.errors}')
+                counters["mcp_tool_response_bytes_total"][1].append(
+                    f'mcp_tool_response_bytes_total{{tool="{label}"}} {stats.bytes}')
+            lag_lines = _histogram_lines("mcp_event_loop_lag_seconds", self.loop_lag, "")
+        for metric, (help_text, values) in counters.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(values)
+        lines.append("# HELP mcp_event_loop_lag_seconds 事件循环调度延迟")
+        lines.append("# TYPE mcp_event_loop_lag_seconds histogram")
+        lines.extend(lag_lines)
+        lines.append("# HELP mcp_uptime_seconds 服务器运行时间")
+        lines.append("# TYPE mcp_uptime_seconds gauge")
+        lines.append(f"mcp_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """原子地写出文本文件，收集器不会读到写了一半的内容"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def _write_loop(self, path: str, interval: float):
+        while True:
+            try:
+                self.write_textfile(path)
+            except OSError as e:
+                logger.warning("写出指标文件失败: %s (%s)", path, e)
+            time.sleep(interval)
+
+    def start_textfile_writer(self, path: str = METRICS_TEXTFILE, interval: float = METRICS_INTERVAL):
+        """启动后台线程定期写出Prometheus文本文件；未配置路径时不做任何事"""
+        if not path or self._writer is not None:
+            return
+        self._writer = threading.Thread(target=self._write_loop, args=(path, interval),
+                                        name="metrics-writer", daemon=True)
+        self._writer.start()
+
+
+def _histogram_lines(metric: str, hist: Histogram, labels: str) -> List[str]:
+    lines = [
+        f'{metric}_bucket{{{labels}le="{bound:g}"}} {count}'
+        for bound, count in zip(PROMETHEUS_BUCKETS, hist.cumulative(PROMETHEUS_BUCKETS))
+    ]
+    lines.append(f'{metric}_bucket{{{labels}le="+Inf"}} {hist.count}')
+    lines.append(f"{metric}_sum{{{labels.rstrip(',')}}} {hist.total:.6f}" if labels else f"{metric}_sum {hist.total:.6f}")
+    lines.append(f"{metric}_count{{{labels.rstrip(',')}}} {hist.count}" if labels else f"{metric}_count {hist.count}")
+    return lines
+
+
+# 服务器共享的统计
+metrics = Metrics()
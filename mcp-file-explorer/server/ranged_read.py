@@ -0,0 +1,68 @@
+"""file:// 资源的按字节范围读取：只映射所需的窗口，不为整个文件分配缓冲区"""
+import os
+import mmap
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+# 未指定范围时默认读取的字节数
+DEFAULT_TEXT_LENGTH = 32 * 1024
+DEFAULT_BINARY_LENGTH = 1024 * 1024
+# 单次请求允许读取的最大字节数
+MAX_READ_LENGTH = 8 * 1024 * 1024
+# 二进制内容按块返回，每块的大小
+BLOB_CHUNK_SIZE = 256 * 1024
+
+
+class RangeError(ValueError):
+    """offset/length参数无效"""
+
+
+def _int_param(query, name: str) -> Optional[int]:
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise RangeError(f"参数 {name} 必须是整数")
+    if value < 0:
+        raise RangeError(f"参数 {name} 不能为负数")
+    return value
+
+
+def file_uri(path: str) -> str:
+    """本地路径对应的 file:// URI；路径经过百分号编码，文件名中的 '#'、'?'、'%' 等由parse_file_uri原样还原"""
+    return "file://" + quote(path)
+
+
+def parse_file_uri(uri: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """解析 file://路径?offset=N&length=M，返回 (路径, offset, length)，未指定的范围参数为None"""
+    parts = urlsplit(uri)
+    path = unquote(parts.netloc + parts.path)
+    query = parse_qs(parts.query)
+    return path, _int_param(query, "offset"), _int_param(query, "length")
+
+
+def read_range(path: str, offset: int, length: int) -> Tuple[bytes, int]:
+    """读取 [offset, offset+length) 范围内的字节，返回 (数据, 文件总大小)"""
+    length = min(length, MAX_READ_LENGTH)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if offset >= size or length == 0:
+            return b"", size
+        end = min(size, offset + length)
+        # mmap的偏移必须按分配粒度对齐
+        map_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+        try:
+            with mmap.mmap(f.fileno(), end - map_offset, access=mmap.ACCESS_READ, offset=map_offset) as mm:
+                return mm[offset - map_offset:end - map_offset], size
+        except (OSError, ValueError):
+            # 特殊文件（如管道、procfs）不支持mmap，退回普通读取
+            f.seek(offset)
+            return f.read(end - offset), size
+
+
+def split_chunks(data: bytes, chunk_size: int = BLOB_CHUNK_SIZE) -> List[bytes]:
+    """把二进制数据切成多个块"""
+    view = memoryview(data)
+    return [bytes(view[i:i + chunk_size]) for i in range(0, len(data), chunk_size)] or [b""]
@@ -1,24 +1,56 @@
+# 启动统计最先导入，后续各阶段的耗时都从这里开始计算（见startup）
+import startup
+from startup import startup_profile, lazy_import
 import os
-import glob
+import re
+import stat
 import json
+import time
 import asyncio
-from typing import List, Dict, Any, Optional
-import mimetypes
-from mcp.server import Server, NotificationOptions
-import mcp.types as types
-from mcp.server.models import InitializationOptions
-from mcp.server.stdio import stdio_server
+import glob
+import zlib
+import functools
+import posixpath
 import pathlib
+from typing import List, Dict, Any, Optional, Tuple
+with startup_profile.phase("导入mcp"):
+    from mcp.server import Server, NotificationOptions
+    import mcp.types as types
+    from mcp.server.models import InitializationOptions
+    from mcp.server.lowlevel.helper_types import ReadResourceContents
+    from mcp.server.stdio import stdio_server
 import logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('mcp_server.log')
-    ]
-)
-logger = logging.getLogger('mcp_server')
+with startup_profile.phase("导入服务器模块"):
+    from log_setup import setup_logging, call_log_sampler
+    from fs_index import IndexManager
+    from snapshot import open_store
+    from fs_walk import walk_matches
+    from dir_snapshot import (SnapshotCache, SnapshotEntry, CursorError, ListOptions, SORT_KEYS, parse_filter,
+                              accept_name, sort_entries, encode_cursor, decode_cursor)
+    from stat_cache import stat_cache
+    from executor import fs_executor
+    from subscriptions import SubscriptionManager
+    from metrics import metrics, METRICS_TEXTFILE
+    import tracing
+    from tracing import traced
+    from socket_transport import serve_unix
+    import tool_limits
+    from ranged_read import (file_uri, parse_file_uri, read_range, split_chunks, RangeError,
+                             DEFAULT_TEXT_LENGTH, DEFAULT_BINARY_LENGTH)
+# 只在部分工具中用到的模块延迟到首次使用时导入（会连带导入multiprocessing、hashlib等）
+content_search = lazy_import("content_search")
+trigram_index = lazy_import("trigram_index")
+duplicates = lazy_import("duplicates")
+hashing = lazy_import("hashing")
+tree_walk = lazy_import("tree_walk")
+disk_usage_mod = lazy_import("disk_usage")
+top_files_mod = lazy_import("top_files")
+archives = lazy_import("archives")
+# spawn启动的工作进程（以及forkserver的工作进程）会把主模块重新导入为__mp_main__；
+# 工作进程只执行其他模块中的任务函数（见workers.py），跳过日志、索引快照、追踪等服务器初始化
+WORKER_PROCESS = __name__ == "__mp_main__"
+# 日志默认为安静模式，可通过环境变量或命令行参数调整（见log_setup）
+logger = logging.getLogger('mcp_server') if WORKER_PROCESS else setup_logging()
 
 # 初始化MCP服务器
 server = Server("file-explorer")
@@ -30,10 +62,86 @@ ALLOWED_ROOTS = [
     os.getcwd(),  # 当前工作目录
 ]
 
+# 元数据索引：首次搜索某个索引根目录下的目录时在后台构建整棵树，之后由inotify保持最新
+# 索引根目录由环境变量 MCP_INDEX_ROOTS（以os.pathsep分隔）显式指定；未指定时不建索引，始终实时扫描，
+# 避免一次搜索就遍历并监听整个主目录。设置 MCP_INDEX=0 也可关闭索引
+INDEX_ROOTS = [os.path.expanduser(p) for p in os.environ.get("MCP_INDEX_ROOTS", "").split(os.pathsep) if p]
+INDEX_ENABLED = os.environ.get("MCP_INDEX", "1") != "0" and bool(INDEX_ROOTS) and not WORKER_PROCESS
+# 启动时是否立即载入快照并校对、监听有快照的根目录；默认只在套接字服务器模式下预热，
+# 每次按需启动的stdio服务器在首次搜索时才建索引。设置 MCP_INDEX_WARM_START=1 总是预热，=0 从不预热
+INDEX_WARM_START = os.environ.get("MCP_INDEX_WARM_START", "")
+# 索引同时持久化到SQLite快照（见snapshot.py），重启后增量校对
+with startup_profile.phase("打开元数据索引"):
+    file_index = IndexManager(INDEX_ROOTS, enabled=INDEX_ENABLED, store=open_store() if INDEX_ENABLED else None)
+
+# search-files单次返回结果数的上限
+MAX_SEARCH_RESULTS = 1000
+# grep-files单次返回匹配行数的上限
+MAX_GREP_RESULTS = 1000
+
+# find-duplicates单次返回重复组数的上限
+MAX_DUPLICATE_GROUPS = 200
+
+# explore-paths目录树模式的最大深度、每个目录默认显示的子项数、默认和最大节点数
+MAX_TREE_DEPTH = 10
+DEFAULT_TREE_CHILDREN = 20
+DEFAULT_TREE_NODES = 500
+MAX_TREE_NODES = 5000
+
+# batch单次最多包含的操作数，以及默认和最大并发数
+MAX_BATCH_OPERATIONS = 500
+DEFAULT_BATCH_CONCURRENCY = 16
+MAX_BATCH_CONCURRENCY = 64
+
+# file-hash单次最多计算的文件数
+MAX_HASH_FILES = 1000
+
+# search-content使用的trigram索引：首次查询某个目录时在后台构建，之后由inotify增量更新
+# 设置环境变量 MCP_TRIGRAM_INDEX=0 可关闭，始终全量扫描
+TRIGRAM_INDEX_ENABLED = os.environ.get("MCP_TRIGRAM_INDEX", "1") != "0" and not WORKER_PROCESS
+_trigram_indexes = None
+
+def get_trigram_indexes():
+    """trigram索引管理器，首次使用时创建"""
+    global _trigram_indexes
+    if _trigram_indexes is None:
+        _trigram_indexes = trigram_index.TrigramIndexManager(enabled=TRIGRAM_INDEX_ENABLED)
+    return _trigram_indexes
+
+# file:// 资源订阅，文件变化时向订阅的会话发送 resources/updated 通知
+subscriptions = SubscriptionManager()
+
+# 目录快照缓存：list-directory和explore-paths翻页时复用同一份有序快照
+dir_snapshots = SnapshotCache()
+# 目录列表每页的默认和最大条目数
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# 所有工具共用的输出格式参数
+OUTPUT_PROPERTY = {
+    "type": "string",
+    "enum": ["text", "json"],
+    "description": "输出格式（可选，默认text；json返回紧凑的结构化结果，包含truncated和next_cursor字段）"
+}
+
+# 工具和资源清单只构建一次，之后每次list请求直接返回
+_tool_manifest: Optional[List[types.Tool]] = None
+_resource_manifest: Optional[List[types.Resource]] = None
+
 # 工具列表处理器
 @server.list_tools()
 async def list_tools() -> List[types.Tool]:
     """列出可用工具"""
+    return tool_manifest()
+
+def tool_manifest() -> List[types.Tool]:
+    global _tool_manifest
+    if _tool_manifest is None:
+        with startup_profile.phase("构建工具清单"):
+            _tool_manifest = build_tool_manifest()
+    return _tool_manifest
+
+def build_tool_manifest() -> List[types.Tool]:
     return [
         types.Tool(
             name="search-files",
@@ -48,7 +156,25 @@ async def list_tools() -> List[types.Tool]:
                     "directory": {
                         "type": "string",
                         "description": "要搜索的目录（必须在允许的根目录下）"
-                    }
+                    },
+                    "recursive": {
+                        "type": "boolean",
+                        "description": "是否递归搜索子目录（可选，模式中包含**时自动开启）"
+                    },
+                    "max_depth": {
+                        "type": "integer",
+                        "description": "递归搜索的最大深度（可选，0表示只搜索当前目录）"
+                    },
+                    "type": {
+                        "type": "string",
+                        "enum": ["file", "directory", "any"],
+                        "description": "递归搜索时只返回文件或目录（可选，默认any）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "最多返回的结果数（可选，默认20）"
+                    },
+                    "output": OUTPUT_PROPERTY
                 },
                 "required": ["pattern", "directory"]
             }
@@ -62,11 +188,78 @@ async def list_tools() -> List[types.Tool]:
                     "path": {
                         "type": "string",
                         "description": "文件路径"
-                    }
+                    },
+                    "output": OUTPUT_PROPERTY
                 },
                 "required": ["path"]
             }
         ),
+        types.Tool(
+            name="grep-files",
+            description="在指定目录下的文件内容中搜索字符串或正则表达式，返回匹配的行及行号",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "要搜索的字符串（regex为true时按正则表达式处理）"
+                    },
+                    "directory": {
+                        "type": "string",
+                        "description": "要搜索的目录（必须在允许的根目录下），会递归搜索子目录"
+                    },
+                    "regex": {
+                        "type": "boolean",
+                        "description": "是否把pattern当作正则表达式（可选，默认false）"
+                    },
+                    "ignore_case": {
+                        "type": "boolean",
+                        "description": "是否忽略大小写（可选，默认false）"
+                    },
+                    "include": {
+                        "type": "string",
+                        "description": "只搜索文件名匹配该通配符的文件（可选，如*.py）"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "最多返回的匹配行数（可选，默认100）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["pattern", "directory"]
+            }
+        ),
+        types.Tool(
+            name="search-content",
+            description="在目录下的文本文件中搜索子串，借助trigram索引只读取可能匹配的文件（适合对同一代码库反复搜索）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "要搜索的子串（按字面量匹配，至少3个字节时才能用索引缩小范围）"
+                    },
+                    "directory": {
+                        "type": "string",
+                        "description": "要搜索的目录（必须在允许的根目录下），会递归搜索子目录"
+                    },
+                    "ignore_case": {
+                        "type": "boolean",
+                        "description": "是否忽略大小写（可选，默认false）"
+                    },
+                    "include": {
+                        "type": "string",
+                        "description": "只搜索文件名匹配该通配符的文件（可选，如*.py）"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "最多返回的匹配行数（可选，默认100）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["pattern", "directory"]
+            }
+        ),
         # 新增的路径探查工具
         types.Tool(
             name="explore-paths",
@@ -80,25 +273,224 @@ async def list_tools() -> List[types.Tool]:
                     },
                     "depth": {
                         "type": "integer",
-                        "description": "探查深度（可选，默认为1）"
-                    }
+                        "description": f"探查深度（可选，默认为1；大于1时一次返回缩进的目录树，最大{MAX_TREE_DEPTH}）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"每页最多显示的条目数（可选，默认50）；目录树模式下为每个目录最多显示的子项数（默认{DEFAULT_TREE_CHILDREN}）"
+                    },
+                    "max_nodes": {
+                        "type": "integer",
+                        "description": f"目录树模式下最多显示的节点总数（可选，默认{DEFAULT_TREE_NODES}，最多{MAX_TREE_NODES}）"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "翻页游标（可选，使用上一次结果中返回的游标获取下一页）"
+                    },
+                    "output": OUTPUT_PROPERTY
                 }
             }
         ),
         # 添加目录列表工具
         types.Tool(
             name="list-directory",
-            description="列出指定目录下的内容",
+            description="列出指定目录下的内容，可在服务器端排序和过滤（如只取最新的10个文件）；"
+                        "zip/tar归档可作为目录浏览，路径写作 a.zip!/内部路径",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "path": {
                         "type": "string",
                         "description": "要列出内容的目录路径"
-                    }
+                    },
+                    "sort_by": {
+                        "type": "string",
+                        "enum": list(SORT_KEYS),
+                        "description": "排序字段：name（先目录后文件）、size（目录排在文件之后）或mtime（可选，默认name）"
+                    },
+                    "order": {
+                        "type": "string",
+                        "enum": ["asc", "desc"],
+                        "description": "排序方向（可选，按name排序时默认asc，按size/mtime排序时默认desc）"
+                    },
+                    "filter": {
+                        "type": "string",
+                        "description": "只列出名称匹配的条目，多个条件以逗号分隔，忽略大小写（可选，如 *.log 或 py,txt）"
+                    },
+                    "hidden": {
+                        "type": "boolean",
+                        "description": "是否包含以.开头的隐藏条目（可选，默认true）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"每页最多显示的条目数（可选，默认{DEFAULT_PAGE_SIZE}）"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "翻页游标（可选，使用上一次结果中返回的游标获取下一页）"
+                    },
+                    "output": OUTPUT_PROPERTY
                 },
                 "required": ["path"]
             }
+        ),
+        types.Tool(
+            name="disk-usage",
+            description="统计目录占用的空间，返回最大的子目录和文件（硬链接只计一次）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "要统计的目录路径"
+                    },
+                    "top": {
+                        "type": "integer",
+                        "description": f"返回最大的子目录和文件的个数（可选，默认10，最多{tool_limits.MAX_TOP}）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["path"]
+            }
+        ),
+        types.Tool(
+            name="top-files",
+            description="找出目录树中最大、最新或最旧的若干文件（流式遍历，只保留前K个，内存占用与目录树大小无关）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "要查找的目录（必须在允许的根目录下），会递归查找子目录"
+                    },
+                    "by": {
+                        "type": "string",
+                        "enum": list(tool_limits.TOP_KEYS),
+                        "description": "排序字段：size（大小）、mtime（修改时间）或atime（访问时间，取决于文件系统的挂载选项）（可选，默认size）"
+                    },
+                    "order": {
+                        "type": "string",
+                        "enum": ["desc", "asc"],
+                        "description": "desc取值最大的文件（最大、最新），asc取值最小的文件（最小、最旧）（可选，默认desc）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"返回的文件数（可选，默认20，最多{tool_limits.MAX_TOP_FILES}）"
+                    },
+                    "include": {
+                        "type": "string",
+                        "description": "只统计文件名匹配该通配符的文件（可选，如*.log）"
+                    },
+                    "hidden": {
+                        "type": "boolean",
+                        "description": "是否包含以.开头的隐藏文件和隐藏目录中的文件（可选，默认true，与disk-usage的统计范围一致）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["directory"]
+            }
+        ),
+        types.Tool(
+            name="find-duplicates",
+            description="查找目录下内容完全相同的文件（先按大小、再按首尾部分摘要、最后按完整摘要比对）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "要查找的目录（必须在允许的根目录下），会递归查找子目录"
+                    },
+                    "include": {
+                        "type": "string",
+                        "description": "只比较文件名匹配该通配符的文件（可选，如*.jpg）"
+                    },
+                    "min_size": {
+                        "type": "integer",
+                        "description": "参与比较的最小文件大小（字节，可选，默认1，即跳过空文件）"
+                    },
+                    "hidden": {
+                        "type": "boolean",
+                        "description": "是否比较以.开头的隐藏文件和隐藏目录中的文件（可选，默认true，与disk-usage的统计范围一致）"
+                    },
+                    "max_groups": {
+                        "type": "integer",
+                        "description": "最多返回的重复组数（可选，默认20）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["directory"]
+            }
+        ),
+        types.Tool(
+            name="file-hash",
+            description="计算一个或多个文件的SHA-256或BLAKE2摘要（未变化的文件直接使用缓存结果）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "文件路径"
+                    },
+                    "paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": f"多个文件路径（可选，与path二选一，最多{MAX_HASH_FILES}个）"
+                    },
+                    "algorithm": {
+                        "type": "string",
+                        "enum": list(tool_limits.HASH_ALGORITHMS),
+                        "description": "摘要算法（可选，默认sha256）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                }
+            }
+        ),
+        types.Tool(
+            name="batch",
+            description="一次请求中并发执行多个工具调用，结果按请求顺序返回（例如批量获取多个文件的信息）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "operations": {
+                        "type": "array",
+                        "description": f"要执行的操作列表（最多{MAX_BATCH_OPERATIONS}个），不能包含batch本身",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "tool": {"type": "string", "description": "工具名称"},
+                                "arguments": {"type": "object", "description": "该工具的参数"}
+                            },
+                            "required": ["tool"]
+                        }
+                    },
+                    "concurrency": {
+                        "type": "integer",
+                        "description": f"同时执行的操作数上限（可选，默认{DEFAULT_BATCH_CONCURRENCY}，最多{MAX_BATCH_CONCURRENCY}）"
+                    },
+                    "output": OUTPUT_PROPERTY
+                },
+                "required": ["operations"]
+            }
+        ),
+        types.Tool(
+            name="cache-stats",
+            description="查看服务器stat缓存的命中率等统计信息",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "output": OUTPUT_PROPERTY
+                }
+            }
+        ),
+        types.Tool(
+            name="server-stats",
+            description="查看各工具的调用次数、出错次数、返回字节数、延迟分位数（p50/p95/p99）以及事件循环延迟",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "output": OUTPUT_PROPERTY
+                }
+            }
         )
     ]
 
@@ -106,6 +498,12 @@ async def list_tools() -> List[types.Tool]:
 @server.list_resources()
 async def list_resources() -> List[types.Resource]:
     """列出可用资源"""
+    global _resource_manifest
+    if _resource_manifest is None:
+        _resource_manifest = build_resource_manifest()
+    return _resource_manifest
+
+def build_resource_manifest() -> List[types.Resource]:
     resources = []
     
     # 修复：正确创建资源模板
@@ -133,337 +531,1165 @@ async def list_resources() -> List[types.Resource]:
 
 # 读取资源处理器
 @server.read_resource()
-async def read_resource(uri: str) -> List[Dict[str, Any]]:
-    """读取资源内容"""
+async def read_resource(uri: str) -> List[ReadResourceContents]:
+    """读取资源内容，file:// URI 可通过 ?offset=N&length=M 按字节范围分段读取"""
     # 确保uri是字符串
     uri_str = str(uri)  # 转换AnyUrl对象为字符串
-    
+    started = time.perf_counter()
+    contents, failed = [], True
+    try:
+        contents = await fs_executor.run("read-resource", read_resource_sync, uri_str)
+        failed = False
+    except ResourceError as e:
+        contents = [ReadResourceContents(str(e), "text/plain")]
+    finally:
+        nbytes = sum(len(c.content.encode("utf-8")) if isinstance(c.content, str) else len(c.content)
+                     for c in contents)
+        metrics.record("read-resource", time.perf_counter() - started, nbytes, failed)
+    return contents
+
+class ResourceError(Exception):
+    """读取资源失败，消息作为文本内容返回给调用方"""
+
+def read_resource_sync(uri_str: str) -> List[ReadResourceContents]:
+    """读取资源内容（阻塞调用，运行在工作线程中），失败时抛出ResourceError
+
+    file:///a.zip!/inner/path 形式的URI读取归档内的成员或列出归档内的目录。
+    """
     if uri_str.startswith("file://"):
-        path = uri_str[7:]
+        try:
+            path, offset, length = parse_file_uri(uri_str)
+        except RangeError as e:
+            raise ResourceError(f"无效的读取范围: {str(e)}")
         
         # 安全检查：确保路径在允许的目录下
         if not is_path_allowed(path):
-            return [{"uri": uri_str, "text": "访问被拒绝：路径超出允许范围", "mimeType": "text/plain"}]
+            raise ResourceError("访问被拒绝：路径超出允许范围")
+        
+        target = archive_target(path)
+        if target is not None and not is_path_allowed(target[0]):
+            raise ResourceError("访问被拒绝：路径超出允许范围")
         
         try:
-            if os.path.isdir(path):
+            if target is not None:
+                index = archives.archive_cache.get(target[0])
+                member = index.member(target[1])
+                if member is None:
+                    raise ResourceError(f"归档中不存在: {target[1]}")
+                if member.is_dir:
+                    names = sorted(posixpath.basename(m.name) + ("/" if m.is_dir else "")
+                                   for m in index.listdir(member.name))
+                    return [ReadResourceContents("目录内容:\n" + "\n".join(names), "text/plain")]
+                read = functools.partial(index.read, member.name)
+            elif stat_cache.isdir(path):
                 # 如果是目录，列出内容
                 files = os.listdir(path)
                 content = "\n".join(files)
-                return [{"uri": uri_str, "text": f"目录内容:\n{content}", "mimeType": "text/plain"}]
+                return [ReadResourceContents(f"目录内容:\n{content}", "text/plain")]
             else:
-                # 如果是文件，读取内容
-                mime_type, _ = mimetypes.guess_type(path)
-                mime_type = mime_type or "application/octet-stream"
-                
-                # 对于文本文件，读取内容
-                if mime_type.startswith("text/") or mime_type in ["application/json", "application/xml"]:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read(10000)  # 限制大小
-                        if len(content) >= 10000:
-                            content += "\n... (文件过大，仅显示部分内容)"
-                    return [{"uri": uri_str, "text": content, "mimeType": mime_type}]
-                else:
-                    # 对于二进制文件，仅返回元信息
-                    file_size = os.path.getsize(path)
-                    return [{"uri": uri_str, "text": f"二进制文件 ({mime_type}), 大小: {file_size} 字节", "mimeType": "text/plain"}]
-                
+                read = functools.partial(read_range, path)
+            
+            # 如果是文件，读取请求的字节范围
+            mime_type = stat_cache.guess_type(path) or "application/octet-stream"
+            is_text = mime_type.startswith("text/") or mime_type in ["application/json", "application/xml"]
+            ranged = offset is not None or length is not None
+            
+            offset = offset or 0
+            if length is None:
+                length = DEFAULT_TEXT_LENGTH if is_text else DEFAULT_BINARY_LENGTH
+            data, file_size = read(offset, length)
+            end = offset + len(data)
+            
+            # 对于文本文件，返回解码后的文本
+            if is_text:
+                content = data.decode("utf-8", errors="replace")
+                if not ranged and end < file_size:
+                    content += f"\n... (文件过大，仅显示部分内容，共 {file_size} 字节；"
+                    content += f"可使用 {uri_str}?offset={end}&length={length} 继续读取)"
+                return [ReadResourceContents(content, mime_type)]
+            else:
+                # 对于二进制文件，先返回元信息，再按块返回原始数据
+                info = f"二进制文件 ({mime_type}), 大小: {file_size} 字节, 本次返回字节 {offset}-{end}"
+                if end < file_size:
+                    info += f"，下一段偏移: {end}"
+                return [ReadResourceContents(info, "text/plain")] + [
+                    ReadResourceContents(chunk, mime_type) for chunk in split_chunks(data)
+                ]
+        except ResourceError:
+            raise
         except Exception as e:
-            return [{"uri": uri_str, "text": f"读取文件错误: {str(e)}", "mimeType": "text/plain"}]
+            raise ResourceError(f"读取文件错误: {str(e)}")
     
-    return [{"uri": uri_str, "text": "不支持的URI类型", "mimeType": "text/plain"}]
+    raise ResourceError("不支持的URI类型")
+
+# 资源订阅处理器
+@server.subscribe_resource()
+async def subscribe_resource(uri) -> None:
+    """订阅file://资源，资源变化时发送 resources/updated 通知"""
+    uri_str = str(uri)
+    if not uri_str.startswith("file://"):
+        raise ValueError("不支持的URI类型")
+    if not subscriptions.supported:
+        raise ValueError("当前平台不支持资源订阅")
+    path, _, _ = parse_file_uri(uri_str)
+    if not is_path_allowed(path):
+        raise ValueError("访问被拒绝：路径超出允许范围")
+    # 归档内的资源随归档文件一起变化
+    target = archive_target(path)
+    if target is not None:
+        path = target[0]
+        if not is_path_allowed(path):
+            raise ValueError("访问被拒绝：路径超出允许范围")
+    try:
+        subscriptions.subscribe(server.request_context.session, uri_str, path)
+    except OSError as e:
+        raise ValueError(f"无法订阅资源: {str(e)}")
+
+@server.unsubscribe_resource()
+async def unsubscribe_resource(uri) -> None:
+    """取消订阅file://资源"""
+    subscriptions.unsubscribe(server.request_context.session, str(uri))
 
 # 工具调用处理器
 @server.call_tool()
 async def call_tool(
     name: str, arguments: Dict[str, Any]
 ) -> List[types.TextContent | types.ImageContent | types.EmbeddedResource]:
-    """处理工具调用"""
-    logger.debug(f"工具调用: {name}, 参数: {arguments}")
+    """处理工具调用：文件系统操作在专用线程池中执行，慢操作不会阻塞其他请求"""
+    if logger.isEnabledFor(logging.DEBUG) and call_log_sampler():
+        logger.debug("工具调用: %s, 参数: %s", name, arguments)
+    started = time.perf_counter()
+    contents, failed = [], True
+    try:
+        if name == "batch":
+            contents, failed = await run_batch(arguments)
+        else:
+            contents, failed = await fs_executor.run(name, traced(handle_tool, name), name, arguments)
+        return contents
+    finally:
+        # 耗时包含在线程池中排队的时间，即调用方实际等待的时间
+        # 未知工具名统一记为unknown，避免统计项无限增长
+        metric_name = name if name in TOOL_HANDLERS or name == "batch" else "unknown"
+        metrics.record(metric_name, time.perf_counter() - started, content_bytes(contents), failed)
+
+# 请求 _meta 带有traceparent时，服务器端span随结果一起返回（见tracing）
+if not WORKER_PROCESS:
+    tracing.install(server)
+
+def content_bytes(contents) -> int:
+    """工具返回的文本内容的字节数"""
+    return sum(len(c.text.encode("utf-8")) for c in contents if isinstance(c, types.TextContent))
+
+async def run_batch(arguments: Dict[str, Any]) -> Tuple[List[types.TextContent], bool]:
+    """batch：并发执行多个工具调用，结果按请求顺序返回；返回 (内容, 是否有操作出错)"""
+    as_json = arguments.get("output") == "json"
+    operations = arguments.get("operations")
+    if not isinstance(operations, list) or not operations:
+        error = "operations必须是非空数组"
+    elif len(operations) > MAX_BATCH_OPERATIONS:
+        error = f"一次最多执行{MAX_BATCH_OPERATIONS}个操作"
+    else:
+        error = None
+    if error:
+        return [types.TextContent(type="text", text=to_json({"error": error}) if as_json else error)], True
     
-    if name == "search-files":
-        pattern = arguments.get("pattern", "")
-        directory = arguments.get("directory", "")
-        
-        # 安全检查
-        if not is_path_allowed(directory):
-            return [types.TextContent(
-                type="text", 
-                text="访问被拒绝：指定的目录超出允许范围"
-            )]
-        
-        try:
-            search_path = os.path.join(directory, pattern)
-            files = glob.glob(search_path)
+    try:
+        concurrency = int(arguments.get("concurrency", DEFAULT_BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_BATCH_CONCURRENCY
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, MAX_BATCH_CONCURRENCY)))
+    
+    async def run_one(operation) -> Dict[str, Any]:
+        if not isinstance(operation, dict) or not isinstance(operation.get("arguments", {}), dict):
+            return {"tool": None, "error": "操作格式错误，应为 {tool, arguments}"}
+        tool = operation.get("tool")
+        tool_args = operation.get("arguments") or {}
+        if not isinstance(tool, str):
+            return {"tool": None, "error": "操作格式错误，tool必须是字符串"}
+        if tool == "batch":
+            return {"tool": tool, "error": "batch不能嵌套"}
+        # 每个操作仍受各自工具的并发上限约束
+        async with semaphore:
+            started = time.perf_counter()
+            payload, error = await fs_executor.run(tool, traced(run_tool, tool), tool, tool_args)
+            # 批内操作也计入各自工具的统计（不计返回字节数，批次整体的字节数记在batch上）
+            metrics.record(tool if tool in TOOL_HANDLERS else "unknown", time.perf_counter() - started, 0,
+                           error is not None)
+        if error is not None:
+            return {"tool": tool, "error": error}
+        if tool_args.get("output") == "json":
+            return {"tool": tool, "result": payload}
+        return {"tool": tool, "text": TOOL_HANDLERS[tool][1](payload)}
+    
+    results = await asyncio.gather(*(run_one(op) for op in operations))
+    # 任一操作出错时整个批次计为出错，批次的错误率才能反映在统计中
+    failed = any("error" in result for result in results)
+    if as_json:
+        # 各操作的结构化结果直接嵌入，整个批次只序列化一次
+        return [types.TextContent(type="text", text=to_json({
+            "results": results, "truncated": False, "next_cursor": None,
+        }))], failed
+    
+    sections = []
+    for i, result in enumerate(results, 1):
+        if "error" in result:
+            body = f"错误: {result['error']}"
+        elif "text" in result:
+            body = result["text"]
+        else:
+            body = to_json(result["result"])
+        sections.append(f"[{i}] {result['tool']}\n{body}")
+    return [types.TextContent(type="text", text="\n\n".join(sections))], failed
+
+class ToolError(Exception):
+    """工具调用失败，消息原样返回给调用方（json输出时放在error字段中）"""
+
+def to_json(payload: Dict[str, Any]) -> str:
+    """紧凑序列化结构化结果"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+def entry_record(name: str, is_dir: bool, size: Optional[int] = None,
+                 mtime: Optional[float] = None) -> Dict[str, Any]:
+    """目录条目的结构化记录"""
+    return {"name": name, "type": "directory" if is_dir else "file", "size": size, "mtime": mtime}
+
+def handle_tool(
+    name: str, arguments: Dict[str, Any]
+) -> Tuple[List[types.TextContent | types.ImageContent | types.EmbeddedResource], bool]:
+    """执行具体的工具逻辑（阻塞调用，运行在工作线程中），返回 (内容, 是否出错)"""
+    as_json = arguments.get("output") == "json"
+    payload, error = run_tool(name, arguments)
+    if error is not None:
+        text = to_json({"error": error}) if as_json else error
+        return [types.TextContent(type="text", text=text)], True
+    
+    if as_json:
+        return [types.TextContent(type="text", text=to_json(payload))], False
+    
+    contents = [types.TextContent(type="text", text=TOOL_HANDLERS[name][1](payload))]
+    if payload.get("uri"):
+        # 为文件内容创建资源引用
+        contents.append(types.ResourceLink(
+            type="resource_link",
+            uri=payload["uri"],
+            name=f"文件内容: {os.path.basename(payload['path'])}",
+            description="查看文件完整内容"
+        ))
+    return contents, False
+
+def run_tool(name: str, arguments: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """执行工具并返回 (结构化结果, 错误信息)，两者恰有一个为None"""
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        # 如果是未知工具，返回错误
+        return None, f"未知工具: {name}"
+    try:
+        payload = handler[0](arguments)
+    except ToolError as e:
+        return None, str(e)
+    # 所有工具的结构化结果都带分页字段，客户端可以用同一种方式解析
+    payload.setdefault("truncated", False)
+    payload.setdefault("next_cursor", None)
+    return payload, None
+
+def search_files(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """search-files：按通配符搜索文件，支持递归模式"""
+    pattern = arguments.get("pattern", "")
+    directory = arguments.get("directory", "")
+    recursive = bool(arguments.get("recursive", False) or "**" in pattern)
+    try:
+        limit = max(1, min(int(arguments.get("limit", 20)), MAX_SEARCH_RESULTS))
+    except (TypeError, ValueError):
+        raise ToolError("limit必须是整数")
+    
+    # 安全检查
+    if not is_path_allowed(directory):
+        raise ToolError("访问被拒绝：指定的目录超出允许范围")
+    
+    try:
+        if recursive:
+            # 流式遍历，达到结果上限后立即停止，不会遍历整棵目录树
+            found = list(walk_matches(
+                directory,
+                pattern,
+                max_depth=arguments.get("max_depth"),
+                kind=arguments.get("type", "any"),
+                limit=limit + 1,
+            ))
+            total = None
+            truncated = len(found) > limit
+            records = [
+                entry_record(m.rel_path, m.is_dir, None if m.is_dir else m.size, m.mtime)
+                for m in sorted(found[:limit], key=lambda m: m.rel_path)
+            ]
+        else:
+            # 优先使用已就绪的索引，未被索引的根目录退回实时扫描
+            matches = None
+            index = file_index.lookup(directory)
+            if index is not None:
+                matches = index.glob(directory, pattern)
             
-            if not files:
-                return [types.TextContent(
-                    type="text", 
-                    text=f"没有找到匹配 '{pattern}' 的文件"
-                )]
+            if matches is None:
+                files = glob.glob(os.path.join(directory, pattern))
+                indexed = {}
+            else:
+                files = [path for path, _ in matches]
+                indexed = dict(matches)
             
-            result = f"找到 {len(files)} 个匹配项:\n\n"
-            for file in files[:20]:  # 限制结果数量
+            total = len(files)
+            truncated = total > limit
+            records = []
+            for file in files[:limit]:  # 限制结果数量
                 rel_path = os.path.relpath(file, directory)
+                entry = indexed.get(file)
+                if entry is not None:
+                    records.append(entry_record(rel_path, entry.is_dir,
+                                                None if entry.is_dir else entry.size, entry.mtime))
+                    continue
                 try:
-                    size = os.path.getsize(file)
-                    mtime = os.path.getmtime(file)
-                    result += f"- {rel_path} ({size} 字节, 修改时间: {mtime})\n"
-                except:
-                    result += f"- {rel_path} (无法获取文件信息)\n"
-            
-            if len(files) > 20:
-                result += f"\n... 共 {len(files)} 个结果，仅显示前20个"
-                
-            return [types.TextContent(type="text", text=result)]
-        except Exception as e:
-            # 确保即使发生错误也返回有意义的信息
-            return [types.TextContent(
-                type="text", 
-                text=f"搜索错误: {str(e)}\n路径: {directory}\n模式: {pattern}"
-            )]
+                    st = stat_cache.stat(file)
+                    is_dir = stat.S_ISDIR(st.st_mode)
+                    records.append(entry_record(rel_path, is_dir, None if is_dir else st.st_size, st.st_mtime))
+                except (OSError, AttributeError):
+                    records.append(entry_record(rel_path, False))
+    except Exception as e:
+        # 确保即使发生错误也返回有意义的信息
+        raise ToolError(f"搜索错误: {str(e)}\n路径: {directory}\n模式: {pattern}")
+    
+    return {
+        "directory": directory,
+        "pattern": pattern,
+        "recursive": recursive,
+        "total": total,
+        "limit": limit,
+        "records": records,
+        "truncated": truncated,
+        "next_cursor": None,
+    }
+
+def render_search_files(payload: Dict[str, Any]) -> str:
+    records = payload["records"]
+    if not records:
+        return f"没有找到匹配 '{payload['pattern']}' 的文件"
+    
+    total = payload["total"] if payload["total"] is not None else len(records)
+    lines = [f"找到 {total} 个匹配项:", ""]
+    for r in records:
+        if r["mtime"] is None:
+            lines.append(f"- {r['name']} (无法获取文件信息)")
+        elif r["type"] == "directory":
+            lines.append(f"- {r['name']}/ (目录, 修改时间: {r['mtime']})")
+        else:
+            lines.append(f"- {r['name']} ({r['size']} 字节, 修改时间: {r['mtime']})")
+    
+    if payload["truncated"]:
+        if payload["total"] is None:
+            lines.append(f"\n... 已达到结果上限{payload['limit']}个，可能还有更多匹配项")
+        else:
+            lines.append(f"\n... 共 {payload['total']} 个结果，仅显示前{payload['limit']}个")
+    return "\n".join(lines)
+
+def grep_files_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """grep-files：在文件内容中搜索字符串或正则"""
+    pattern = arguments.get("pattern", "")
+    directory = arguments.get("directory", "")
+    try:
+        max_results = max(1, min(int(arguments.get("max_results", 100)), MAX_GREP_RESULTS))
+    except (TypeError, ValueError):
+        raise ToolError("max_results必须是整数")
+    
+    # 安全检查
+    if not is_path_allowed(directory):
+        raise ToolError("访问被拒绝：指定的目录超出允许范围")
+    
+    if not pattern:
+        raise ToolError("搜索内容不能为空")
+    
+    try:
+        found = list(content_search.grep_files(
+            directory,
+            pattern,
+            regex=arguments.get("regex", False),
+            ignore_case=arguments.get("ignore_case", False),
+            include=arguments.get("include") or "*",
+            max_results=max_results + 1,
+        ))
+    except re.error as e:
+        raise ToolError(f"正则表达式错误: {str(e)}")
+    except Exception as e:
+        raise ToolError(f"内容搜索错误: {str(e)}\n路径: {directory}\n内容: {pattern}")
+    
+    records = [
+        {"path": path, "line": line_no, "text": line}
+        for path, line_no, line in sorted(
+            (os.path.relpath(m.path, directory), m.line_no, m.line) for m in found[:max_results]
+        )
+    ]
+    return {
+        "directory": directory,
+        "pattern": pattern,
+        "max_results": max_results,
+        "records": records,
+        "truncated": len(found) > max_results,
+        "next_cursor": None,
+    }
+
+def render_grep_files(payload: Dict[str, Any]) -> str:
+    records = payload["records"]
+    if not records:
+        return f"没有找到包含 '{payload['pattern']}' 的文件"
+    
+    lines = [f"找到 {len(records)} 处匹配:", ""]
+    lines.extend(f"{r['path']}:{r['line']}: {r['text']}" for r in records)
+    if payload["truncated"]:
+        lines.append(f"\n... 已达到结果上限{payload['max_results']}条，可能还有更多匹配")
+    return "\n".join(lines)
+
+def search_content(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """search-content：先用trigram索引筛选候选文件，再逐个确认匹配"""
+    pattern = arguments.get("pattern", "")
+    directory = arguments.get("directory", "")
+    ignore_case = bool(arguments.get("ignore_case", False))
+    include = arguments.get("include") or "*"
+    try:
+        max_results = max(1, min(int(arguments.get("max_results", 100)), MAX_GREP_RESULTS))
+    except (TypeError, ValueError):
+        raise ToolError("max_results必须是整数")
+    
+    # 安全检查
+    if not is_path_allowed(directory):
+        raise ToolError("访问被拒绝：指定的目录超出允许范围")
+    
+    if not pattern:
+        raise ToolError("搜索内容不能为空")
+    
+    real_dir = os.path.realpath(directory)
+    index, state = get_trigram_indexes().lookup(real_dir)
+    if index is not None and not index.covers(real_dir, include):
+        # 索引不含隐藏文件，查询范围涉及隐藏文件时改为实时扫描，保证两种方式的结果相同
+        index = None
+    try:
+        if index is not None:
+            paths = index.candidates(pattern, real_dir, include)
+            found = list(content_search.search_paths(paths, pattern, ignore_case, max_results + 1))
+            candidates = len(paths)
+        else:
+            # 索引尚未就绪（或已关闭）时退回全量扫描
+            found = list(content_search.grep_files(real_dir, pattern, False, ignore_case, include, max_results + 1))
+            candidates = None
+    except Exception as e:
+        raise ToolError(f"内容搜索错误: {str(e)}\n路径: {directory}\n内容: {pattern}")
+    
+    records = [
+        {"path": path, "line": line_no, "text": line}
+        for path, line_no, line in sorted(
+            (os.path.relpath(m.path, real_dir), m.line_no, m.line) for m in found[:max_results]
+        )
+    ]
+    return {
+        "directory": directory,
+        "pattern": pattern,
+        "max_results": max_results,
+        "index": state,
+        "candidates": candidates,
+        "records": records,
+        "truncated": len(found) > max_results,
+        "next_cursor": None,
+    }
+
+def render_search_content(payload: Dict[str, Any]) -> str:
+    text = render_grep_files(payload)
+    if payload["candidates"] is not None:
+        return text + f"\n\n(索引筛选出 {payload['candidates']} 个候选文件)"
+    if payload["index"] == "building":
+        return text + "\n\n(trigram索引正在后台构建，本次为全量扫描)"
+    return text
+
+def file_info(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """file-info：获取文件的详细信息"""
+    path = arguments.get("path", "")
+    
+    # 安全检查
+    if not is_path_allowed(path):
+        raise ToolError("访问被拒绝：指定的文件路径超出允许范围")
+    
+    target = archive_target(path)
+    if target is not None:
+        return archive_member_info(path, *target)
+    
+    try:
+        stats = stat_cache.stat(path)
+        if stats is None:
+            raise ToolError(f"文件不存在: {path}")
             
-    elif name == "file-info":
-        path = arguments.get("path", "")
+        mime_type = stat_cache.guess_type(path)
+        is_dir = stat.S_ISDIR(stats.st_mode)
         
-        # 安全检查
-        if not is_path_allowed(path):
-            return [types.TextContent(
-                type="text", 
-                text="访问被拒绝：指定的文件路径超出允许范围"
-            )]
+        info = entry_record(os.path.basename(path), is_dir, stats.st_size, stats.st_mtime)
+        info.update({
+            "path": path,
+            "ctime": stats.st_ctime,
+            "atime": stats.st_atime,
+            "mime_type": mime_type,
+            "uri": file_uri(os.path.abspath(path)),
+        })
+        if not is_dir and archives.is_archive(path):
+            # 归档可以作为目录浏览
+            info["archive_uri"] = archives.archive_uri(path)
         
+        # 对于文本文件，添加预览
+        if mime_type and mime_type.startswith("text/"):
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    preview = f.read(500)
+                    if len(preview) >= 500:
+                        preview += "...(截断)"
+                info["preview"] = preview
+            except OSError:
+                info["preview"] = "无法读取预览"
+        return info
+    except ToolError:
+        raise
+    except Exception as e:
+        raise ToolError(f"获取文件信息错误: {str(e)}")
+
+def archive_member_info(path: str, archive_path: str, member_name: str) -> Dict[str, Any]:
+    """file-info：归档内成员的信息"""
+    index = open_archive(archive_path)
+    member = index.member(member_name)
+    if member is None:
+        raise ToolError(f"归档中不存在: {member_name}\n归档: {archive_path}")
+    
+    mime_type = None if member.is_dir else stat_cache.guess_type(member.name)
+    info = entry_record(posixpath.basename(member.name) or os.path.basename(archive_path), member.is_dir,
+                        None if member.is_dir else member.size, member.mtime)
+    info.update({
+        "path": path,
+        "archive": archive_path,
+        "compressed_size": None if member.is_dir else member.compressed_size,
+        "mime_type": mime_type,
+        "uri": archives.archive_uri(archive_path, member.name),
+    })
+    
+    # 对于文本文件，添加预览（只解压开头的一小段）
+    if mime_type and mime_type.startswith("text/"):
         try:
-            if not os.path.exists(path):
-                return [types.TextContent(type="text", text=f"文件不存在: {path}")]
-                
-            stats = os.stat(path)
-            mime_type, _ = mimetypes.guess_type(path)
+            data, _ = index.read(member.name, 0, 2048)
+            preview = data.decode("utf-8", errors="ignore")[:500]
+            if len(preview) >= 500:
+                preview += "...(截断)"
+            info["preview"] = preview
+        except (OSError, ValueError, EOFError):
+            info["preview"] = "无法读取预览"
+    return info
+
+def render_file_info(info: Dict[str, Any]) -> str:
+    if "archive" in info:
+        lines = [
+            f"文件信息 - {info['path']}",
+            f"所在归档: {info['archive']}",
+            f"类型: {'目录' if info['type'] == 'directory' else '文件'}",
+        ]
+        if info["type"] != "directory":
+            lines.extend([
+                f"MIME类型: {info['mime_type'] or '未知'}",
+                f"大小: {info['size']} 字节（压缩后 {info['compressed_size']} 字节）",
+            ])
+        lines.append(f"修改时间: {info['mtime']}")
+        if "preview" in info:
+            lines.append(f"\n预览:\n{info['preview']}")
+        return "\n".join(lines) + "\n"
+    
+    lines = [
+        f"文件信息 - {info['path']}",
+        f"类型: {'目录' if info['type'] == 'directory' else '文件'}",
+        f"MIME类型: {info['mime_type'] or '未知'}",
+        f"大小: {info['size']} 字节",
+        f"创建时间: {info['ctime']}",
+        f"修改时间: {info['mtime']}",
+        f"访问时间: {info['atime']}",
+    ]
+    if "archive_uri" in info:
+        lines.append(f"归档可作为目录浏览: list-directory path=\"{info['path']}!/\"")
+    if "preview" in info:
+        lines.append(f"\n预览:\n{info['preview']}")
+    return "\n".join(lines) + "\n"
+
+def page_records(snapshot, items) -> List[Dict[str, Any]]:
+    """为快照中的一页条目生成结构化记录，只对这一页的条目取stat"""
+    records = []
+    for item in items:
+        try:
+            st = stat_cache.stat(os.path.join(snapshot.path, item.name))
+        except OSError:
+            st = None
+        records.append(entry_record(
+            item.name,
+            item.is_dir,
+            st.st_size if st is not None and not item.is_dir else None,
+            st.st_mtime if st is not None else None,
+        ))
+    return records
+
+def render_entries(records: List[Dict[str, Any]]) -> List[str]:
+    """把条目记录渲染为先目录后文件的列表"""
+    lines = []
+    dirs = [r for r in records if r["type"] == "directory"]
+    files = [r for r in records if r["type"] != "directory"]
+    if dirs:
+        lines.append("目录:")
+        lines.extend(f"- 📁 {r['name']}" for r in dirs)
+        lines.append("")
+    if files:
+        lines.append("文件:")
+        lines.extend(
+            f"- 📄 {r['name']} ({r['size']} 字节)" if r["size"] is not None else f"- 📄 {r['name']}"
+            for r in files
+        )
+    return lines
+
+def explore_paths(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """explore-paths：探查并列出可访问的路径"""
+    base_path = arguments.get("base_path", os.getcwd())
+    try:
+        depth = max(1, min(int(arguments.get("depth", 1)), MAX_TREE_DEPTH))
+    except (TypeError, ValueError):
+        depth = 1
+    
+    # 如果基础路径未指定，列出所有允许的根目录
+    if not base_path or base_path == ".":
+        return {"mode": "roots", "roots": [root for root in ALLOWED_ROOTS if stat_cache.exists(root)]}
+    
+    # 安全检查
+    if not is_path_allowed(base_path):
+        raise ToolError(f"访问被拒绝：路径 {base_path} 超出允许范围")
+    
+    try:
+        # 探查指定路径
+        path_obj = pathlib.Path(base_path)
+        stats = stat_cache.stat(base_path)
+        if stats is None:
+            raise ToolError(f"路径不存在: {base_path}")
             
-            info = {
-                "path": path,
-                "size": stats.st_size,
-                "created": stats.st_ctime,
-                "modified": stats.st_mtime,
-                "accessed": stats.st_atime,
-                "is_directory": os.path.isdir(path),
-                "mime_type": mime_type or "未知"
+        if not stat.S_ISDIR(stats.st_mode):
+            # 如果是文件，展示文件信息并附带资源引用
+            info = entry_record(path_obj.name, False, stats.st_size, stats.st_mtime)
+            info.update({"mode": "file", "path": str(path_obj), "uri": file_uri(str(path_obj.resolve()))})
+            return info
+        
+        if depth > 1:
+            # 多层探查：一次调用按层展开整棵子树，不再逐层往返
+            if arguments.get("cursor"):
+                raise ToolError("目录树模式（depth大于1）不支持cursor翻页，请缩小base_path或depth")
+            try:
+                max_nodes = max(1, min(int(arguments.get("max_nodes", DEFAULT_TREE_NODES)), MAX_TREE_NODES))
+            except (TypeError, ValueError):
+                max_nodes = DEFAULT_TREE_NODES
+            root, nodes, truncated = tree_walk.walk_tree(
+                str(path_obj), depth, page_size(arguments, DEFAULT_TREE_CHILDREN), max_nodes
+            )
+            tree = root.to_dict()
+            return {
+                "mode": "tree",
+                "path": str(path_obj),
+                "parent": str(path_obj.parent) if path_obj.parent != path_obj else None,
+                "depth": depth,
+                "nodes": nodes,
+                "max_nodes": max_nodes,
+                "children": tree.get("children", []),
+                "omitted": tree.get("omitted", 0),
+                "truncated": truncated,
+                "next_cursor": None,
             }
-            
-            # 对于文本文件，添加预览
-            if mime_type and mime_type.startswith("text/"):
-                try:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        preview = f.read(500)
-                        if len(preview) >= 500:
-                            preview += "...(截断)"
-                    info["preview"] = preview
-                except:
-                    info["preview"] = "无法读取预览"
-            
-            result = f"文件信息 - {path}\n"
-            result += f"类型: {'目录' if info['is_directory'] else '文件'}\n"
-            result += f"MIME类型: {info['mime_type']}\n"
-            result += f"大小: {info['size']} 字节\n"
-            result += f"创建时间: {info['created']}\n"
-            result += f"修改时间: {info['modified']}\n"
-            result += f"访问时间: {info['accessed']}\n"
-            
-            if "preview" in info:
-                result += f"\n预览:\n{info['preview']}\n"
-                
-            # 为文件内容创建资源引用
-            resource_uri = f"file://{path}"
-            
-            # 返回文本内容和嵌入资源
-            return [
-                types.TextContent(type="text", text=result),
-                types.EmbeddedResource(
-                    type="resource",
-                    resource={  # 使用字典而不是Resource对象
-                        "uri": resource_uri,
-                        "name": f"文件内容: {os.path.basename(path)}",
-                        "description": "查看文件完整内容"
-                    }
-                )
-            ]
-            
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"获取文件信息错误: {str(e)}")]
-            
-    # 添加新工具：explore-paths
-    elif name == "explore-paths":
-        base_path = arguments.get("base_path", os.getcwd())
-        depth = arguments.get("depth", 1)
         
+        # 如果是目录，按稳定顺序分页列出内容
+        limit = page_size(arguments, 50)
         try:
-            # 如果基础路径未指定，列出所有允许的根目录
-            if not base_path or base_path == ".":
-                result = "可访问的根目录:\n\n"
-                for root in ALLOWED_ROOTS:
-                    if os.path.exists(root):
-                        result += f"- {root}\n"
-                
-                return [types.TextContent(type="text", text=result)]
+            snapshot, offset = dir_snapshots.open(base_path, arguments.get("cursor"))
+            items, next_cursor = snapshot.page(offset, limit)
+            records = page_records(snapshot, items)
+        except CursorError as e:
+            raise ToolError(f"翻页失败: {str(e)}")
+        except OSError as e:
+            raise ToolError(f"读取目录内容时出错: {str(e)}")
+        
+        return {
+            "mode": "directory",
+            "path": str(path_obj),
+            "parent": str(path_obj.parent) if path_obj.parent != path_obj else None,
+            "total": len(snapshot.entries),
+            "offset": offset,
+            "records": records,
+            "truncated": next_cursor is not None,
+            "next_cursor": next_cursor,
+        }
+    except ToolError:
+        raise
+    except Exception as e:
+        raise ToolError(f"路径探查错误: {str(e)}")
+
+def render_explore_paths(payload: Dict[str, Any]) -> str:
+    if payload["mode"] == "roots":
+        return "可访问的根目录:\n\n" + "".join(f"- {root}\n" for root in payload["roots"])
+    
+    if payload["mode"] == "file":
+        return (f"文件信息: {payload['path']}\n"
+                f"大小: {payload['size']} 字节\n"
+                f"修改时间: {payload['mtime']}\n")
+    
+    if payload["mode"] == "tree":
+        lines = [f"目录树: {payload['path']} (深度 {payload['depth']}, 共 {payload['nodes']} 项)", ""]
+        lines.extend(tree_walk.render_tree(payload["children"], payload["omitted"]))
+        if payload["nodes"] >= payload["max_nodes"]:
+            lines.append(f"\n(已达到节点上限{payload['max_nodes']}，部分内容未显示)")
+        lines.append("\n提示: 使用 'explore-paths' 工具指定子目录可以继续展开")
+        return "\n".join(lines)
+    
+    records = payload["records"]
+    lines = [f"目录内容: {payload['path']}", ""]
+    lines.extend(render_entries(records))
+    
+    # 如果内容过多
+    if payload["next_cursor"]:
+        offset = payload["offset"]
+        lines.append(f"\n(显示第{offset + 1}-{offset + len(records)}项，共{payload['total']}项；"
+                     f"使用 cursor=\"{payload['next_cursor']}\" 查看下一页)")
+    
+    # 显示父目录和导航提示
+    lines.append("\n导航:")
+    if payload["parent"]:  # 不是根目录
+        lines.append(f"- 上级目录: {payload['parent']}")
+    lines.append("\n提示: 使用 'explore-paths' 工具可以继续浏览目录")
+    return "\n".join(lines)
+
+def list_directory(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """list-directory：分页列出目录内容"""
+    path = arguments.get("path", os.getcwd())
+    
+    # 安全检查
+    if not is_path_allowed(path):
+        raise ToolError("访问被拒绝：指定的目录路径超出允许范围")
+    
+    target = archive_target(path)
+    if target is not None:
+        return list_archive(path, *target, arguments)
+        
+    try:
+        stats = stat_cache.stat(path)
+        if stats is None:
+            raise ToolError(f"路径不存在: {path}")
             
-            # 安全检查
-            if not is_path_allowed(base_path):
-                return [types.TextContent(
-                    type="text", 
-                    text=f"访问被拒绝：路径 {base_path} 超出允许范围"
-                )]
-                
-            # 探查指定路径
-            path_obj = pathlib.Path(base_path)
-            if not path_obj.exists():
-                return [types.TextContent(
-                    type="text", 
-                    text=f"路径不存在: {base_path}"
-                )]
-                
-            if path_obj.is_file():
-                # 如果是文件，展示文件信息
-                stats = path_obj.stat()
-                result = f"文件信息: {path_obj}\n"
-                result += f"大小: {stats.st_size} 字节\n"
-                result += f"修改时间: {stats.st_mtime}\n"
-                
-                # 添加文件资源引用
-                resource_uri = f"file://{path_obj}"
-                
-                return [
-                    types.TextContent(type="text", text=result),
-                    types.EmbeddedResource(
-                        type="resource",
-                        resource=types.Resource(
-                            uri=resource_uri,
-                            name=f"文件内容: {path_obj.name}",
-                            description=f"查看文件完整内容"
-                        )
-                    )
-                ]
-            else:
-                # 如果是目录，列出内容
-                result = f"目录内容: {path_obj}\n\n"
-                
-                # 列出子目录和文件
-                dirs = []
-                files = []
-                
-                try:
-                    # 限制列表项数量，避免过多
-                    max_items = 50
-                    count = 0
-                    
-                    for item in path_obj.iterdir():
-                        if count >= max_items:
-                            break
-                            
-                        # 区分目录和文件
-                        try:
-                            is_dir = item.is_dir()
-                            if is_dir:
-                                dirs.append(f"📁 {item.name}")
-                            else:
-                                size = item.stat().st_size
-                                files.append(f"📄 {item.name} ({size} 字节)")
-                            count += 1
-                        except:
-                            continue
-                            
-                    # 先显示目录，再显示文件
-                    if dirs:
-                        result += "目录:\n"
-                        for d in sorted(dirs):
-                            result += f"- {d}\n"
-                        result += "\n"
-                        
-                    if files:
-                        result += "文件:\n"
-                        for f in sorted(files):
-                            result += f"- {f}\n"
-                            
-                    # 如果内容过多
-                    if count >= max_items:
-                        result += f"\n(仅显示前{max_items}项，目录可能包含更多内容)"
-                        
-                    # 显示父目录和导航提示
-                    result += f"\n\n导航:\n"
-                    
-                    if path_obj.parent != path_obj:  # 不是根目录
-                        parent_path = path_obj.parent
-                        result += f"- 上级目录: {parent_path}\n"
-                        
-                    result += f"\n提示: 使用 'explore-paths' 工具可以继续浏览目录"
-                        
-                    return [types.TextContent(type="text", text=result)]
-                        
-                except Exception as e:
-                    return [types.TextContent(type="text", text=f"读取目录内容时出错: {str(e)}")]
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"路径探查错误: {str(e)}")]
+        if not stat.S_ISDIR(stats.st_mode):
+            raise ToolError(f"指定路径不是目录: {path}")
             
-    # 添加新工具：list-directory
-    elif name == "list-directory":
-        path = arguments.get("path", os.getcwd())
+        options = list_options(arguments)
+        # 取目录快照的一页，翻页时沿用同一快照保证顺序稳定
+        limit = page_size(arguments, DEFAULT_PAGE_SIZE)
+        snapshot, offset = dir_snapshots.open(path, arguments.get("cursor"), options)
+        items, next_cursor = snapshot.page(offset, limit)
         
-        # 安全检查
-        if not is_path_allowed(path):
-            return [types.TextContent(
-                type="text", 
-                text=f"访问被拒绝：指定的目录路径超出允许范围"
-            )]
-            
+        return {
+            "path": path,
+            "sort_by": options.sort_by,
+            "order": "desc" if options.descending else "asc",
+            "filter": list(options.patterns),
+            "hidden": options.hidden,
+            "total": len(snapshot.entries),
+            "offset": offset,
+            "records": page_records(snapshot, items),
+            "truncated": next_cursor is not None,
+            "next_cursor": next_cursor,
+        }
+    except ToolError:
+        raise
+    except CursorError as e:
+        raise ToolError(f"翻页失败: {str(e)}")
+    except Exception as e:
+        raise ToolError(f"列出目录内容时出错: {str(e)}")
+
+def list_archive(path: str, archive_path: str, member_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """list-directory：列出归档内的目录"""
+    options = list_options(arguments)
+    index = open_archive(archive_path)
+    member = index.member(member_name)
+    if member is None:
+        raise ToolError(f"归档中不存在: {member_name}\n归档: {archive_path}")
+    if not member.is_dir:
+        raise ToolError(f"指定路径不是目录: {path}")
+    
+    entries = sort_entries(
+        ((SnapshotEntry(posixpath.basename(m.name), m.is_dir), None if m.is_dir else m.size, m.mtime)
+         for m in index.listdir(member.name) if accept_name(posixpath.basename(m.name), options)),
+        options,
+    )
+    # 归档内容由归档的mtime唯一确定，游标只需记录mtime和选项，无需缓存快照
+    tag = f"{index.mtime_ns:x}{zlib.crc32(repr(options).encode('utf-8')):08x}"
+    offset = 0
+    if arguments.get("cursor"):
         try:
-            path_obj = pathlib.Path(path)
-            if not path_obj.exists():
-                return [types.TextContent(type="text", text=f"路径不存在: {path}")]
-                
-            if not path_obj.is_dir():
-                return [types.TextContent(type="text", text=f"指定路径不是目录: {path}")]
-                
-            # 列出目录内容
-            items = list(path_obj.iterdir())
-            
-            result = f"目录 {path} 中有 {len(items)} 个项目:\n\n"
-            
-            # 分类并排序
-            dirs = []
-            files = []
-            
-            for item in items:
-                try:
-                    if item.is_dir():
-                        dirs.append(item)
-                    else:
-                        files.append(item)
-                except:
-                    continue
-                    
-            # 显示目录
-            if dirs:
-                result += "目录:\n"
-                for d in sorted(dirs, key=lambda x: x.name.lower()):
-                    result += f"- 📁 {d.name}\n"
-                result += "\n"
-                
-            # 显示文件
-            if files:
-                result += "文件:\n"
-                for f in sorted(files, key=lambda x: x.name.lower()):
-                    try:
-                        size = f.stat().st_size
-                        result += f"- 📄 {f.name} ({size} 字节)\n"
-                    except:
-                        result += f"- 📄 {f.name}\n"
-                        
-            return [types.TextContent(type="text", text=result)]
-            
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"列出目录内容时出错: {str(e)}")]
-            
-    # 如果是未知工具，返回错误
-    return [types.TextContent(type="text", text=f"未知工具: {name}")]
+            cursor_tag, offset = decode_cursor(arguments["cursor"])
+        except CursorError as e:
+            raise ToolError(f"翻页失败: {str(e)}")
+        if cursor_tag != tag or offset < 0:
+            raise ToolError("翻页失败: 归档已变化或排序、过滤选项与游标不匹配，请不带cursor重新列出")
+    limit = page_size(arguments, DEFAULT_PAGE_SIZE)
+    items = entries[offset:offset + limit]
+    end = offset + len(items)
+    next_cursor = encode_cursor(tag, end) if end < len(entries) else None
+    
+    records = []
+    for item in items:
+        m = index.member(posixpath.join(member.name, item.name))
+        records.append(entry_record(item.name, item.is_dir, None if item.is_dir else m.size, m.mtime))
+    return {
+        "path": path,
+        "archive": archive_path,
+        "sort_by": options.sort_by,
+        "order": "desc" if options.descending else "asc",
+        "filter": list(options.patterns),
+        "hidden": options.hidden,
+        "total": len(entries),
+        "offset": offset,
+        "records": records,
+        "truncated": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
+def hidden_argument(arguments: Dict[str, Any]) -> bool:
+    """读取hidden参数（是否包含以.开头的隐藏条目，默认true），兼容字符串形式的布尔值"""
+    hidden = arguments.get("hidden", True)
+    if isinstance(hidden, str):
+        hidden = hidden.lower() not in ("false", "0", "no")
+    return bool(hidden)
+
+def list_options(arguments: Dict[str, Any]) -> ListOptions:
+    """读取list-directory的排序和过滤参数"""
+    sort_by = arguments.get("sort_by") or "name"
+    if sort_by not in SORT_KEYS:
+        raise ToolError(f"不支持的排序字段: {sort_by}（可选 {', '.join(SORT_KEYS)}）")
+    order = arguments.get("order") or ("asc" if sort_by == "name" else "desc")
+    if order not in ("asc", "desc"):
+        raise ToolError(f"不支持的排序方向: {order}（可选 asc、desc）")
+    return ListOptions(sort_by, order == "desc", parse_filter(arguments.get("filter")), hidden_argument(arguments))
+
+def render_list_directory(payload: Dict[str, Any]) -> str:
+    records = payload["records"]
+    conditions = []
+    if payload["filter"]:
+        conditions.append(f"匹配 {', '.join(payload['filter'])}")
+    if not payload["hidden"]:
+        conditions.append("不含隐藏条目")
+    scope = f"（{'，'.join(conditions)}）" if conditions else ""
+    lines = [f"目录 {payload['path']} 中有 {payload['total']} 个项目{scope}:", ""]
+    if payload["sort_by"] == "name":
+        # 快照已按先目录后文件、名称排序
+        lines.extend(render_entries(records))
+    else:
+        # 按大小或时间排序时保持快照中的顺序
+        lines.append(f"按{payload['sort_by']}{'降序' if payload['order'] == 'desc' else '升序'}:")
+        for r in records:
+            if r["type"] == "directory":
+                lines.append(f"- 📁 {r['name']} (修改时间: {r['mtime']})")
+            else:
+                lines.append(f"- 📄 {r['name']} ({r['size']} 字节, 修改时间: {r['mtime']})")
+    
+    if payload["next_cursor"]:
+        offset = payload["offset"]
+        lines.append(f"\n(显示第{offset + 1}-{offset + len(records)}项；"
+                     f"使用 cursor=\"{payload['next_cursor']}\" 查看下一页)")
+    return "\n".join(lines) + "\n"
+
+def disk_usage(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """disk-usage：统计目录树占用的空间"""
+    path = arguments.get("path", "")
+    
+    # 安全检查
+    if not is_path_allowed(path):
+        raise ToolError("访问被拒绝：指定的目录路径超出允许范围")
+    
+    if not stat_cache.isdir(path):
+        raise ToolError(f"指定路径不是目录: {path}")
+    
+    try:
+        top = int(arguments.get("top", 10))
+    except (TypeError, ValueError):
+        top = 10
+    
+    try:
+        report = disk_usage_mod.disk_usage_cache.usage(os.path.abspath(path), top)
+    except Exception as e:
+        raise ToolError(f"统计目录占用时出错: {str(e)}")
+    
+    return {
+        "path": path,
+        "size": report.bytes,
+        "files": report.files,
+        "dirs": report.dirs,
+        "errors": report.errors,
+        "directories": [
+            {"name": name, "type": "directory", "size": size, "files": files}
+            for name, size, files in report.directories
+        ],
+        "top_files": [{"path": rel_path, "type": "file", "size": size} for size, rel_path in report.top_files],
+        "rescanned": report.rescanned,
+        "reused": report.reused,
+        "truncated": False,
+        "next_cursor": None,
+    }
+
+def render_disk_usage(payload: Dict[str, Any]) -> str:
+    lines = [
+        f"目录 {payload['path']} 共占用 {disk_usage_mod.format_size(payload['size'])} "
+        f"({payload['size']} 字节)，{payload['files']} 个文件，{payload['dirs']} 个子目录",
+    ]
+    if payload["errors"]:
+        lines.append(f"有 {payload['errors']} 个目录无法读取，未计入统计")
+    
+    if payload["directories"]:
+        lines.extend(["", "最大的子目录:"])
+        lines.extend(f"- 📁 {d['name']}: {disk_usage_mod.format_size(d['size'])} ({d['files']} 个文件)"
+                     for d in payload["directories"])
+    if payload["top_files"]:
+        lines.extend(["", "最大的文件:"])
+        lines.extend(f"- 📄 {f['path']}: {disk_usage_mod.format_size(f['size'])}" for f in payload["top_files"])
+    
+    lines.append(f"\n(重新扫描 {payload['rescanned']} 个目录，复用缓存 {payload['reused']} 个)")
+    return "\n".join(lines)
+
+def top_files_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """top-files：按大小或时间取目录树中排在最前的文件"""
+    directory = arguments.get("directory", "")
+    
+    # 安全检查
+    if not is_path_allowed(directory):
+        raise ToolError("访问被拒绝：指定的目录超出允许范围")
+    
+    if not stat_cache.isdir(directory):
+        raise ToolError(f"指定路径不是目录: {directory}")
+    
+    by = arguments.get("by") or "size"
+    if by not in tool_limits.TOP_KEYS:
+        raise ToolError(f"不支持的排序字段: {by}（可选 {', '.join(tool_limits.TOP_KEYS)}）")
+    order = arguments.get("order") or "desc"
+    if order not in ("desc", "asc"):
+        raise ToolError(f"不支持的排序方向: {order}（可选 desc、asc）")
+    try:
+        limit = max(1, min(int(arguments.get("limit", 20)), tool_limits.MAX_TOP_FILES))
+    except (TypeError, ValueError):
+        raise ToolError("limit必须是整数")
+    
+    try:
+        matches, scanned = top_files_mod.top_files(directory, by=by, k=limit, ascending=order == "asc",
+                                                   pattern=arguments.get("include") or "*",
+                                                   include_hidden=hidden_argument(arguments))
+    except Exception as e:
+        raise ToolError(f"查找文件时出错: {str(e)}\n路径: {directory}")
+    
+    return {
+        "directory": directory,
+        "by": by,
+        "order": order,
+        "files": [dict(entry_record(m.rel_path, False, m.size, m.mtime), atime=m.atime) for m in matches],
+        "scanned": scanned,
+        "truncated": False,
+        "next_cursor": None,
+    }
+
+def render_top_files(payload: Dict[str, Any]) -> str:
+    if not payload["files"]:
+        return f"在目录 {payload['directory']} 中未找到文件"
+    titles = {
+        ("size", "desc"): "最大的文件", ("size", "asc"): "最小的文件",
+        ("mtime", "desc"): "最近修改的文件", ("mtime", "asc"): "最久未修改的文件",
+        ("atime", "desc"): "最近访问的文件", ("atime", "asc"): "最久未访问的文件",
+    }
+    lines = [f"目录 {payload['directory']} 中{titles[(payload['by'], payload['order'])]}"
+             f"（共扫描 {payload['scanned']} 个文件）:", ""]
+    for f in payload["files"]:
+        detail = disk_usage_mod.format_size(f["size"]) if payload["by"] == "size" else f"{payload['by']}: {f[payload['by']]}"
+        lines.append(f"- 📄 {f['name']}: {detail}")
+    return "\n".join(lines)
+
+def find_duplicates_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """find-duplicates：查找内容相同的文件"""
+    directory = arguments.get("directory", "")
+    
+    # 安全检查
+    if not is_path_allowed(directory):
+        raise ToolError("访问被拒绝：指定的目录超出允许范围")
+    
+    if not stat_cache.isdir(directory):
+        raise ToolError(f"指定路径不是目录: {directory}")
+    
+    try:
+        max_groups = max(1, min(int(arguments.get("max_groups", 20)), MAX_DUPLICATE_GROUPS))
+        min_size = max(0, int(arguments.get("min_size", 1)))
+    except (TypeError, ValueError):
+        raise ToolError("max_groups和min_size必须是整数")
+    
+    try:
+        groups, stats = duplicates.find_duplicates(directory, include=arguments.get("include") or "*", min_size=min_size,
+                                                   include_hidden=hidden_argument(arguments))
+    except Exception as e:
+        raise ToolError(f"查找重复文件时出错: {str(e)}\n路径: {directory}")
+    
+    return {
+        "directory": directory,
+        "groups": [
+            {
+                "size": group.size,
+                "sha256": group.digest,
+                "wasted": group.size * (len(group.paths) - 1),
+                "paths": [os.path.relpath(path, directory) for path in group.paths],
+            }
+            for group in groups[:max_groups]
+        ],
+        "total_groups": len(groups),
+        "wasted": sum(group.size * (len(group.paths) - 1) for group in groups),
+        "stats": stats._asdict(),
+        "truncated": len(groups) > max_groups,
+        "next_cursor": None,
+    }
+
+def render_find_duplicates(payload: Dict[str, Any]) -> str:
+    stats = payload["stats"]
+    summary = (f"(共比较 {stats['files']} 个文件：大小相同 {stats['size_candidates']} 个，"
+               f"首尾摘要相同 {stats['partial_candidates']} 个，完整读取 {stats['fully_hashed']} 个，"
+               f"摘要缓存命中 {stats['cache_hits']} 个)")
+    if not payload["groups"]:
+        return f"没有找到重复文件\n{summary}"
+    
+    lines = [f"找到 {payload['total_groups']} 组重复文件，可节省 {disk_usage_mod.format_size(payload['wasted'])}:", ""]
+    for group in payload["groups"]:
+        lines.append(f"{len(group['paths'])} 个文件，每个 {disk_usage_mod.format_size(group['size'])} "
+                     f"(sha256: {group['sha256'][:16]}...):")
+        lines.extend(f"- {path}" for path in group["paths"])
+        lines.append("")
+    if payload["truncated"]:
+        lines.append(f"... 仅显示可节省空间最多的前{len(payload['groups'])}组\n")
+    lines.append(summary)
+    return "\n".join(lines)
+
+def file_hash(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """file-hash：计算文件摘要"""
+    paths = arguments.get("paths") or []
+    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+        raise ToolError("paths必须是字符串数组")
+    paths = list(paths)
+    if arguments.get("path"):
+        if not isinstance(arguments["path"], str):
+            raise ToolError("path必须是字符串")
+        paths.insert(0, arguments["path"])
+    if not paths:
+        raise ToolError("请指定path或paths")
+    if len(paths) > MAX_HASH_FILES:
+        raise ToolError(f"一次最多计算{MAX_HASH_FILES}个文件的摘要")
+    
+    algorithm = arguments.get("algorithm") or "sha256"
+    if algorithm not in hashing.ALGORITHMS:
+        raise ToolError(f"不支持的摘要算法: {algorithm}，可选: {', '.join(hashing.ALGORITHMS)}")
+    
+    # 安全检查，目录和超出范围的路径单独报错，不影响其他文件
+    errors = {}
+    for path in paths:
+        if not is_path_allowed(path):
+            errors[path] = "访问被拒绝：路径超出允许范围"
+        elif not stat_cache.isfile(path):
+            errors[path] = "不是文件或文件不存在"
+    
+    try:
+        digests = hashing.digest_files([path for path in dict.fromkeys(paths) if path not in errors], algorithm)
+    except Exception as e:
+        raise ToolError(f"计算摘要时出错: {str(e)}")
+    
+    records = []
+    for path in paths:
+        digest, cached = digests.get(path, (None, False))
+        if digest is None:
+            records.append({"path": path, "error": errors.get(path, "无法读取文件")})
+        else:
+            records.append({"path": path, "digest": digest, "cached": cached})
+    return {"algorithm": algorithm, "records": records, "truncated": False, "next_cursor": None}
+
+def render_file_hash(payload: Dict[str, Any]) -> str:
+    lines = []
+    for r in payload["records"]:
+        if "error" in r:
+            lines.append(f"{r['path']}: 错误: {r['error']}")
+        else:
+            lines.append(f"{r['digest']}  {r['path']}")
+    cached = sum(1 for r in payload["records"] if r.get("cached"))
+    lines.append(f"\n({payload['algorithm']}，{cached} 个文件使用缓存结果)")
+    return "\n".join(lines)
+
+def cache_stats(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """cache-stats：stat缓存统计"""
+    return stat_cache.stats()
+
+def render_cache_stats(payload: Dict[str, Any]) -> str:
+    return "stat缓存统计:\n" + "".join(f"- {key}: {value}\n" for key, value in payload.items())
+
+def server_stats(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """server-stats：工具调用和事件循环延迟统计"""
+    return metrics.snapshot()
+
+def render_server_stats(payload: Dict[str, Any]) -> str:
+    lines = [f"服务器已运行 {payload['uptime']} 秒", ""]
+    if payload["tools"]:
+        lines.append("工具调用统计（延迟单位毫秒，含排队时间）:")
+        for name, t in payload["tools"].items():
+            lines.append(f"- {name}: {t['count']} 次，出错 {t['errors']} 次，返回 {t['bytes']} 字节，"
+                         f"p50 {t['p50_ms']} / p95 {t['p95_ms']} / p99 {t['p99_ms']} / 最大 {t['max_ms']}")
+    else:
+        lines.append("尚无工具调用")
+    lag = payload["event_loop_lag"]
+    if lag["samples"]:
+        lines.append("")
+        lines.append(f"事件循环延迟（{lag['samples']} 次采样，毫秒）: "
+                     f"p50 {lag['p50_ms']} / p95 {lag['p95_ms']} / p99 {lag['p99_ms']} / 最大 {lag['max_ms']}")
+    return "\n".join(lines)
+
+# 工具名 -> (执行函数, 文本渲染函数)；执行函数返回结构化结果，出错时抛出ToolError
+TOOL_HANDLERS = {
+    "search-files": (search_files, render_search_files),
+    "grep-files": (grep_files_tool, render_grep_files),
+    "search-content": (search_content, render_search_content),
+    "file-info": (file_info, render_file_info),
+    "explore-paths": (explore_paths, render_explore_paths),
+    "list-directory": (list_directory, render_list_directory),
+    "disk-usage": (disk_usage, render_disk_usage),
+    "top-files": (top_files_tool, render_top_files),
+    "find-duplicates": (find_duplicates_tool, render_find_duplicates),
+    "file-hash": (file_hash, render_file_hash),
+    "cache-stats": (cache_stats, render_cache_stats),
+    "server-stats": (server_stats, render_server_stats),
+}
+
+def page_size(arguments: Dict[str, Any], default: int) -> int:
+    """读取分页参数limit并限制在合理范围内"""
+    try:
+        limit = int(arguments.get("limit", default))
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def archive_target(path: str) -> Optional[Tuple[str, str]]:
+    """路径指向归档内部（如 a.zip!/inner/path）时返回 (归档路径, 归档内路径)，否则返回None"""
+    if "!" not in path:
+        return None
+    return archives.split_archive_path(path)
+
+def open_archive(archive_path: str):
+    """取归档的成员索引（按归档mtime缓存），失败时抛出ToolError"""
+    # 安全检查：归档本身也必须在允许的范围内（防止通过符号链接访问范围外的归档）
+    if not is_path_allowed(archive_path):
+        raise ToolError("访问被拒绝：指定的归档超出允许范围")
+    if not stat_cache.isfile(archive_path):
+        raise ToolError(f"归档不存在: {archive_path}")
+    try:
+        return archives.archive_cache.get(archive_path)
+    except (OSError, archives.ArchiveError) as e:
+        raise ToolError(f"无法读取归档: {str(e)}\n归档: {archive_path}")
 
 def is_path_allowed(path: str) -> bool:
     """安全检查：验证路径是否在允许的目录范围内"""
@@ -481,30 +1707,64 @@ def is_path_allowed(path: str) -> bool:
     except:
         return False
 
-async def main():
-    """主函数：启动MCP服务器"""
-    print("启动文件浏览MCP服务器...")
+def prepare_startup(fast_start: bool, shared: bool = False):
+    """开始服务前的准备；快速启动模式下延迟模块和工具清单留到首次使用时再加载
+
+    shared表示以套接字服务器模式长期运行，此时默认预热索引。
+    """
+    # 有快照的根目录立即载入快照，校对在后台进行
+    if INDEX_WARM_START == "1" or (shared and INDEX_WARM_START != "0"):
+        with startup_profile.phase("索引预热"):
+            file_index.warm_start()
+    if not fast_start:
+        with startup_profile.phase("预加载模块"):
+            startup.preload()
+        tool_manifest()
+    startup_profile.mark_ready()
+
+async def main(fast_start: bool = startup.FAST_START, socket_path: Optional[str] = None,
+               metrics_file: Optional[str] = None):
+    """主函数：启动MCP服务器；指定socket_path时在Unix域套接字上同时为多个客户端服务，否则使用stdio"""
+    # stdout是MCP的传输通道，启动信息写入日志
+    logger.info("启动文件浏览MCP服务器...")
+    prepare_startup(fast_start, shared=socket_path is not None)
+    logger.info(startup_profile.report())
+    # 事件循环延迟采样，以及可选的Prometheus文本文件（MCP_METRICS_TEXTFILE）
+    metrics.start_loop_monitor()
+    metrics.start_textfile_writer(metrics_file or METRICS_TEXTFILE)
+    
+    capabilities = server.get_capabilities(
+        notification_options=NotificationOptions(),
+        experimental_capabilities={},
+    )
+    # 低层Server不会自动声明资源订阅能力
+    capabilities.resources.subscribe = subscriptions.supported
+    init_options = InitializationOptions(
+        server_name="file-explorer",
+        server_version="1.0.0",
+        capabilities=capabilities,
+    )
+    
+    async def run_session(read_stream, write_stream):
+        # 客户端断开时清理其订阅（共享的套接字服务器上，客户端可能不取消订阅就断开）
+        with subscriptions.session_scope():
+            await server.run(read_stream, write_stream, init_options)
     
     try:
         # 运行服务器
-        async with stdio_server() as (read_stream, write_stream):
-            await server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="file-explorer",
-                    server_version="1.0.0",
-                    capabilities=server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={},
-                    ),
-                ),
-            )
+        if socket_path:
+            # 所有连接共用同一个进程内的缓存、索引和线程池
+            try:
+                await serve_unix(socket_path, run_session)
+            except OSError as e:
+                logger.error("无法在套接字上监听: %s", e)
+                raise SystemExit(1)
+        else:
+            async with stdio_server() as (read_stream, write_stream):
+                await run_session(read_stream, write_stream)
     except Exception as e:
-        print(f"服务器错误: {str(e)}")
-        # 在开发阶段，可以打印完整的堆栈跟踪
-        import traceback
-        traceback.print_exc()
+        # 记录完整的堆栈跟踪
+        logger.exception("服务器错误: %s", e)
 
 async def test_tools():
     """测试工具功能"""
@@ -537,13 +1797,73 @@ async def test_tools():
     for item in result:
         if hasattr(item, 'text'):
             print(item.text)
+    
+    # 测试文件名含URI特殊字符时，file-info返回的URI可以原样读回
+    print("\n测试资源URI编码:")
+    import shutil
+    import tempfile
+    tmp_dir = tempfile.mkdtemp(prefix="uri-test-", dir=os.getcwd())
+    try:
+        for name in ("a#b.txt", "50%41.txt", "q?x.txt", "with space.txt"):
+            path = os.path.join(tmp_dir, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(name)
+            uri = file_info({"path": path})["uri"]
+            content = read_resource_sync(uri)[0].content
+            status = "通过" if content == name else f"失败（读到 {content!r}）"
+            print(f"- {name}: {uri} {status}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    # 测试grep-files的正则按行匹配：^和$锚定在行首行尾，匹配不跨行
+    print("\n测试grep-files行锚定:")
+    tmp_dir = tempfile.mkdtemp(prefix="grep-test-", dir=os.getcwd())
+    try:
+        with open(os.path.join(tmp_dir, "a.py"), "w", encoding="utf-8") as f:
+            f.write("def one():\n    pass\n\ndef two():\n    pass\n")
+        for pattern, expected in (("^def ", [1, 4]), ("pass$", [2, 5]), (r":\s+pass", [])):
+            records = grep_files_tool({"pattern": pattern, "directory": tmp_dir, "regex": True})["records"]
+            lines = [r["line"] for r in records]
+            status = "通过" if lines == expected else f"失败（匹配行 {lines}）"
+            print(f"- {pattern}: {status}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 # 添加命令行测试选项
 if __name__ == "__main__":
     import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="文件浏览MCP服务器")
+    parser.add_argument("--test", action="store_true", help="运行工具自测后退出")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="快速启动：较重的模块和工具清单在首次使用时才加载（环境变量MCP_FAST_START=1）")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="输出启动各阶段耗时后退出；设置MCP_STARTUP_TARGET_MS时超出目标以非零状态退出")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="在Unix域套接字上监听，供多个客户端共用一个服务器进程（默认使用stdio）")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="定期写出Prometheus文本格式指标的文件路径（环境变量MCP_METRICS_TEXTFILE）")
+    parser.add_argument("--log-level", help="日志级别（默认WARNING，环境变量MCP_LOG_LEVEL）")
+    parser.add_argument("--log-file", help="日志文件路径（默认不写文件，环境变量MCP_LOG_FILE）")
+    parser.add_argument("--log-max-bytes", type=int, help="单个日志文件的最大字节数，超过后轮转")
+    parser.add_argument("--log-backups", type=int, help="保留的轮转日志文件个数")
+    parser.add_argument("--log-sample-rate", type=float,
+                        help="每次工具调用调试日志的采样率，0到1之间（默认1）")
+    args = parser.parse_args()
+    
+    if any(value is not None for value in (args.log_level, args.log_file, args.log_max_bytes,
+                                           args.log_backups, args.log_sample_rate)):
+        setup_logging(args.log_level, args.log_file, args.log_max_bytes,
+                      args.log_backups, args.log_sample_rate)
     
-    if len(sys.argv) > 1 and sys.argv[1] == "--test":
+    fast_start = args.fast_start or startup.FAST_START
+    if args.startup_profile:
+        prepare_startup(fast_start)
+        print(startup_profile.report(), file=sys.stderr)
+        sys.exit(1 if startup_profile.over_target() else 0)
+    elif args.test:
         asyncio.run(test_tools())
     else:
         # 正常启动服务器
-        asyncio.run(main())
+        asyncio.run(main(fast_start, args.socket, args.metrics_file))
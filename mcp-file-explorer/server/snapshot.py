@@ -0,0 +1,125 @@
+"""元数据快照的SQLite持久化：服务器重启后载入，按目录mtime增量校对完成后提供查询"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 快照数据库位置，设置 MCP_METADATA_DB 为空字符串可关闭持久化
+CACHE_DIR = os.environ.get("MCP_CACHE_DIR") or os.path.expanduser("~/.cache/mcp-file-explorer")
+METADATA_DB_PATH = os.environ.get("MCP_METADATA_DB", os.path.join(CACHE_DIR, "metadata.sqlite"))
+
+# 单个条目：(名称, 大小, mtime, 是否目录, inode, 是否符号链接)
+EntryRow = Tuple[str, int, float, bool, int, bool]
+# 单个目录：(目录mtime_ns, 条目列表)
+DirRows = Tuple[int, List[EntryRow]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dirs_root ON dirs(root);
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    is_dir INTEGER NOT NULL,
+    is_link INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir);
+CREATE INDEX IF NOT EXISTS entries_name ON entries(name);
+CREATE INDEX IF NOT EXISTS entries_ext ON entries(ext);
+"""
+
+
+def _ext(name: str) -> str:
+    """小写扩展名（不含点），用于按扩展名查询"""
+    return os.path.splitext(name)[1][1:].lower()
+
+
+class MetadataStore:
+    """按目录保存元数据快照；目录是读写的最小单位，与内存索引的结构一致"""
+
+    def __init__(self, path: str = METADATA_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def has_root(self, root: str) -> bool:
+        with self._lock:
+            row = self._connect().execute("SELECT 1 FROM dirs WHERE root=? LIMIT 1", (root,)).fetchone()
+        return row is not None
+
+    def load_root(self, root: str) -> Dict[str, DirRows]:
+        """载入某个根目录的全部快照：{目录路径: (mtime_ns, 条目列表)}"""
+        with self._lock:
+            conn = self._connect()
+            dirs: Dict[str, DirRows] = {
+                path: (mtime_ns, [])
+                for path, mtime_ns in conn.execute("SELECT path, mtime_ns FROM dirs WHERE root=?", (root,))
+            }
+            rows = conn.execute(
+                "SELECT e.dir, e.name, e.size, e.mtime, e.is_dir, e.inode, e.is_link"
+                " FROM entries e JOIN dirs d ON e.dir = d.path WHERE d.root=?",
+                (root,),
+            )
+            for dir_path, name, size, mtime, is_dir, inode, is_link in rows:
+                dirs[dir_path][1].append((name, size, mtime, bool(is_dir), inode, bool(is_link)))
+        return dirs
+
+    def save_dirs(self, root: str, items: Iterable[Tuple[str, int, List[EntryRow]]]):
+        """整体替换若干目录的快照：(目录路径, mtime_ns, 条目列表)"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for dir_path, mtime_ns, entries in items:
+                    conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (dir_path, root, mtime_ns))
+                    conn.execute("DELETE FROM entries WHERE dir=?", (dir_path,))
+                    conn.executemany(
+                        "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(os.path.join(dir_path, name), dir_path, name, _ext(name), size, mtime,
+                          inode, int(is_dir), int(is_link))
+                         for name, size, mtime, is_dir, inode, is_link in entries],
+                    )
+
+    def delete_dirs(self, dir_paths: Iterable[str]):
+        """删除若干目录的快照（不含其子目录，调用方需逐个列出）"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for dir_path in dir_paths:
+                    conn.execute("DELETE FROM dirs WHERE path=?", (dir_path,))
+                    conn.execute("DELETE FROM entries WHERE dir=?", (dir_path,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_store(path: str = METADATA_DB_PATH) -> Optional[MetadataStore]:
+    """打开快照库；未配置路径或无法创建时返回None，索引照常工作但不做持久化"""
+    if not path:
+        return None
+    store = MetadataStore(path)
+    try:
+        store._connect()
+    except (OSError, sqlite3.Error):
+        return None
+    return store
@@ -0,0 +1,130 @@
+"""Unix域套接字传输：一个常驻服务器进程同时为多个客户端会话服务，共享缓存和索引
+
+消息格式与stdio传输相同，每行一条JSON-RPC消息。
+"""
+import os
+import stat
+import errno
+import signal
+import socket
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Tuple
+
+import anyio
+import anyio.lowlevel
+from anyio.abc import ByteStream
+from anyio.streams.buffered import BufferedByteReceiveStream
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+import mcp.types as types
+from mcp.shared.message import SessionMessage
+
+logger = logging.getLogger('mcp_server.socket')
+
+# 单条消息的最大字节数
+MAX_MESSAGE_BYTES = int(os.environ.get("MCP_SOCKET_MAX_MESSAGE", str(64 * 1024 * 1024)))
+# 同时服务的客户端连接数上限，超过后新连接等待
+MAX_CONNECTIONS = int(os.environ.get("MCP_SOCKET_MAX_CONNECTIONS", "64"))
+
+Streams = Tuple[MemoryObjectReceiveStream, MemoryObjectSendStream]
+
+
+@asynccontextmanager
+async def connection_streams(conn: ByteStream) -> AsyncIterator[Streams]:
+    """把一条字节流连接转换为MCP会话使用的 (读流, 写流)"""
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    buffered = BufferedByteReceiveStream(conn)
+
+    async def reader():
+        try:
+            async with read_stream_writer:
+                while True:
+                    try:
+                        line = await buffered.receive_until(b"\n", MAX_MESSAGE_BYTES)
+                    except (anyio.EndOfStream, anyio.IncompleteRead, anyio.BrokenResourceError):
+                        break
+                    if not line.strip():
+                        continue
+                    try:
+                        message = types.JSONRPCMessage.model_validate_json(line)
+                    except Exception as exc:
+                        await read_stream_writer.send(exc)
+                        continue
+                    await read_stream_writer.send(SessionMessage(message))
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async def writer():
+        try:
+            async with write_stream_reader:
+                async for session_message in write_stream_reader:
+                    data = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                    await conn.send(data.encode("utf-8") + b"\n")
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            await anyio.lowlevel.checkpoint()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(reader)
+        tg.start_soon(writer)
+        yield read_stream, write_stream
+
+
+def _remove_stale_socket(path: str):
+    """删除上次运行遗留的套接字文件；已有服务器在监听时抛出OSError"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, f"路径已存在且不是套接字: {path}")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"已有服务器在监听: {path}")
+
+
+async def serve_unix(path: str, handle_session: Callable[[MemoryObjectReceiveStream, MemoryObjectSendStream],
+                                                         Awaitable[None]]):
+    """在Unix域套接字上监听，每个连接在独立任务中运行一个MCP会话"""
+    _remove_stale_socket(path)
+    # 服务器可以读取用户的文件，套接字只允许当前用户连接
+    old_umask = os.umask(0o177)
+    try:
+        listener = await anyio.create_unix_listener(path)
+    finally:
+        os.umask(old_umask)
+    limiter = anyio.CapacityLimiter(MAX_CONNECTIONS)
+
+    async def handle(conn: ByteStream):
+        async with limiter, conn:
+            logger.info("客户端已连接")
+            try:
+                async with connection_streams(conn) as (read_stream, write_stream):
+                    await handle_session(read_stream, write_stream)
+            except Exception as e:
+                # 单个会话出错不影响其他会话
+                logger.exception("会话错误: %s", e)
+            logger.info("客户端已断开")
+
+    logger.info("在Unix域套接字上监听: %s", path)
+    try:
+        async with listener, anyio.create_task_group() as tg:
+            tg.start_soon(listener.serve, handle)
+            # 收到SIGTERM/SIGINT时正常退出，删除套接字文件并执行atexit清理
+            with anyio.open_signal_receiver(signal.SIGTERM, signal.SIGINT) as signals:
+                async for signum in signals:
+                    logger.info("收到信号 %s，停止服务", signum)
+                    tg.cancel_scope.cancel()
+                    break
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,131 @@
+"""启动耗时统计与延迟导入：快速启动模式下较重的模块在首次使用时才导入"""
+import os
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# 快速启动模式：延迟导入的模块和工具清单在首次使用时才加载，不在开始服务前预加载
+FAST_START = os.environ.get("MCP_FAST_START", "0") == "1"
+# 冷启动耗时目标（毫秒），--startup-profile 超过目标时以非零状态退出；0表示不检查
+STARTUP_TARGET_MS = float(os.environ.get("MCP_STARTUP_TARGET_MS", "0"))
+
+
+def process_uptime() -> Optional[float]:
+    """进程启动至今的秒数（包含解释器自身的启动），无法获取时返回None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # 第二个字段是带括号的进程名，可能包含空格，从右括号之后开始解析
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupProfile:
+    """记录启动各阶段和延迟导入的耗时"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases: List[Tuple[str, float]] = []
+        self.lazy_loads: List[Tuple[str, float]] = []
+        self.ready_at: Optional[float] = None
+        self.ready_uptime: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def record_lazy_load(self, name: str, seconds: float):
+        with self._lock:
+            self.lazy_loads.append((name, seconds))
+
+    def mark_ready(self):
+        """标记可以开始服务的时刻"""
+        self.ready_at = time.perf_counter() - self.started
+        self.ready_uptime = process_uptime()
+
+    def total_ms(self) -> float:
+        """冷启动总耗时：优先取进程启动至就绪，否则取本模块导入至就绪"""
+        if self.ready_uptime is not None:
+            return self.ready_uptime * 1000
+        return (self.ready_at or time.perf_counter() - self.started) * 1000
+
+    def report(self, target_ms: float = STARTUP_TARGET_MS) -> str:
+        lines = ["启动耗时:"]
+        with self._lock:
+            phases, lazy_loads = list(self.phases), list(self.lazy_loads)
+        lines.extend(f"  {name}: {seconds * 1000:.1f} ms" for name, seconds in phases)
+        if lazy_loads:
+            lines.append("延迟导入:")
+            lines.extend(f"  {name}: {seconds * 1000:.1f} ms" for name, seconds in lazy_loads)
+        if self.ready_at is not None:
+            lines.append(f"服务器模块导入至就绪: {self.ready_at * 1000:.1f} ms")
+        if self.ready_uptime is not None:
+            lines.append(f"进程启动至就绪: {self.ready_uptime * 1000:.1f} ms")
+        if target_ms > 0:
+            verdict = "超出" if self.total_ms() > target_ms else "达到"
+            lines.append(f"目标 {target_ms:.0f} ms: {verdict}")
+        return "\n".join(lines)
+
+    def over_target(self, target_ms: float = STARTUP_TARGET_MS) -> bool:
+        return target_ms > 0 and self.total_ms() > target_ms
+
+
+# 服务器进程共用的启动统计
+startup_profile = StartupProfile()
+
+
+class LazyModule:
+    """模块代理：首次访问属性时才导入真实模块，并记录导入耗时"""
+
+    def __init__(self, name: str, profile: StartupProfile = startup_profile):
+        self._name = name
+        self._profile = profile
+        self._module: Any = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Any:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    already = self._name in sys.modules
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if not already:
+                        self._profile.record_lazy_load(self._name, time.perf_counter() - start)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "已加载" if self._module is not None else "未加载"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+_lazy_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """返回模块的延迟导入代理，同名模块共用一个代理"""
+    module = _lazy_modules.get(name)
+    if module is None:
+        module = _lazy_modules[name] = LazyModule(name)
+    return module
+
+
+def preload():
+    """导入全部尚未加载的延迟模块（非快速启动模式下在开始服务前调用）"""
+    for module in list(_lazy_modules.values()):
+        module.load()
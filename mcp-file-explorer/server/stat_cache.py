@@ -0,0 +1,131 @@
+"""所有工具共享的stat/元数据缓存：带TTL和LRU淘汰，并缓存不存在的路径"""
+import os
+import stat
+import time
+import mimetypes
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+# 缓存有效期（秒）、最大条目数；NFS等网络文件系统上可适当调大TTL
+STAT_CACHE_TTL = float(os.environ.get("MCP_STAT_CACHE_TTL", "2"))
+STAT_CACHE_SIZE = int(os.environ.get("MCP_STAT_CACHE_SIZE", "50000"))
+# 不存在路径的缓存有效期，默认与TTL相同
+STAT_CACHE_NEGATIVE_TTL = float(os.environ.get("MCP_STAT_CACHE_NEGATIVE_TTL", str(STAT_CACHE_TTL)))
+
+# 负缓存标记：路径不存在
+_MISSING = object()
+
+
+@lru_cache(maxsize=4096)
+def _guess_type(path: str) -> Optional[str]:
+    return mimetypes.guess_type(path)[0]
+
+
+class StatCache:
+    """线程安全的stat缓存，键为绝对路径，值为 (过期时间, stat结果或负缓存标记)"""
+
+    def __init__(self, ttl: float = STAT_CACHE_TTL, max_entries: int = STAT_CACHE_SIZE,
+                 negative_ttl: float = STAT_CACHE_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        """返回路径的stat结果（跟随符号链接），路径不存在时返回None；其他错误照常抛出"""
+        key = os.path.abspath(path)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] > now:
+                self._entries.move_to_end(key)
+                if cached[1] is _MISSING:
+                    self.negative_hits += 1
+                    return None
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        try:
+            result = os.stat(key)
+            value, expires = result, now + self.ttl
+        except (FileNotFoundError, NotADirectoryError):
+            result = None
+            value, expires = _MISSING, now + self.negative_ttl
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def put(self, path: str, result: os.stat_result):
+        """写入已经拿到的stat结果（例如来自DirEntry），避免后续重复stat"""
+        key = os.path.abspath(path)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def exists(self, path: str) -> bool:
+        try:
+            return self.stat(path) is not None
+        except OSError:
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            result = self.stat(path)
+        except OSError:
+            return False
+        return result is not None and stat.S_ISDIR(result.st_mode)
+
+    def isfile(self, path: str) -> bool:
+        try:
+            result = self.stat(path)
+        except OSError:
+            return False
+        return result is not None and stat.S_ISREG(result.st_mode)
+
+    def guess_type(self, path: str) -> Optional[str]:
+        """按文件名猜测MIME类型（结果按路径缓存）"""
+        return _guess_type(path)
+
+    def invalidate(self, path: Optional[str] = None):
+        """使某个路径（或全部）的缓存失效"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计信息，用于调优TTL和容量"""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+# 服务器内共享的缓存实例
+stat_cache = StatCache()
@@ -0,0 +1,155 @@
+"""file:// 资源订阅：inotify监听文件所在目录，合并短时间内的连续变化后发送 resources/updated 通知"""
+import os
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from pydantic import AnyUrl
+
+import fs_watch
+
+logger = logging.getLogger('mcp_server.subscriptions')
+
+# 合并变化的时间窗口（秒）：窗口内同一资源的多次变化只通知一次
+SUBSCRIPTION_DEBOUNCE = float(os.environ.get("MCP_SUBSCRIPTION_DEBOUNCE", "0.2"))
+
+# 目录本身被删除或移动时，订阅该目录的资源都视为已变化
+_SELF_EVENTS = fs_watch.IN_DELETE_SELF | fs_watch.IN_MOVE_SELF
+
+# 当前连接中订阅过资源的会话（见SubscriptionManager.session_scope）
+_scope_sessions: ContextVar[Optional[Set[Any]]] = ContextVar("mcp_subscription_sessions", default=None)
+
+
+class SubscriptionManager:
+    """管理各会话订阅的资源URI；同一目录只加一个监听，由订阅它的URI共享"""
+
+    def __init__(self, debounce: float = SUBSCRIPTION_DEBOUNCE):
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._watcher: Optional[fs_watch.InotifyWatcher] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # URI -> 订阅它的会话；URI -> (监听的目录, 关注的条目名，订阅目录本身时为None)
+        self._sessions: Dict[str, Set[Any]] = {}
+        self._targets: Dict[str, Tuple[str, Optional[str]]] = {}
+        # 监听的目录 -> 依赖它的URI
+        self._dir_uris: Dict[str, Set[str]] = {}
+        # 等待发送通知的URI
+        self._pending: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def supported(self) -> bool:
+        return fs_watch.is_supported()
+
+    def subscribe(self, session: Any, uri: str, path: str):
+        """为会话订阅uri，path为其对应的本地路径（需在事件循环中调用）"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        real = os.path.realpath(path)
+        if os.path.isdir(real):
+            target = (real, None)
+        else:
+            target = (os.path.dirname(real), os.path.basename(real))
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = fs_watch.InotifyWatcher(self._on_event)
+                self._watcher.start()
+            watch_dir = target[0]
+            if watch_dir not in self._dir_uris:
+                # 目录不存在时抛出OSError，由调用方返回错误
+                self._watcher.add_watch(watch_dir)
+                self._dir_uris[watch_dir] = set()
+            self._dir_uris[watch_dir].add(uri)
+            self._targets[uri] = target
+            self._sessions.setdefault(uri, set()).add(session)
+        scope = _scope_sessions.get()
+        if scope is not None:
+            scope.add(session)
+
+    @contextmanager
+    def session_scope(self) -> Iterator[None]:
+        """包住一个连接的会话：连接结束时移除该会话的全部订阅，不必等到下一次通知发送失败
+
+        请求处理任务由会话任务派生，继承这里设置的上下文，因此subscribe能登记到当前连接。
+        """
+        sessions: Set[Any] = set()
+        token = _scope_sessions.set(sessions)
+        try:
+            yield
+        finally:
+            _scope_sessions.reset(token)
+            for session in sessions:
+                self.drop_session(session)
+
+    def unsubscribe(self, session: Any, uri: str):
+        with self._lock:
+            sessions = self._sessions.get(uri)
+            if sessions is None:
+                return
+            sessions.discard(session)
+            if not sessions:
+                self._drop_uri(uri)
+
+    def _drop_uri(self, uri: str):
+        """移除不再有订阅者的URI，目录不再被任何URI依赖时移除监听（调用方需持有锁）"""
+        self._sessions.pop(uri, None)
+        target = self._targets.pop(uri, None)
+        if target is None:
+            return
+        uris = self._dir_uris.get(target[0])
+        if uris is not None:
+            uris.discard(uri)
+            if not uris:
+                del self._dir_uris[target[0]]
+                if self._watcher is not None:
+                    self._watcher.remove_watch(target[0])
+
+    def _on_event(self, dir_path: Optional[str], name: Optional[str], mask: int):
+        """inotify回调（监听线程）：找出受影响的URI，交给事件循环合并发送"""
+        with self._lock:
+            if dir_path is None:
+                # 事件队列溢出，无法确定哪些资源变化了，全部通知
+                changed = set(self._targets)
+            else:
+                changed = {
+                    uri for uri in self._dir_uris.get(dir_path, ())
+                    if mask & _SELF_EVENTS or self._targets[uri][1] in (None, name)
+                }
+        if changed and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule, changed)
+
+    def _schedule(self, changed: Set[str]):
+        self._pending.update(changed)
+        if self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                self.debounce, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, set()
+        for uri in pending:
+            with self._lock:
+                sessions = list(self._sessions.get(uri, ()))
+            for session in sessions:
+                try:
+                    await session.send_resource_updated(AnyUrl(uri))
+                except Exception as e:
+                    # 会话已关闭，清理其全部订阅
+                    logger.info("发送资源更新通知失败，移除订阅: %s (%s)", uri, e)
+                    self.drop_session(session)
+
+    def drop_session(self, session: Any):
+        """移除某个会话的全部订阅"""
+        with self._lock:
+            for uri in [u for u, sessions in self._sessions.items() if session in sessions]:
+                self._sessions[uri].discard(session)
+                if not self._sessions[uri]:
+                    self._drop_uri(uri)
+
+    def count(self) -> int:
+        """当前订阅的URI数量"""
+        with self._lock:
+            return len(self._sessions)
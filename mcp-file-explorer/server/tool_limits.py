@@ -0,0 +1,15 @@
+"""工具参数的取值范围
+
+工具清单的schema需要这些常量。它们放在这个不依赖其他模块的小模块里，列出工具时
+不会连带导入各工具的实现模块（见startup中的快速启动）。
+"""
+
+# disk-usage：每个目录记录的最大文件数，也是top参数的上限
+MAX_TOP = 100
+
+# top-files：可用的排序字段和返回条目数的上限
+TOP_KEYS = ("size", "mtime", "atime")
+MAX_TOP_FILES = 1000
+
+# file-hash：支持的摘要算法
+HASH_ALGORITHMS = ("sha256", "blake2b")
@@ -0,0 +1,55 @@
+"""按大小、修改时间或访问时间取目录树中排在最前的K个文件
+
+遍历结果以流的形式逐个进入一个容量为K的堆，内存占用只与K有关，与目录树的大小无关；
+最终只对堆中的K个条目排序。
+"""
+import heapq
+from typing import List, Optional, Tuple
+
+from fs_walk import WalkMatch, walk_matches
+from tool_limits import TOP_KEYS
+
+
+def top_files(directory: str, by: str = "size", k: int = 10, ascending: bool = False,
+              pattern: str = "*", max_depth: Optional[int] = None,
+              include_hidden: bool = False) -> Tuple[List[WalkMatch], int]:
+    """返回 (排在最前的k个文件, 扫描过的文件数)
+
+    ascending为False时取值最大的k个（最大、最新），为True时取值最小的k个（最小、最旧）。
+    值相同时按相对路径排序，结果与遍历完成的顺序无关。
+    """
+    if by not in TOP_KEYS:
+        raise ValueError(f"不支持的排序字段: {by}")
+    sign = 1 if ascending else -1
+    # 以"好坏"为键的小顶堆，堆顶是当前k个中最差的一个，新条目只有比堆顶更好时才替换堆顶
+    heap: List[Tuple[float, _Reversed, WalkMatch]] = []
+    scanned = 0
+    for match in walk_matches(directory, pattern, max_depth=max_depth, kind="file",
+                              include_hidden=include_hidden):
+        scanned += 1
+        item = (-sign * getattr(match, by), _Reversed(match.rel_path), match)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    # 只对留下的k个条目排序，最好的排在前面
+    heap.sort(reverse=True)
+    return [match for _, _, match in heap], scanned
+
+
+class _Reversed:
+    """比较次序相反的字符串包装，使值相同时相对路径较小的条目排在前面"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def __lt__(self, other: "_Reversed") -> bool:
+        return self.value > other.value
+
+    def __gt__(self, other: "_Reversed") -> bool:
+        return self.value < other.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Reversed) and self.value == other.value
@@ -0,0 +1,94 @@
+"""服务器端追踪：请求 _meta 中带有traceparent时记录本次工具调用的span，并随结果的 _meta 返回给客户端
+
+客户端把这些span并入自己的追踪（见client/tracing.py），服务器本身不写追踪文件。
+"""
+import re
+import time
+import secrets
+import functools
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import mcp.types as types
+
+# 与客户端约定的 _meta 字段
+TRACEPARENT_KEY = "traceparent"
+SPANS_KEY = "trace_spans"
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def parse_traceparent(value: Any) -> Optional[Tuple[str, str]]:
+    """解析W3C traceparent，返回 (trace_id, 父span_id)，格式不对时返回None"""
+    if not isinstance(value, str):
+        return None
+    m = _TRACEPARENT_RE.match(value.strip().lower())
+    return (m.group(1), m.group(2)) if m else None
+
+
+class RequestTrace:
+    """一次请求在服务器端记录的span"""
+
+    def __init__(self, trace_id: str, parent_id: str):
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.span_id = secrets.token_hex(8)
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, start: float, end: float, parent_id: Optional[str] = None, **attrs: Any) -> str:
+        """登记一个已结束的span，start/end为Unix时间戳（秒）；可在工作线程中调用"""
+        span_id = secrets.token_hex(8)
+        self.spans.append({
+            "span_id": span_id, "parent_id": parent_id or self.span_id, "name": name,
+            "start": start, "duration_ms": round((end - start) * 1000, 3), "attrs": attrs,
+        })
+        return span_id
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("mcp_request_trace", default=None)
+
+
+def traced(func: Callable[..., Any], tool: str) -> Callable[..., Any]:
+    """包装交给线程池执行的函数，记录排队时间和执行时间；当前请求没有追踪时原样返回"""
+    trace = _current.get()
+    if trace is None:
+        return func
+    submitted = time.time()
+
+    @functools.wraps(func)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        started = time.time()
+        trace.add("server.queue", submitted, started, tool=tool)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace.add("server.execute", started, time.time(), tool=tool)
+
+    return run
+
+
+def install(server) -> None:
+    """包装低层Server的tools/call处理器：解析traceparent，并把服务器端span放入结果的 _meta"""
+    handler = server.request_handlers[types.CallToolRequest]
+
+    async def traced_handler(req: types.CallToolRequest):
+        meta = req.params.meta
+        parsed = parse_traceparent((meta.model_extra or {}).get(TRACEPARENT_KEY)) if meta is not None else None
+        if parsed is None:
+            return await handler(req)
+        trace = RequestTrace(*parsed)
+        token = _current.set(trace)
+        start = time.time()
+        try:
+            result = await handler(req)
+        finally:
+            _current.reset(token)
+        trace.spans.append({
+            "span_id": trace.span_id, "parent_id": trace.parent_id, "name": "server.call_tool",
+            "start": start, "duration_ms": round((time.time() - start) * 1000, 3),
+            "attrs": {"tool": req.params.name},
+        })
+        result.root.meta = dict(result.root.meta or {}, **{SPANS_KEY: trace.spans})
+        return result
+
+    server.request_handlers[types.CallToolRequest] = traced_handler
@@ -0,0 +1,118 @@
+"""有界的目录树遍历：按层广度优先、每层并行扫描，限制每个目录的子项数和全局节点数"""
+import os
+from typing import List, Optional, Tuple
+
+from fs_walk import get_walk_pool
+
+
+class TreeNode:
+    """目录树中的一个节点；omitted为因子项上限或节点预算未显示的子项数"""
+
+    __slots__ = ("name", "path", "is_dir", "size", "children", "omitted", "error")
+
+    def __init__(self, name: str, path: str, is_dir: bool, size: Optional[int] = None):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.size = size
+        self.children: Optional[List["TreeNode"]] = None
+        self.omitted = 0
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """转换为结构化记录，未展开的目录不含children字段"""
+        record = {"name": self.name, "type": "directory" if self.is_dir else "file", "size": self.size}
+        if self.children is not None:
+            record["children"] = [child.to_dict() for child in self.children]
+        if self.omitted:
+            record["omitted"] = self.omitted
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+# 单个目录的扫描结果：(前max_children个条目 [(名称, 是否目录, 是否符号链接, 大小)], 条目总数)
+Listing = Tuple[List[Tuple[str, bool, bool, Optional[int]]], int]
+
+
+def _list_dir(path: str, max_children: int) -> Listing:
+    """扫描单个目录，先目录后文件、按名称排序，只对要显示的文件取stat"""
+    with os.scandir(path) as it:
+        entries = []
+        for entry in it:
+            try:
+                entries.append((entry, entry.is_dir()))
+            except OSError:
+                continue
+    entries.sort(key=lambda e: (not e[1], e[0].name.lower(), e[0].name))
+    shown = []
+    for entry, is_dir in entries[:max_children]:
+        size = None
+        if not is_dir:
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                pass
+        shown.append((entry.name, is_dir, entry.is_symlink(), size))
+    return shown, len(entries)
+
+
+def _safe_list_dir(path: str, max_children: int) -> Tuple[Optional[Listing], Optional[str]]:
+    try:
+        return _list_dir(path, max_children), None
+    except OSError as e:
+        return None, e.strerror or str(e)
+
+
+def walk_tree(root: str, depth: int, max_children: int, max_nodes: int) -> Tuple[TreeNode, int, bool]:
+    """从root开始按层展开depth层，返回 (根节点, 节点数, 是否有未显示的内容)
+
+    浅层优先占用节点预算；预算用完后停止展开，不跟随符号链接指向的目录。
+    """
+    root_node = TreeNode(os.path.basename(root.rstrip(os.sep)) or root, root, True)
+    frontier = [root_node]
+    nodes = 0
+    truncated = False
+    pool = get_walk_pool()
+    for _ in range(depth):
+        if not frontier:
+            break
+        if nodes >= max_nodes:
+            truncated = True
+            break
+        listings = pool.map(lambda node: _safe_list_dir(node.path, max_children), frontier)
+        next_frontier = []
+        for node, (listing, error) in zip(frontier, listings):
+            if error is not None:
+                node.error = error
+                continue
+            shown, total = listing
+            shown = shown[:max(0, max_nodes - nodes)]
+            node.children = []
+            node.omitted = total - len(shown)
+            truncated = truncated or node.omitted > 0
+            for name, is_dir, is_link, size in shown:
+                child = TreeNode(name, os.path.join(node.path, name), is_dir, size)
+                node.children.append(child)
+                nodes += 1
+                if is_dir and not is_link:
+                    next_frontier.append(child)
+        frontier = next_frontier
+    return root_node, nodes, truncated
+
+
+def render_tree(children: List[dict], omitted: int = 0, indent: str = "") -> List[str]:
+    """把to_dict生成的子节点记录渲染为紧凑的缩进树，每层缩进两个空格"""
+    lines = []
+    for child in children:
+        if child["type"] == "directory":
+            suffix = f" (无法读取: {child['error']})" if child.get("error") else ""
+            lines.append(f"{indent}{child['name']}/{suffix}")
+            lines.extend(render_tree(child.get("children", []), child.get("omitted", 0), indent + "  "))
+        elif child["size"] is not None:
+            lines.append(f"{indent}{child['name']} ({child['size']} 字节)")
+        else:
+            lines.append(f"{indent}{child['name']}")
+    if omitted:
+        lines.append(f"{indent}... (还有 {omitted} 项)")
+    return lines
@@ -0,0 +1,389 @@
+"""文本文件的三元组（trigram）倒排索引：用于子串搜索时快速缩小候选文件范围
+
+每个文件分配一个递增的编号，倒排表为 {trigram: array('I', 文件编号)}，编号按追加顺序天然有序。
+文件变化时旧编号记为失效、以新编号重新加入，失效编号过多时整体压缩。
+超过大小上限的文件不建索引，但始终作为候选，保证搜索结果不遗漏。
+"""
+import os
+import queue
+import fnmatch
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import fs_watch
+from content_search import is_binary
+from fs_walk import walk_matches
+from workers import run_batches
+
+logger = logging.getLogger('mcp_server.trigram_index')
+
+# 建索引的单个文件大小上限，更大的文件在查询时直接扫描
+MAX_INDEXED_FILE_SIZE = int(os.environ.get("MCP_TRIGRAM_MAX_FILE_SIZE", str(1024 * 1024)))
+# 单个索引最多包含的文件数，超过后放弃该索引
+MAX_INDEXED_FILES = int(os.environ.get("MCP_TRIGRAM_MAX_FILES", "200000"))
+# 同时保留的索引数
+MAX_INDEXES = int(os.environ.get("MCP_TRIGRAM_MAX_INDEXES", "4"))
+# 文件变化事件的合并窗口（秒）
+UPDATE_DEBOUNCE = 0.5
+# 每个进程池任务包含的文件数
+FILES_PER_TASK = 64
+
+# 文件状态：已建索引 / 过大未建索引（查询时总是扫描）
+INDEXED, OVERSIZED = 1, 2
+
+
+def file_trigrams(path: str) -> Optional[array]:
+    """读取文件并返回去重排序后的trigram编码（小写化后的3字节），二进制或无法读取时返回None"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(MAX_INDEXED_FILE_SIZE + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_INDEXED_FILE_SIZE or is_binary(data):
+        return None
+    data = data.lower()
+    grams = {data[i:i + 3] for i in range(len(data) - 2)}
+    return array("I", sorted(int.from_bytes(g, "big") for g in grams))
+
+
+def trigrams_task(paths: List[str]) -> List[Tuple[str, Optional[array]]]:
+    """工作进程中执行的任务：计算一批文件的trigram"""
+    return [(path, file_trigrams(path)) for path in paths]
+
+
+def query_trigrams(literal: str) -> List[int]:
+    """子串查询对应的trigram编码，与建索引时一样先小写化"""
+    data = literal.encode("utf-8").lower()
+    return sorted({int.from_bytes(data[i:i + 3], "big") for i in range(len(data) - 2)})
+
+
+class TrigramIndex:
+    """单个目录树的trigram索引，后台构建，并通过inotify增量更新"""
+
+    EMPTY, BUILDING, READY, FAILED = "empty", "building", "ready", "failed"
+
+    def __init__(self, root: str):
+        self.root = root
+        self.state = self.EMPTY
+        self._lock = threading.RLock()
+        self._paths: List[Optional[str]] = []
+        self._kinds = bytearray()
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[int, array] = {}
+        self._oversized: Set[int] = set()
+        self._dead = 0
+        self._watcher: Optional[fs_watch.InotifyWatcher] = None
+        self._events: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._updater: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    def contains(self, real_path: str) -> bool:
+        return real_path == self.root or real_path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def covers(self, real_path: str, include: str = "*") -> bool:
+        """在real_path下按include查询时，候选文件是否与实时扫描（walk_matches）的范围一致
+
+        索引与walk_matches的默认行为一样，不含隐藏文件和隐藏目录下的文件。查询目录相对
+        索引根目录经过隐藏目录、include以 '.' 开头（实时扫描会包含隐藏文件）或含路径时，
+        实时扫描的范围与索引不同，此时不能使用索引。
+        """
+        rel = os.path.relpath(real_path, self.root)
+        if rel != "." and any(part.startswith(".") for part in rel.split(os.sep)):
+            return False
+        return not include.startswith(".") and "/" not in include and "\\" not in include
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._ids),
+                "oversized": len(self._oversized),
+                "trigrams": len(self._postings),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "dead": self._dead,
+            }
+
+    # ---- 构建 ----
+
+    def build(self):
+        """遍历目录树并在进程池中计算trigram（在后台线程中调用）"""
+        self.state = self.BUILDING
+        started = time.monotonic()
+        try:
+            if self._watcher is None:
+                self._watcher = fs_watch.InotifyWatcher(self._on_event)
+                self._watcher.start()
+            with self._lock:
+                self._reset()
+            self._watcher.add_watch(self.root)
+            files = self._walk(self.root)
+            if files is None:
+                return
+            self._add_files(files)
+            self.state = self.READY
+            if self._updater is None:
+                self._updater = threading.Thread(target=self._update_loop, name=f"trigram-update:{self.root}",
+                                                 daemon=True)
+                self._updater.start()
+            if logger.isEnabledFor(logging.INFO):
+                stats = self.stats()
+                logger.info("trigram索引构建完成: %s，文件 %d 个，trigram %d 个，耗时 %.1fs",
+                            self.root, stats["files"], stats["trigrams"], time.monotonic() - started)
+        except OSError as e:
+            logger.warning("trigram索引构建失败，改为实时扫描: %s (%s)", self.root, e)
+            self.state = self.FAILED
+            self.close()
+
+    def _reset(self):
+        self._paths = []
+        self._kinds = bytearray()
+        self._ids = {}
+        self._postings = {}
+        self._oversized = set()
+        self._dead = 0
+
+    def _walk(self, top: str) -> Optional[List[Tuple[str, int]]]:
+        """列出top下的非隐藏文件并为每个目录加监听，返回 [(路径, 大小)]；文件过多时放弃索引"""
+        files = []
+        for match in walk_matches(top, "*"):
+            if match.is_dir:
+                try:
+                    self._watcher.add_watch(match.path)
+                except FileNotFoundError:
+                    continue
+                continue
+            files.append((match.path, match.size))
+            if len(self._ids) + len(files) > MAX_INDEXED_FILES:
+                logger.warning("文件数超过%d，放弃trigram索引: %s", MAX_INDEXED_FILES, self.root)
+                self.state = self.FAILED
+                self.close()
+                return None
+        return files
+
+    def _add_files(self, files: List[Tuple[str, int]]):
+        """为一批文件计算trigram并加入索引；过大的文件只登记为总是扫描"""
+        small = []
+        for path, size in files:
+            if size > MAX_INDEXED_FILE_SIZE:
+                with self._lock:
+                    self._add(path, OVERSIZED, None)
+            else:
+                small.append(path)
+        if len(small) > FILES_PER_TASK:
+            results = run_batches(trigrams_task, small, FILES_PER_TASK)
+        else:
+            results = trigrams_task(small)
+        for path, grams in results:
+            if grams is not None:
+                with self._lock:
+                    self._add(path, INDEXED, grams)
+
+    def _add(self, path: str, kind: int, grams: Optional[array]):
+        """以新编号登记文件（调用方需持有锁），已有的旧编号记为失效"""
+        self._remove(path)
+        file_id = len(self._paths)
+        self._paths.append(path)
+        self._kinds.append(kind)
+        self._ids[path] = file_id
+        if kind == OVERSIZED:
+            self._oversized.add(file_id)
+            return
+        postings = self._postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array("I", (file_id,))
+            else:
+                posting.append(file_id)
+
+    def _remove(self, path: str):
+        """把文件的编号记为失效（调用方需持有锁），倒排表中的编号在压缩时才清理"""
+        file_id = self._ids.pop(path, None)
+        if file_id is None:
+            return
+        self._paths[file_id] = None
+        self._oversized.discard(file_id)
+        self._dead += 1
+
+    def _remove_tree(self, top: str):
+        prefix = top + os.sep
+        with self._lock:
+            for path in [p for p in self._ids if p.startswith(prefix)]:
+                self._remove(path)
+
+    def _compact(self):
+        """失效编号过多时重新编号并重建倒排表"""
+        with self._lock:
+            remap = array("i", [-1]) * len(self._paths)
+            paths, kinds = [], bytearray()
+            for old_id, path in enumerate(self._paths):
+                if path is not None:
+                    remap[old_id] = len(paths)
+                    paths.append(path)
+                    kinds.append(self._kinds[old_id])
+            postings = {}
+            for gram, posting in self._postings.items():
+                live = array("I", (remap[i] for i in posting if remap[i] >= 0))
+                if live:
+                    postings[gram] = live
+            self._paths, self._kinds, self._postings = paths, kinds, postings
+            self._ids = {path: i for i, path in enumerate(paths)}
+            self._oversized = {i for i, kind in enumerate(kinds) if kind == OVERSIZED}
+            self._dead = 0
+
+    # ---- 增量更新 ----
+
+    def _on_event(self, dir_path: Optional[str], name: Optional[str], mask: int):
+        """inotify回调只负责入队，实际更新在更新线程中合并处理"""
+        if mask & fs_watch.IN_Q_OVERFLOW:
+            self._events.put(("rebuild", self.root))
+            return
+        if name is None or name.startswith("."):
+            return
+        path = os.path.join(dir_path, name)
+        if mask & (fs_watch.IN_DELETE | fs_watch.IN_MOVED_FROM):
+            self._events.put(("remove_tree" if mask & fs_watch.IN_ISDIR else "remove", path))
+        elif mask & fs_watch.IN_ISDIR:
+            if mask & (fs_watch.IN_CREATE | fs_watch.IN_MOVED_TO):
+                self._events.put(("add_tree", path))
+        elif mask & (fs_watch.IN_CLOSE_WRITE | fs_watch.IN_MOVED_TO | fs_watch.IN_CREATE | fs_watch.IN_MODIFY):
+            self._events.put(("update", path))
+
+    def _update_loop(self):
+        while True:
+            events = [self._events.get()]
+            # 合并短时间内的连续事件，例如编辑器保存时的多次写入
+            time.sleep(UPDATE_DEBOUNCE)
+            while True:
+                try:
+                    events.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(events)
+            except Exception as e:
+                logger.exception("更新trigram索引出错: %s", e)
+
+    def _apply(self, events: List[Tuple[str, str]]):
+        if any(kind == "rebuild" for kind, _ in events):
+            logger.warning("inotify事件队列溢出，重建trigram索引: %s", self.root)
+            self.build()
+            return
+        # 同一路径只保留最后一个事件
+        latest: "OrderedDict[str, str]" = OrderedDict()
+        for kind, path in events:
+            latest.pop(path, None)
+            latest[path] = kind
+        updates = []
+        for path, kind in latest.items():
+            if kind == "remove":
+                with self._lock:
+                    self._remove(path)
+            elif kind == "remove_tree":
+                self._remove_tree(path)
+                if self._watcher is not None:
+                    self._watcher.remove_watch(path)
+            elif kind == "add_tree":
+                try:
+                    self._watcher.add_watch(path)
+                except OSError:
+                    continue
+                files = self._walk(path)
+                if files is None:
+                    return
+                updates.extend(files)
+            else:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    with self._lock:
+                        self._remove(path)
+                    continue
+                updates.append((path, st.st_size))
+        self._add_files(updates)
+        with self._lock:
+            live = len(self._ids)
+            needs_compaction = self._dead > max(1000, live // 4)
+        if needs_compaction:
+            self._compact()
+
+    # ---- 查询 ----
+
+    def candidates(self, literal: str, directory: str, include: str = "*") -> List[str]:
+        """返回可能包含literal的文件（按路径排序），只含位于directory下、文件名匹配include的文件
+
+        literal不足3个字节时无法缩小范围，返回目录下的全部文件。
+        """
+        grams = query_trigrams(literal)
+        prefix = directory.rstrip(os.sep) + os.sep
+        with self._lock:
+            if grams:
+                postings = [self._postings.get(g) for g in grams]
+                if any(p is None for p in postings):
+                    ids: Set[int] = set()
+                else:
+                    postings.sort(key=len)
+                    ids = set(postings[0])
+                    for posting in postings[1:]:
+                        ids.intersection_update(posting)
+                        if not ids:
+                            break
+                ids.update(self._oversized)
+            else:
+                ids = set(self._ids.values())
+            paths = [self._paths[i] for i in ids if self._paths[i] is not None]
+        return sorted(
+            path for path in paths
+            if path.startswith(prefix) and fnmatch.fnmatchcase(os.path.basename(path), include)
+        )
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        with self._lock:
+            self._reset()
+
+
+class TrigramIndexManager:
+    """按查询目录懒加载trigram索引；已有祖先目录的索引时直接复用"""
+
+    def __init__(self, enabled: bool = True, max_indexes: int = MAX_INDEXES):
+        self.enabled = enabled and fs_watch.is_supported()
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, TrigramIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, directory: str) -> Tuple[Optional[TrigramIndex], str]:
+        """返回 (已就绪的索引或None, 索引状态)；尚无索引时在后台开始构建"""
+        if not self.enabled:
+            return None, "disabled"
+        real = os.path.realpath(directory)
+        with self._lock:
+            index = next((idx for idx in self._indexes.values()
+                          if idx.contains(real) and idx.state != TrigramIndex.FAILED), None)
+            if index is None:
+                # 新索引覆盖的子目录索引不再需要
+                for root in [r for r, idx in self._indexes.items()
+                             if r.startswith(real.rstrip(os.sep) + os.sep) or idx.state == TrigramIndex.FAILED]:
+                    self._indexes.pop(root).close()
+                index = TrigramIndex(real)
+                self._indexes[real] = index
+                index.state = TrigramIndex.BUILDING
+                threading.Thread(target=index.build, name=f"trigram-build:{real}", daemon=True).start()
+                while len(self._indexes) > self.max_indexes:
+                    _, evicted = self._indexes.popitem(last=False)
+                    evicted.close()
+            else:
+                self._indexes.move_to_end(index.root)
+        return (index if index.ready else None), index.state
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {root: dict(idx.stats(), state=idx.state) for root, idx in self._indexes.items()}
@@ -0,0 +1,201 @@
+"""共享的工作进程池，用于CPU密集型的文件处理任务
+
+任务按文件路径固定分配给某个工作进程（路径亲和），同一文件总在同一进程中处理，
+各进程可以保留自己的热缓存（见worker_cache）。
+"""
+import os
+import zlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set
+
+# 工作进程数，默认与CPU核数相同
+PROCESS_WORKERS = int(os.environ.get("MCP_PROCESS_WORKERS", "0")) or os.cpu_count() or 1
+# 每个工作进程同时在途的任务数
+TASKS_PER_WORKER = 2
+# 每个工作进程热缓存的条目数上限
+WORKER_CACHE_ENTRIES = int(os.environ.get("MCP_WORKER_CACHE_ENTRIES", "20000"))
+
+_pool: Optional["AffinityPool"] = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    """选择进程启动方式：服务器进程内有后台线程，避免直接fork
+
+    forkserver默认预载主模块（server.py），连同其中的日志、索引快照等初始化；任务函数都在
+    不导入server.py的模块中，因此不预载任何模块。
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def worker_for(path: str, workers: int = PROCESS_WORKERS) -> int:
+    """路径对应的工作进程编号；用crc32而不是hash()，保证跨进程、跨重启稳定"""
+    return zlib.crc32(path.encode("utf-8", "surrogateescape")) % workers
+
+
+class AffinityPool:
+    """由若干单进程执行器组成的进程池，任务可以指定由哪个工作进程执行"""
+
+    def __init__(self, workers: int = PROCESS_WORKERS):
+        self.workers = workers
+        self._context = _mp_context()
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * workers
+        self._lock = threading.Lock()
+
+    def _executor(self, index: int) -> ProcessPoolExecutor:
+        # 各工作进程在首次分配到任务时才启动
+        with self._lock:
+            executor = self._executors[index]
+            if executor is None:
+                executor = self._executors[index] = ProcessPoolExecutor(max_workers=1, mp_context=self._context)
+            return executor
+
+    def submit_to(self, index: int, fn: Callable[..., Any], *args: Any) -> Future:
+        return self._executor(index % self.workers).submit(fn, *args)
+
+    def submit(self, key: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """按路径亲和选择工作进程并提交任务"""
+        return self.submit_to(worker_for(key, self.workers), fn, *args)
+
+    def started(self) -> int:
+        with self._lock:
+            return sum(executor is not None for executor in self._executors)
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = self._executors, [None] * self.workers
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_process_pool() -> AffinityPool:
+    """懒加载共享进程池，首次使用时才创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AffinityPool()
+        return _pool
+
+
+def run_stream(task: Callable[..., List[Any]], paths: Iterable[str], batch_size: int,
+               *args: Any) -> Iterator[Any]:
+    """把路径流按工作进程分组、分批交给task(batch, *args)执行，按完成顺序产出各批结果中的元素
+
+    每个路径总是交给同一个工作进程。每个进程同时在途的任务数限制为TASKS_PER_WORKER，
+    某个进程已满时先等待已有任务完成；调用方提前停止迭代时取消剩余任务。
+    """
+    pool = get_process_pool()
+    workers = pool.workers
+    buffers: Dict[int, List[str]] = {}
+    in_flight = [0] * workers
+    owner: Dict[Future, int] = {}
+    pending: Set[Future] = set()
+
+    def submit(index: int):
+        future = pool.submit_to(index, task, buffers.pop(index), *args)
+        owner[future] = index
+        in_flight[index] += 1
+        pending.add(future)
+
+    def collect(block: bool) -> List[Any]:
+        nonlocal pending
+        done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        results: List[Any] = []
+        for future in done:
+            in_flight[owner.pop(future)] -= 1
+            results.extend(future.result())
+        return results
+
+    iterator = iter(paths)
+    try:
+        exhausted = False
+        while True:
+            if not exhausted:
+                path = next(iterator, None)
+                if path is None:
+                    exhausted = True
+                else:
+                    index = worker_for(path, workers)
+                    buffers.setdefault(index, []).append(path)
+                    if len(buffers[index]) < batch_size:
+                        continue
+                    while in_flight[index] >= TASKS_PER_WORKER:
+                        # 目标进程已满：先让其他空闲进程处理手上未满的批次，再等待
+                        for other in [i for i in buffers if i != index and in_flight[i] < TASKS_PER_WORKER]:
+                            submit(other)
+                        yield from collect(block=True)
+                    submit(index)
+                    yield from collect(block=False)
+                    continue
+            # 输入已取完：提交剩余的未满批次
+            for index in [i for i in buffers if in_flight[i] < TASKS_PER_WORKER]:
+                submit(index)
+            if not pending and not buffers:
+                return
+            yield from collect(block=True)
+    finally:
+        for future in pending:
+            future.cancel()
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+def run_batches(task: Callable[..., List[Any]], items: List[str], batch_size: int,
+                *args: Any) -> Iterator[Any]:
+    """把路径列表分批交给进程池执行，见run_stream"""
+    return run_stream(task, items, batch_size, *args)
+
+
+class WorkerCache:
+    """工作进程内的LRU缓存；键中应包含文件的mtime和大小，文件变化后自然失效
+
+    任务较小时也会直接在服务器进程的线程中执行，因此读写需要加锁。
+    """
+
+    def __init__(self, max_entries: int = WORKER_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 每个进程各自的热缓存（工作进程中由任务函数使用）
+worker_cache = WorkerCache()
+
+
+def shutdown():
+    """关闭进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None